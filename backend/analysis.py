@@ -1,11 +1,24 @@
 
 import os
+import io
+import re
+import json
+import heapq
+from collections import Counter
+from functools import cached_property
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 import numpy as np
 import pandas as pd
 
-BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+from backend.instrument import stage, timed
+from backend.schema import stored_columns
+from backend.sketch import DEFAULT_ALPHA, QUANTILE_METHODS, QuantileSketch
+from backend.storage import read_cleaned
+from backend.writers import OutputWriter, atomic_path, write_csv, write_json
+
+BASE_DIR = os.environ.get("CMS_PIPELINE_DIR") or os.path.dirname(os.path.dirname(__file__))
 
-CLEAN_PATH = os.path.join(BASE_DIR, "Data", "healthcare_cleaned.csv")
 ANOM_DIR = os.path.join(BASE_DIR, "outputs", "anomalies")
 REPORT_DIR = os.path.join(BASE_DIR, "outputs", "report")
 TABLES_DIR = os.path.join(BASE_DIR, "outputs", "tables")
@@ -15,51 +28,682 @@ os.makedirs(REPORT_DIR, exist_ok=True)
 os.makedirs(TABLES_DIR, exist_ok=True)
 
 SUMMARY_PATH = os.path.join(REPORT_DIR, "02_analysis_summary.txt")
+# Per-group fingerprints + sufficient statistics for incremental re-analysis.
+STATE_PATH = os.path.join(ANOM_DIR, "group_state.csv")
+SUMMARY_JSON = os.path.join(BASE_DIR, "outputs", "summary.json")
+# Exact vs sketch IQR bounds per group (written when compare_quantiles is set).
+QUANTILE_CHECK_PATH = os.path.join(REPORT_DIR, "quantile_sketch_check.csv")
+
+# Detection thresholds (also part of the stage-cache key in main.py).
+MIN_GROUP_SIZE = 30
+Z_THRESHOLD = 3.5
+IQR_MULTIPLIER = 1.5
+MAD_THRESHOLD = 3.5
+
+# Rows per top-group table, and the extra per-detector tables that split each
+# (metric, HCPCS) count by one more column (top_<detector>_groups_<name>.csv).
+TOP_N = 20
+TOP_GROUP_BREAKDOWNS = {"state": "rndrng_prvdr_state_abrvtn", "pos": "place_of_srvc"}
+
+# Baseline groupings: tuples of key columns. A row whose cell has fewer than
+# MIN_GROUP_SIZE rows falls back to the key without its last column.
+DEFAULT_GROUPINGS = [("hcpcs_cd",)]
+GROUP_KEY_ALIASES = {
+    "hcpcs": "hcpcs_cd",
+    "pos": "place_of_srvc",
+    "state": "rndrng_prvdr_state_abrvtn",
+    "provider_type": "rndrng_prvdr_type",
+}
 
 
 def _safe_numeric(s: pd.Series) -> pd.Series:
     return pd.to_numeric(s, errors="coerce")
 
 
-def _iqr_bounds(x: pd.Series):
-    """Return (q1, q3, iqr, lower, upper) for numeric series."""
-    x = x.dropna()
-    if len(x) < 8:
-        return (np.nan, np.nan, np.nan, np.nan, np.nan)
-    q1 = x.quantile(0.25)
-    q3 = x.quantile(0.75)
+def _group_layout(codes: np.ndarray, n_groups: int):
+    """Row positions stably sorted by group code, plus per-group (starts, counts)."""
+    pos = np.flatnonzero(codes >= 0)
+    order = pos[np.argsort(codes[pos], kind="stable")]
+    counts = np.bincount(codes[order], minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64)
+    return order, starts, counts
+
+
+def _segment_quantile(sorted_vals: np.ndarray, starts: np.ndarray, counts: np.ndarray, q: float) -> np.ndarray:
+    """Linear-interpolated quantile of every sorted segment (same arithmetic as Series.quantile)."""
+    out = np.full(len(counts), np.nan)
+    ok = counts > 0
+    n = counts[ok].astype(np.float64)
+    virtual = n * q + (1 - q) - 1
+    prev = np.floor(virtual)
+    gamma = virtual - prev
+    lo = starts[ok] + prev.astype(np.int64)
+    hi = starts[ok] + np.minimum(prev.astype(np.int64) + 1, counts[ok] - 1)
+    a = sorted_vals[lo]
+    b = sorted_vals[hi]
+    diff = b - a
+    with np.errstate(invalid="ignore"):
+        res = a + diff * gamma
+        res = np.where(gamma >= 0.5, b - diff * (1 - gamma), res)
+    out[ok] = res
+    return out
+
+
+def _quartile_bounds(q1: np.ndarray, q3: np.ndarray, counts: np.ndarray):
+    small = counts < 8
+    q1[small] = np.nan
+    q3[small] = np.nan
     iqr = q3 - q1
-    lower = q1 - 1.5 * iqr
-    upper = q3 + 1.5 * iqr
+    lower = q1 - IQR_MULTIPLIER * iqr
+    upper = q3 + IQR_MULTIPLIER * iqr
     return (q1, q3, iqr, lower, upper)
 
 
-def _zscore(x: pd.Series) -> pd.Series:
-    x = x.astype(float)
-    mu = x.mean()
-    sd = x.std(ddof=0)
-    if sd == 0 or np.isnan(sd):
-        return pd.Series([np.nan] * len(x), index=x.index)
-    return (x - mu) / sd
+def _iqr_bounds(sorted_vals: np.ndarray, starts: np.ndarray, counts: np.ndarray):
+    """Return per-group (q1, q3, iqr, lower, upper); NaN where a group has < 8 values."""
+    q1 = _segment_quantile(sorted_vals, starts, counts, 0.25)
+    q3 = _segment_quantile(sorted_vals, starts, counts, 0.75)
+    return _quartile_bounds(q1, q3, counts)
+
+
+def _sketch_bounds(rc: np.ndarray, vals: np.ndarray, counts: np.ndarray, alpha: float):
+    """Same as _iqr_bounds, with quartiles from a quantile sketch (no sort of the values)."""
+    sketch = QuantileSketch(len(counts), alpha).add(vals, rc)
+    return _quartile_bounds(sketch.quantile(0.25), sketch.quantile(0.75), counts)
+
+
+def _zscore_params(vals: np.ndarray, starts: np.ndarray, counts: np.ndarray, groups: np.ndarray):
+    """Per-group population mean/std (ddof=0), summed segment by segment like Series.mean/std."""
+    mu = np.full(len(counts), np.nan)
+    sd = np.full(len(counts), np.nan)
+    for g in groups:
+        x = vals[starts[g]:starts[g] + counts[g]]
+        n = float(counts[g])
+        m = x.sum(dtype=np.float64) / n
+        mu[g] = m
+        sd[g] = np.sqrt(((m - x) ** 2).sum(dtype=np.float64) / n)
+    return mu, sd
+
+
+def _desc_order(vals: np.ndarray) -> np.ndarray:
+    """Descending argsort with the same tie-breaking as DataFrame.sort_values(ascending=False)."""
+    idx = np.arange(len(vals))[::-1]
+    return idx[vals[::-1].argsort(kind="quicksort")][::-1]
+
+
+def _block_order(codes: np.ndarray, metric_idx: np.ndarray, vals: np.ndarray) -> np.ndarray:
+    """Order anomaly rows by group, then metric, then metric value descending.
+
+    Rows must arrive in original row order within each (group, metric) block.
+    """
+    order = np.lexsort((-vals, metric_idx, codes))
+    if len(order) < 2:
+        return order
+    c, m, v = codes[order], metric_idx[order], vals[order]
+    new_block = np.concatenate(([True], (c[1:] != c[:-1]) | (m[1:] != m[:-1])))
+    tie = np.concatenate(([False], (v[1:] == v[:-1]) & ~new_block[1:]))
+    if tie.any():
+        block_id = np.cumsum(new_block) - 1
+        block_starts = np.flatnonzero(new_block)
+        block_ends = np.append(block_starts[1:], len(order))
+        for b in np.unique(block_id[tie]):
+            s, e = block_starts[b], block_ends[b]
+            seg = np.sort(order[s:e])
+            order[s:e] = seg[_desc_order(vals[seg])]
+    return order
+
+
+class _GroupPass:
+    """One metric's scored rows grouped by code, with the per-group statistics the
+    detectors need built lazily and at most once (sorted values, quantiles, moments)."""
+
+    def __init__(self, rc, vals, n_groups, min_group_size, quantile_method, sketch_alpha):
+        self.rc = rc
+        self.vals = vals
+        self.counts = np.bincount(rc, minlength=n_groups)
+        self.starts = np.concatenate(([0], np.cumsum(self.counts)[:-1])).astype(np.int64)
+        self.scored = np.flatnonzero(self.counts >= min_group_size)
+        self.sketch_alpha = sketch_alpha if quantile_method == "sketch" else None
+
+    @cached_property
+    def sorted_vals(self):
+        return self.vals[np.lexsort((self.vals, self.rc))]
+
+    @cached_property
+    def sketch(self):
+        return QuantileSketch(len(self.counts), self.sketch_alpha).add(self.vals, self.rc)
+
+    def _quantile(self, q):
+        if self.sketch_alpha is not None:
+            return self.sketch.quantile(q)
+        return _segment_quantile(self.sorted_vals, self.starts, self.counts, q)
+
+    @cached_property
+    def quartile_bounds(self):
+        return _quartile_bounds(self._quantile(0.25), self._quantile(0.75), self.counts)
+
+    @cached_property
+    def median(self):
+        return self._quantile(0.5)
+
+    @cached_property
+    def mad(self):
+        """Median absolute deviation from the group median."""
+        dev = np.abs(self.vals - self.median[self.rc])
+        if self.sketch_alpha is not None:
+            return QuantileSketch(len(self.counts), self.sketch_alpha).add(dev, self.rc).quantile(0.5)
+        return _segment_quantile(dev[np.lexsort((dev, self.rc))], self.starts, self.counts, 0.5)
+
+    @cached_property
+    def moments(self):
+        return _zscore_params(self.vals, self.starts, self.counts, self.scored)
+
+    @cached_property
+    def log_moments(self):
+        # log1p: the same transform as cleaning's log_payment / log_submitted columns.
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return _zscore_params(np.log1p(self.vals), self.starts, self.counts, self.scored)
+
+
+def _standard_score(g: _GroupPass, x, center, scale, threshold, factor=None):
+    """(hit mask, scores of hits) for (x - center) / scale > threshold; groups with zero/NaN scale are skipped."""
+    usable = (scale != 0) & ~np.isnan(scale)
+    keep = usable[g.rc]
+    z = np.full(len(x), np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z[keep] = (x[keep] - center[g.rc[keep]]) / scale[g.rc[keep]]
+        if factor is not None:
+            z[keep] *= factor
+        hit = z > threshold
+    return hit, z[hit]
+
+
+def _detect_iqr(g: _GroupPass, z_threshold):
+    q1, q3, iqr, lower, upper = g.quartile_bounds
+    with np.errstate(invalid="ignore"):
+        hit = g.vals > upper[g.rc]
+    hc = g.rc[hit]
+    return hit, {"iqr_q1": q1[hc], "iqr_q3": q3[hc], "iqr": iqr[hc],
+                 "iqr_upper_bound": upper[hc], "iqr_lower_bound": lower[hc]}
+
+
+def _detect_zscore(g: _GroupPass, z_threshold):
+    mu, sd = g.moments
+    hit, z = _standard_score(g, g.vals, mu, sd, z_threshold)
+    return hit, {"z_score": z, "z_threshold": np.full(len(z), z_threshold)}
+
+
+def _detect_mad(g: _GroupPass, z_threshold):
+    """Modified Z-score 0.6745 * (x - median) / MAD (Iglewicz & Hoaglin)."""
+    median = g.median
+    # Like the Z-score, only groups with >= min_group_size values are scored.
+    mad = np.full(len(g.counts), np.nan)
+    mad[g.scored] = g.mad[g.scored]
+    hit, z = _standard_score(g, g.vals, median, mad, MAD_THRESHOLD, factor=0.6745)
+    hc = g.rc[hit]
+    return hit, {"group_median": median[hc], "mad": mad[hc], "modified_z_score": z,
+                 "modified_z_threshold": np.full(len(z), MAD_THRESHOLD)}
+
+
+def _detect_log_zscore(g: _GroupPass, z_threshold):
+    mu, sd = g.log_moments
+    with np.errstate(invalid="ignore", divide="ignore"):
+        hit, z = _standard_score(g, np.log1p(g.vals), mu, sd, z_threshold)
+    hc = g.rc[hit]
+    return hit, {"log_mean": mu[hc], "log_std": sd[hc], "log_z_score": z,
+                 "z_threshold": np.full(len(z), z_threshold)}
+
+
+# Detector name (also the output file stem) -> anomaly_method label, scoring function and reason.
+# Reasons are formatted with col, scope, threshold (Z_THRESHOLD) and mad_threshold.
+DETECTORS = {
+    "iqr": {"label": "IQR", "score": _detect_iqr,
+            "reason": "{col} > {scope}-specific IQR upper bound"},
+    "zscore": {"label": "Z-score", "score": _detect_zscore,
+               "reason": "{col} Z-score > {threshold} within {scope} group"},
+    "mad": {"label": "MAD", "score": _detect_mad,
+            "reason": "{col} modified Z-score > {mad_threshold} within {scope} group"},
+    "log_zscore": {"label": "Log Z-score", "score": _detect_log_zscore,
+                   "reason": "log1p({col}) Z-score > {threshold} within {scope} group"},
+}
+DEFAULT_DETECTORS = ("iqr", "zscore")
+
+
+def _score_rows(codes, group_rows, values, n_groups, min_group_size, z_threshold,
+                quantile_method="exact", sketch_alpha=DEFAULT_ALPHA, detectors=DEFAULT_DETECTORS):
+    """Score every metric over `group_rows` (row positions sorted by group code).
+
+    Returns {detector: list of per-metric dicts of flagged-row arrays}. All
+    detectors of a metric share one _GroupPass, so each sort/quantile/moment
+    is computed once however many detectors read it.
+    """
+    hits = {d: [] for d in detectors}
+    for m, v in enumerate(values):
+        rows = group_rows[~np.isnan(v[group_rows])]
+        g = _GroupPass(codes[rows], v[rows], n_groups, min_group_size, quantile_method, sketch_alpha)
+        for d in detectors:
+            hit, cols = DETECTORS[d]["score"](g, z_threshold)
+            if hit.any():
+                hc = g.rc[hit]
+                hits[d].append({"row": rows[hit], "code": hc, "metric": np.full(len(hc), m),
+                                "value": g.vals[hit], **cols})
+    return hits
+
+
+# Per-worker views of the arrays the parent placed in shared memory.
+_SHARED = {}
+
+
+def _attach_shared(spec):
+    for name, (shm_name, shape, dtype) in spec.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _SHARED[name] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+
+
+def _score_shard(groups, n_groups, min_group_size, z_threshold, quantile_method, sketch_alpha, detectors):
+    codes, order, starts, sizes, values = (_SHARED[k][1] for k in ("codes", "order", "starts", "sizes", "values"))
+    groups = np.sort(groups)
+    rows = np.concatenate([order[starts[g]:starts[g] + sizes[g]] for g in groups])
+    return _score_rows(codes, rows, values, n_groups, min_group_size, z_threshold,
+                       quantile_method, sketch_alpha, detectors)
+
+
+def _balance_groups(groups: np.ndarray, sizes: np.ndarray, n_bins: int) -> list:
+    """Largest-first greedy assignment of groups to bins by row count."""
+    heap = [(0, i) for i in range(n_bins)]
+    bins = [[] for _ in range(n_bins)]
+    for g in groups[np.argsort(-sizes[groups], kind="stable")]:
+        load, i = heapq.heappop(heap)
+        bins[i].append(g)
+        heapq.heappush(heap, (load + int(sizes[g]), i))
+    return [np.array(b, dtype=np.int64) for b in bins if b]
+
+
+def _score_parallel(codes, order, starts, sizes, values, valid, workers, min_group_size, z_threshold,
+                    quantile_method="exact", sketch_alpha=DEFAULT_ALPHA, detectors=DEFAULT_DETECTORS):
+    """Run _score_rows on size-balanced group shards in a process pool.
+
+    Inputs are shared through multiprocessing.shared_memory, so only group ids
+    and the (small) flagged-row arrays cross process boundaries.
+    """
+    arrays = {"codes": codes, "order": order, "starts": starts, "sizes": sizes, "values": values}
+    shms = []
+    spec = {}
+    try:
+        for name, arr in arrays.items():
+            shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+            np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+            shms.append(shm)
+            spec[name] = (shm.name, arr.shape, arr.dtype.str)
+
+        shards = _balance_groups(np.flatnonzero(valid), sizes, workers)
+        n = len(shards)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_shared, initargs=(spec,)) as pool:
+            results = list(pool.map(_score_shard, shards, [len(sizes)] * n,
+                                    [min_group_size] * n, [z_threshold] * n,
+                                    [quantile_method] * n, [sketch_alpha] * n, [detectors] * n))
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+    return {d: [h for r in results for h in r[d]] for d in detectors}
+
+
+def _anomaly_frame(df, id_cols, hits, method, reasons, metrics, group_keys, group_values, group_sizes):
+    """Materialize flagged rows with one take, in the legacy group/metric/value order.
+
+    `group_keys`/`group_values`/`group_sizes` are indexed by the hits' group code.
+    """
+    if not hits:
+        return pd.DataFrame(columns=id_cols)
+    cat = {k: np.concatenate([h[k] for h in hits]) for k in hits[0]}
+    order = _block_order(cat["code"], cat["metric"], cat["value"])
+    cat = {k: v[order] for k, v in cat.items()}
+
+    out = df.iloc[cat["row"], [df.columns.get_loc(c) for c in id_cols]].reset_index(drop=True)
+    metric_idx = cat.pop("metric")
+    code = cat.pop("code")
+    for k in ("row", "value"):
+        cat.pop(k)
+    out["anomaly_method"] = method
+    out["anomaly_metric"] = np.array([c for c, _ in metrics], dtype=object)[metric_idx]
+    out["anomaly_metric_label"] = np.array([l for _, l in metrics], dtype=object)[metric_idx]
+    out["group_key"] = group_keys[code]
+    out["group_value"] = group_values[code]
+    out["group_size"] = group_sizes[code].astype(np.int64)
+    for col, values in cat.items():
+        out[col] = values
+    out["anomaly_reason"] = np.array(reasons, dtype=object)[metric_idx]
+    return out
+
+
+def _label_order(v):
+    """Sort key for table labels: missing last, everything else by its text."""
+    if v is None or (isinstance(v, float) and np.isnan(v)):
+        return (1, "")
+    return (0, v if isinstance(v, str) else str(v))
+
+
+class _TopGroups:
+    """Exact anomaly counts per key tuple, fed as hits are produced.
+
+    add() folds in one batch of per-hit key codes (one np.unique, not a
+    groupby over the anomaly frame); top() keeps the `n` largest counts with
+    a bounded heap, ties broken by the keys in ascending order.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.counts = Counter()
+
+    def add(self, codes, labels):
+        """`codes`: one int array per column (-1 = missing); `labels[i][code]` decodes column i."""
+        if len(codes[0]) == 0:
+            return
+        keys, counts = np.unique(np.column_stack(codes), axis=0, return_counts=True)
+        for key, n in zip(keys.tolist(), counts.tolist()):
+            self.counts[tuple(None if k < 0 else lab[k] for k, lab in zip(key, labels))] += n
+
+    def add_frame(self, frame: pd.DataFrame):
+        """Count the rows of an anomaly frame (used where no hits are at hand)."""
+        if len(frame) == 0:
+            return
+        factorized = [pd.factorize(frame[c], sort=False) for c in self.columns]
+        self.add([c for c, _ in factorized], [np.asarray(u, dtype=object) for _, u in factorized])
+
+    def top(self, n: int) -> pd.DataFrame:
+        best = heapq.nsmallest(n, self.counts.items(),
+                               key=lambda kv: (-kv[1], tuple(_label_order(v) for v in kv[0])))
+        return pd.DataFrame([(*k, c) for k, c in best], columns=self.columns + ["count"])
+
+
+def _group_fingerprints(df: pd.DataFrame, cols, order, starts, sizes) -> np.ndarray:
+    """Order-sensitive 64-bit content hash of each group's rows over `cols`."""
+    h = pd.util.hash_pandas_object(df[cols], index=False).to_numpy()[order]
+    pos = np.arange(len(order), dtype=np.uint64) - np.repeat(starts, sizes).astype(np.uint64)
+    mixed = pd.util.hash_array(h ^ pos)
+    return np.add.reduceat(mixed, starts) if len(starts) else np.empty(0, dtype=np.uint64)
+
+
+def _group_state(uniques, fingerprints, codes, order, sizes, values, metrics, min_group_size, z_threshold):
+    """Per-group state table: fingerprint, size and n/sum/sumsq/q1/q3 per metric."""
+    n_groups = len(uniques)
+    state = pd.DataFrame({
+        "group_value": [str(u) for u in uniques],
+        "fingerprint": [format(int(f), "016x") for f in fingerprints],
+        "group_size": sizes,
+    })
+    for (metric_col, _), v in zip(metrics, values):
+        rows = order[~np.isnan(v[order])]
+        rc = codes[rows]
+        vals = v[rows]
+        counts = np.bincount(rc, minlength=n_groups)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64)
+        q1, q3, _, _, _ = _iqr_bounds(vals[np.lexsort((vals, rc))], starts, counts)
+        state[f"{metric_col}_n"] = counts
+        state[f"{metric_col}_sum"] = np.bincount(rc, weights=vals, minlength=n_groups)
+        state[f"{metric_col}_sumsq"] = np.bincount(rc, weights=vals * vals, minlength=n_groups)
+        state[f"{metric_col}_q1"] = q1
+        state[f"{metric_col}_q3"] = q3
+    state["min_group_size"] = min_group_size
+    state["z_threshold"] = z_threshold
+    return state
+
+
+def _load_state(min_group_size, z_threshold):
+    """Previous group state, or None when missing or computed with other thresholds."""
+    if not os.path.exists(STATE_PATH):
+        return None
+    state = pd.read_csv(STATE_PATH, dtype={"group_value": str, "fingerprint": str}, keep_default_na=False)
+    if len(state) and (state["min_group_size"].iloc[0] != min_group_size
+                       or state["z_threshold"].iloc[0] != z_threshold):
+        return None
+    return state
+
+
+def _quantile_check(codes, order, values, metrics, uniques, valid, alpha) -> pd.DataFrame:
+    """Exact vs sketch quartiles, IQR upper bound and IQR hit count for every scored group."""
+    n_groups = len(uniques)
+    frames = []
+    for (metric_col, _), v in zip(metrics, values):
+        rows = order[valid[codes[order]]]
+        rows = rows[~np.isnan(v[rows])]
+        rc = codes[rows]
+        vals = v[rows]
+        counts = np.bincount(rc, minlength=n_groups)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64)
+        exact = _iqr_bounds(vals[np.lexsort((vals, rc))], starts, counts)
+        approx = _sketch_bounds(rc, vals, counts, alpha)
+        with np.errstate(invalid="ignore"):
+            exact_hits = np.bincount(rc[vals > exact[4][rc]], minlength=n_groups)
+            approx_hits = np.bincount(rc[vals > approx[4][rc]], minlength=n_groups)
+
+        g = np.flatnonzero(counts > 0)
+        frame = pd.DataFrame({
+            "group_value": np.asarray(uniques, dtype=object)[g],
+            "metric": metric_col,
+            "n": counts[g],
+        })
+        for name, i in (("q1", 0), ("q3", 1), ("iqr_upper_bound", 4)):
+            frame[f"exact_{name}"] = exact[i][g]
+            frame[f"sketch_{name}"] = approx[i][g]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                frame[f"{name}_rel_err"] = np.abs(approx[i][g] - exact[i][g]) / np.abs(exact[i][g])
+        frame["exact_iqr_hits"] = exact_hits[g]
+        frame["sketch_iqr_hits"] = approx_hits[g]
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+def parse_groupings(specs) -> list:
+    """Normalize grouping specs ("hcpcs,pos", ["hcpcs_cd", "state"], ...) to tuples of column names."""
+    out = []
+    for spec in specs:
+        cols = spec.split(",") if isinstance(spec, str) else spec
+        key = tuple(GROUP_KEY_ALIASES.get(c.strip(), c.strip()) for c in cols if c.strip())
+        if key and key not in out:
+            out.append(key)
+    return out
+
+
+def _grouping_levels(grouping: tuple) -> list:
+    """Finest-first fallback chain: (a, b, c) -> [(a, b, c), (a, b), (a,)]."""
+    return [grouping[:i] for i in range(len(grouping), 0, -1)]
+
+
+def _grouping_name(grouping: tuple) -> str:
+    return "+".join(grouping)
+
+
+def _level_codes(df: pd.DataFrame, level: tuple, col_codes: dict):
+    """Group codes of a (possibly composite) key, in first-appearance order, and their labels.
+
+    Per-column factorizations are cached in `col_codes` and combined pairwise, so
+    every level of every grouping reuses one factorize per key column. Rows with
+    a missing key part get code -1; composite labels join the parts with "|".
+    """
+    for c in level:
+        if c not in col_codes:
+            codes, uniques = pd.factorize(df[c], sort=False)
+            col_codes[c] = (codes, np.asarray(uniques, dtype=object))
+    if len(level) == 1:
+        return col_codes[level[0]]
+
+    codes, _ = col_codes[level[0]]
+    parts = [codes]
+    for c in level[1:]:
+        nxt, uniques = col_codes[c]
+        ok = (codes >= 0) & (nxt >= 0)
+        combined = np.full(len(codes), -1, dtype=np.int64)
+        # Re-factorize after every column so the combined code stays below n_rows * n_values.
+        combined[ok], _ = pd.factorize(codes[ok].astype(np.int64) * len(uniques) + nxt[ok], sort=False)
+        codes = combined
+        parts.append(nxt)
+
+    n_groups = int(codes.max()) + 1 if len(codes) else 0
+    first = np.full(n_groups, -1, dtype=np.int64)
+    rows = np.flatnonzero(codes >= 0)
+    first[codes[rows]] = rows
+    labels = ["|".join(t) for t in zip(*[col_codes[c][1][p[first]].astype(str) for c, p in zip(level, parts)])]
+    return codes, np.asarray(labels, dtype=object)
+
+
+def _output_suffix(grouping: tuple, groupings: list) -> str:
+    return "" if grouping == groupings[0] else "_by_" + "__".join(grouping)
+
+
+def _drop_stale_outputs(groupings: list, detectors, breakdowns=()):
+    """Delete anomaly/top-group files of detectors, groupings or breakdowns this run no longer produces."""
+    names = "|".join(sorted(DETECTORS, key=len, reverse=True))
+    splits = "|".join(TOP_GROUP_BREAKDOWNS)
+    produced = re.compile(rf"(anomalies_({names})|top_({names})_groups(_({splits}))?)(_by_\w+)?\.csv")
+    expected = {f"{kind}{_output_suffix(g, groupings)}.csv" for g in groupings for d in detectors
+                for kind in (f"anomalies_{d}", f"top_{d}_groups")}
+    expected |= {f"top_{d}_groups_{b}.csv" for d in detectors for b in breakdowns}
+    for folder in (ANOM_DIR, TABLES_DIR):
+        for name in os.listdir(folder):
+            if produced.fullmatch(name) and name not in expected:
+                os.remove(os.path.join(folder, name))
+
+
+def _global_stats(s: pd.Series):
+    if len(s) == 0:
+        return None
+    return {"mean": s.mean(), "median": s.median(), "min": s.min(), "max": s.max(), "std": s.std(ddof=0)}
+
+
+def _write_summary(rows_total, columns_total, groupings, min_group_size, quantile_method, sketch_alpha,
+                   pay_stats, ratio_stats, counts, grouping_counts):
+    """Write 02_analysis_summary.txt.
+
+    `*_stats` are _global_stats dicts (None when the metric has no values);
+    `counts` maps detector -> anomalies of the first grouping and
+    `grouping_counts` the same per additional grouping.
+    """
+    with atomic_path(SUMMARY_PATH) as tmp, open(tmp, "w", encoding="utf-8") as f:
+        f.write("=== Analysis Summary (HCPCS Group-wise) ===\n")
+        f.write(f"rows_total: {rows_total}\n")
+        f.write(f"columns_total: {columns_total}\n")
+        f.write(f"group_column: {_grouping_name(groupings[0])}\n")
+        if len(groupings[0]) > 1:
+            f.write(f"group_fallback: {' -> '.join(_grouping_name(l) for l in _grouping_levels(groupings[0])[1:])}\n")
+        for grouping in groupings[1:]:
+            f.write(f"additional_grouping: {' -> '.join(_grouping_name(l) for l in _grouping_levels(grouping))}\n")
+        f.write(f"min_group_size_used: {min_group_size}\n")
+        if quantile_method == "sketch":
+            f.write(f"iqr_quantiles: sketch (relative error <= {sketch_alpha})\n")
+        f.write("\n")
+
+        for title, stats in (("Payment (avg_mdcr_pymt_amt)", pay_stats), ("Submitted/Payment Ratio", ratio_stats)):
+            f.write(f"=== {title} Global Stats ===\n")
+            if stats is not None:
+                for k in ("mean", "median", "min", "max", "std"):
+                    f.write(f"{k}: {stats[k]:.6f}\n")
+            f.write("\n")
+
+        f.write("=== Anomalies Counts ===\n")
+        f.write(f"IQR anomalies total: {counts.get('iqr', 0)}\n")
+        f.write(f"Z-score anomalies total: {counts.get('zscore', 0)}\n")
+        for d in counts:
+            if d not in DEFAULT_DETECTORS:
+                f.write(f"{DETECTORS[d]['label']} anomalies total: {counts[d]}\n")
+        for grouping, by_method in grouping_counts.items():
+            labels = ", ".join(f"{DETECTORS[d]['label']} {n}" for d, n in by_method.items())
+            f.write(f"{_grouping_name(grouping)}: {labels}\n")
+        f.write("\n")
 
+        f.write("=== Notes for Reporting ===\n")
+        f.write("- IQR anomalies are defined per HCPCS code (service) to avoid mixing different services.\n")
+        f.write("- Ratio anomalies highlight cases where submitted charges are disproportionately higher than Medicare payments.\n")
+        f.write("- Use place_of_srvc_label + provider_type to interpret why costs differ (office vs facility, specialty differences).\n")
+        f.write("\n")
 
-def analyze_and_detect():
 
-    df = pd.read_csv(CLEAN_PATH, low_memory=False)
+def _patch_anomaly_csv(path, fresh, stale, group_rank, metric_rank) -> pd.DataFrame:
+    """Replace the rows of `stale` groups in an anomaly CSV with `fresh` and restore block order.
+
+    Rows are handled as text, so untouched groups are rewritten byte for byte.
+    """
+    old = pd.read_csv(path, dtype=str, keep_default_na=False)
+    if "group_value" in old.columns:
+        old = old[~old["group_value"].isin(stale)]
+    else:
+        old = old.iloc[0:0]
+    new = pd.read_csv(io.StringIO(fresh.to_csv(index=False)), dtype=str, keep_default_na=False)
+    merged = pd.concat([old, new], ignore_index=True) if len(old) else new
+    if len(merged):
+        rank = merged["group_value"].map(group_rank).to_numpy()
+        metric = merged["anomaly_metric"].map(metric_rank).to_numpy()
+        merged = merged.iloc[np.lexsort((np.arange(len(merged)), metric, rank))]
+    write_csv(merged, path, index=False)
+    return merged
+
+
+def _patch_summary_json(iqr_count: int, z_count: int):
+    """Refresh the anomaly counts of an existing dashboard summary.json in place."""
+    if not os.path.exists(SUMMARY_JSON):
+        return
+    with open(SUMMARY_JSON, "r", encoding="utf-8") as f:
+        summary = json.load(f)
+    summary["iqr_anomalies_count"] = int(iqr_count)
+    summary["zscore_anomalies_count"] = int(z_count)
+    write_json(summary, SUMMARY_JSON, indent=2, ensure_ascii=False)
+
+
+@timed("analyze")
+def analyze_and_detect(workers: int = 1, incremental: bool = False, quantile_method: str = "exact",
+                       sketch_alpha: float = DEFAULT_ALPHA, compare_quantiles: bool = False, groupings=None,
+                       detectors=None, cleaned=None, top_n: int = TOP_N):
+    """Flag IQR and Z-score anomalies against per-group baselines (per HCPCS code by default).
+
+    `detectors` picks methods from DETECTORS (default IQR and Z-score); "mad"
+    and "log_zscore" add robust scores written as `anomalies_<name>.csv`.
+
+    `groupings` lists baseline keys, e.g. [("hcpcs_cd", "place_of_srvc"), ("hcpcs_cd",)];
+    the first one writes the standard outputs, the others `*_by_<key>.csv`
+    next to them. Rows in composite cells under `MIN_GROUP_SIZE` fall back to
+    the coarser key. All groupings share one factorize per key column, and each
+    distinct (sub)key is scored once however many groupings fall back to it.
+    `workers` > 1 shards groups over a process pool. With `incremental`, only
+    groups whose rows changed since the last incremental run are rescored and
+    the existing outputs are patched; the first such run does a full pass.
+    `quantile_method="sketch"` takes the IQR quartiles from a mergeable
+    quantile sketch (relative error <= `sketch_alpha`) instead of sorting each
+    group; `compare_quantiles` writes both side by side for checking.
+
+    The `top_n` groups with the most anomalies go to `top_<detector>_groups.csv`,
+    counted per (metric, HCPCS code) while the anomaly tables are built, plus
+    the same counts split by state and place of service (TOP_GROUP_BREAKDOWNS).
+
+    `cleaned` is the cleaned frame when the caller already holds it (skips the
+    store read). Returns {"anomalies": {detector: frame}, "top_groups": {detector:
+    frame}, "top_group_breakdowns": {detector: {name: frame}}} for the first
+    grouping, or None after an incremental patch.
+    """
+    if quantile_method not in QUANTILE_METHODS:
+        raise ValueError(f"quantile_method must be one of {QUANTILE_METHODS}, got {quantile_method!r}")
+    groupings = parse_groupings(groupings or DEFAULT_GROUPINGS)
+    detectors = tuple(detectors or DEFAULT_DETECTORS)
+    unknown = sorted(set(detectors) - set(DETECTORS))
+    if unknown:
+        raise ValueError(f"unknown detectors {unknown}; expected {tuple(DETECTORS)}")
+    if top_n < 1:
+        raise ValueError(f"top_n must be >= 1, got {top_n}")
+    if incremental and groupings != DEFAULT_GROUPINGS:
+        raise ValueError("incremental mode only supports the default per-HCPCS grouping")
+
+    available = list(cleaned.columns) if cleaned is not None else stored_columns()
 
     # Ensure required columns exist
     required = ["hcpcs_cd", "hcpcs_desc", "avg_mdcr_pymt_amt", "submitted_to_payment_ratio"]
     for col in required:
-        if col not in df.columns:
+        if col not in available:
             raise ValueError(f"Missing required column in cleaned data: {col}")
-
-   
-    df["avg_mdcr_pymt_amt"] = _safe_numeric(df["avg_mdcr_pymt_amt"])
-    df["submitted_to_payment_ratio"] = _safe_numeric(df["submitted_to_payment_ratio"])
-
-
-    group_key = "hcpcs_cd"
-
+    for grouping in groupings:
+        for col in grouping:
+            if col not in available:
+                raise ValueError(f"Grouping column missing from cleaned data: {col}")
 
     id_cols = [
         "hcpcs_cd", "hcpcs_desc",
@@ -71,164 +715,225 @@ def analyze_and_detect():
         "avg_sbmtd_chrg_amt", "avg_mdcr_alowd_amt", "avg_mdcr_pymt_amt", "avg_mdcr_stdzd_amt",
         "submitted_to_payment_ratio", "payment_to_allowed_ratio"
     ]
-    id_cols = [c for c in id_cols if c in df.columns]
-
+    id_cols = [c for c in id_cols if c in available]
+    id_cols += [c for g in groupings for c in g if c not in id_cols]
 
-    iqr_rows = []
+    # Column projection: only the identifier/metric columns are loaded.
+    with stage("read") as info:
+        if cleaned is not None:
+            df = cleaned[id_cols].reset_index(drop=True)
+        else:
+            df = read_cleaned(columns=id_cols)
+        info["rows"] = len(df)
 
-   
-    group_sizes = df.groupby(group_key).size()
+    df["avg_mdcr_pymt_amt"] = _safe_numeric(df["avg_mdcr_pymt_amt"])
+    df["submitted_to_payment_ratio"] = _safe_numeric(df["submitted_to_payment_ratio"])
 
-  
-    min_group_size = 30
-    valid_groups = set(group_sizes[group_sizes >= min_group_size].index.tolist())
+    min_group_size = MIN_GROUP_SIZE
+    z_threshold = Z_THRESHOLD
+
+    # Every distinct key prefix is a level: factorized and laid out once, shared by all groupings.
+    with stage("group", rows=len(df)):
+        col_codes = {}
+        levels = {}
+        for grouping in groupings:
+            for level in _grouping_levels(grouping):
+                if level not in levels:
+                    codes, uniques = _level_codes(df, level, col_codes)
+                    order, starts, sizes = _group_layout(codes, len(uniques))
+                    levels[level] = {"codes": codes, "uniques": uniques, "order": order, "starts": starts,
+                                     "sizes": sizes, "valid": sizes >= min_group_size,
+                                     "needed": np.zeros(len(uniques), dtype=bool)}
+
+        # Each grouping scores a row at its finest level whose cell is large enough.
+        assigned = {}
+        for grouping in groupings:
+            at = np.full(len(df), -1, dtype=np.int8)
+            for depth, level in enumerate(_grouping_levels(grouping)):
+                lv = levels[level]
+                rows = np.flatnonzero((at < 0) & (lv["codes"] >= 0))
+                rows = rows[lv["valid"][lv["codes"][rows]]]
+                at[rows] = depth
+                lv["needed"][lv["codes"][rows]] = True
+            assigned[grouping] = at
+
+    primary = levels[groupings[0]]
+    group_key = _grouping_name(groupings[0])
+    codes, uniques, order = primary["codes"], primary["uniques"], primary["order"]
+    group_starts, group_sizes, valid = primary["starts"], primary["sizes"], primary["valid"]
+    n_groups = len(uniques)
 
-    
     metrics = [
         ("avg_mdcr_pymt_amt", "Payment Amount"),
         ("submitted_to_payment_ratio", "Submitted/Payment Ratio"),
     ]
 
-    for hcpcs, g in df.groupby(group_key, sort=False):
-        if hcpcs not in valid_groups:
-            continue
-
-        for metric_col, metric_label in metrics:
-            x = _safe_numeric(g[metric_col])
-            q1, q3, iqr, lower, upper = _iqr_bounds(x)
-            if np.isnan(upper):
-                continue
-
-            mask = (x > upper)  
-            if mask.sum() == 0:
-                continue
-
-            sub = g.loc[mask, id_cols].copy()
-            sub["anomaly_method"] = "IQR"
-            sub["anomaly_metric"] = metric_col
-            sub["anomaly_metric_label"] = metric_label
-            sub["group_key"] = group_key
-            sub["group_value"] = hcpcs
-            sub["group_size"] = int(len(g))
-            sub["iqr_q1"] = q1
-            sub["iqr_q3"] = q3
-            sub["iqr"] = iqr
-            sub["iqr_upper_bound"] = upper
-            sub["iqr_lower_bound"] = lower
-            sub["anomaly_reason"] = f"{metric_col} > HCPCS-specific IQR upper bound"
-
-            sub["_sort_metric"] = _safe_numeric(sub[metric_col])
-            sub = sub.sort_values("_sort_metric", ascending=False).drop(columns=["_sort_metric"])
-
-            iqr_rows.append(sub)
-
-    anomalies_iqr = pd.concat(iqr_rows, ignore_index=True) if iqr_rows else pd.DataFrame(columns=id_cols)
-
-    z_rows = []
-    z_threshold = 3.5  
-    for hcpcs, g in df.groupby(group_key, sort=False):
-        if hcpcs not in valid_groups:
-            continue
-
-        for metric_col, metric_label in metrics:
-            x = _safe_numeric(g[metric_col])
-            x = x.dropna()
-            if len(x) < min_group_size:
-                continue
-
-            z = _zscore(x)
-            mask = (z > z_threshold)
-            if mask.sum() == 0:
-                continue
-
-            idx = z.index[mask]
-            sub = g.loc[idx, id_cols].copy()
-            sub["anomaly_method"] = "Z-score"
-            sub["anomaly_metric"] = metric_col
-            sub["anomaly_metric_label"] = metric_label
-            sub["group_key"] = group_key
-            sub["group_value"] = hcpcs
-            sub["group_size"] = int(len(g))
-            sub["z_score"] = z.loc[idx].values
-            sub["z_threshold"] = z_threshold
-            sub["anomaly_reason"] = f"{metric_col} Z-score > {z_threshold} within HCPCS group"
-
-            sub["_sort_metric"] = _safe_numeric(sub[metric_col])
-            sub = sub.sort_values("_sort_metric", ascending=False).drop(columns=["_sort_metric"])
-
-            z_rows.append(sub)
-
-    anomalies_z = pd.concat(z_rows, ignore_index=True) if z_rows else pd.DataFrame(columns=id_cols)
-
-    out_iqr = os.path.join(ANOM_DIR, "anomalies_iqr.csv")
-    out_z = os.path.join(ANOM_DIR, "anomalies_zscore.csv")
-    anomalies_iqr.to_csv(out_iqr, index=False)
-    anomalies_z.to_csv(out_z, index=False)
-
-
-    pay = _safe_numeric(df["avg_mdcr_pymt_amt"]).dropna()
-    ratio = _safe_numeric(df["submitted_to_payment_ratio"]).replace([np.inf, -np.inf], np.nan).dropna()
-
-
-    top_iqr_groups = (
-        anomalies_iqr.groupby(["anomaly_metric", "hcpcs_cd", "hcpcs_desc"], dropna=False)
-        .size().reset_index(name="count")
-        .sort_values("count", ascending=False)
-        .head(20)
-    )
-
-    top_z_groups = (
-        anomalies_z.groupby(["anomaly_metric", "hcpcs_cd", "hcpcs_desc"], dropna=False)
-        .size().reset_index(name="count")
-        .sort_values("count", ascending=False)
-        .head(20)
-    )
-
-    top_iqr_groups.to_csv(os.path.join(TABLES_DIR, "top_iqr_groups.csv"), index=False)
-    top_z_groups.to_csv(os.path.join(TABLES_DIR, "top_zscore_groups.csv"), index=False)
-
-    with open(SUMMARY_PATH, "w", encoding="utf-8") as f:
-        f.write("=== Analysis Summary (HCPCS Group-wise) ===\n")
-        f.write(f"rows_total: {len(df)}\n")
-        f.write(f"columns_total: {len(df.columns)}\n")
-        f.write(f"group_column: {group_key}\n")
-        f.write(f"min_group_size_used: {min_group_size}\n")
-        f.write("\n")
-
-        f.write("=== Payment (avg_mdcr_pymt_amt) Global Stats ===\n")
-        if len(pay) > 0:
-            f.write(f"mean: {pay.mean():.6f}\n")
-            f.write(f"median: {pay.median():.6f}\n")
-            f.write(f"min: {pay.min():.6f}\n")
-            f.write(f"max: {pay.max():.6f}\n")
-            f.write(f"std: {pay.std(ddof=0):.6f}\n")
-        f.write("\n")
-
-        f.write("=== Submitted/Payment Ratio Global Stats ===\n")
-        if len(ratio) > 0:
-            f.write(f"mean: {ratio.mean():.6f}\n")
-            f.write(f"median: {ratio.median():.6f}\n")
-            f.write(f"min: {ratio.min():.6f}\n")
-            f.write(f"max: {ratio.max():.6f}\n")
-            f.write(f"std: {ratio.std(ddof=0):.6f}\n")
-        f.write("\n")
-
-        f.write("=== Anomalies Counts ===\n")
-        f.write(f"IQR anomalies total: {len(anomalies_iqr)}\n")
-        f.write(f"Z-score anomalies total: {len(anomalies_z)}\n\n")
-
-        f.write("=== Notes for Reporting ===\n")
-        f.write("- IQR anomalies are defined per HCPCS code (service) to avoid mixing different services.\n")
-        f.write("- Ratio anomalies highlight cases where submitted charges are disproportionately higher than Medicare payments.\n")
-        f.write("- Use place_of_srvc_label + provider_type to interpret why costs differ (office vs facility, specialty differences).\n")
-        f.write("\n")
+    outputs = [os.path.join(ANOM_DIR, f"anomalies_{d}.csv") for d in detectors]
+
+    values = np.vstack([df[c].to_numpy(dtype=np.float64) for c, _ in metrics])
+
+    # Incremental mode: compare group fingerprints with the stored state and
+    # restrict scoring to new/changed groups.
+    stale = None
+    if incremental:
+        fingerprints = _group_fingerprints(df, id_cols, order, group_starts, group_sizes)
+        state = _load_state(min_group_size, z_threshold)
+        if state is not None and all(os.path.exists(p) for p in outputs):
+            keys = [str(u) for u in uniques]
+            prev = dict(zip(state["group_value"], state["fingerprint"]))
+            changed = np.array([prev.get(k) != format(int(f), "016x") for k, f in zip(keys, fingerprints)], dtype=bool)
+            stale = {k for k, c in zip(keys, changed) if c} | (set(prev) - set(keys))
+            primary["needed"] &= changed
+            print(f"Incremental: rescoring {int(changed.sum())} of {n_groups} groups "
+                  f"({len(stale) - int(changed.sum())} removed)")
+
+    # One pass per level and metric: rows of scored groups, grouped together but
+    # kept in original order inside each group (the order groupby(sort=False) yields).
+    with stage("score", rows=int(sum(lv["sizes"][lv["needed"]].sum() for lv in levels.values()))):
+        for lv in levels.values():
+            scored = lv["valid"] & lv["needed"]
+            if workers > 1:
+                lv["hits"] = _score_parallel(lv["codes"], lv["order"], lv["starts"], lv["sizes"], values, scored,
+                                             workers, min_group_size, z_threshold, quantile_method, sketch_alpha,
+                                             detectors)
+            else:
+                lv["hits"] = _score_rows(lv["codes"], lv["order"][scored[lv["codes"][lv["order"]]]], values,
+                                         len(lv["uniques"]), min_group_size, z_threshold,
+                                         quantile_method, sketch_alpha, detectors)
+
+    def _suffix(grouping):
+        return _output_suffix(grouping, groupings)
+
+    breakdowns = {b: c for b, c in TOP_GROUP_BREAKDOWNS.items() if c in df.columns}
+    _drop_stale_outputs(groupings, detectors, breakdowns)
+
+    # Top-group counters per (grouping, table suffix, detector), fed from the hits below.
+    metric_names = np.array([c for c, _ in metrics], dtype=object)
+    row_keys = {c: _level_codes(df, (c,), col_codes) for c in ["hcpcs_cd", "hcpcs_desc", *breakdowns.values()]}
+    counters = {}
+
+    # Full runs hand each anomaly table to a background writer as soon as it is built.
+    with OutputWriter() as writer:
+        with stage("materialize") as info:
+            frames = {}
+            for grouping in groupings:
+                # Block codes: each level's group codes shifted past the finer levels' codes.
+                hits = {d: [] for d in detectors}
+                keys, group_values, sizes = [], [], []
+                offset = 0
+                for depth, level in enumerate(_grouping_levels(grouping)):
+                    lv = levels[level]
+                    for d in detectors:
+                        for h in lv["hits"][d]:
+                            keep = assigned[grouping][h["row"]] == depth
+                            if keep.any():
+                                h = {k: v[keep] for k, v in h.items()}
+                                h["code"] = h["code"] + offset
+                                hits[d].append(h)
+                    keys.append(np.full(len(lv["uniques"]), _grouping_name(level), dtype=object))
+                    group_values.append(lv["uniques"])
+                    sizes.append(lv["sizes"])
+                    offset += len(lv["uniques"])
+                common = dict(df=df, id_cols=id_cols, metrics=metrics, group_keys=np.concatenate(keys),
+                              group_values=np.concatenate(group_values), group_sizes=np.concatenate(sizes))
+                scope = "HCPCS" if grouping == ("hcpcs_cd",) else _grouping_name(grouping)
+                # Table layouts: (column, key source) with source "metric", "code" (block code) or row codes.
+                base = [("anomaly_metric", "metric", metric_names)]
+                if grouping != ("hcpcs_cd",):
+                    base += [("group_key", "code", common["group_keys"]), ("group_value", "code", common["group_values"])]
+                base += [(c, *row_keys[c]) for c in ("hcpcs_cd", "hcpcs_desc")]
+                layouts = {_suffix(grouping): base}
+                if grouping == groupings[0]:
+                    for b, col in breakdowns.items():
+                        layouts[f"_{b}"] = base[:1] + [(c, *row_keys[c]) for c in ("hcpcs_cd", "hcpcs_desc", col)]
+                frames[grouping] = {}
+                for d in detectors:
+                    for name, layout in layouts.items():
+                        counter = counters[(grouping, name, d)] = _TopGroups([c for c, _, _ in layout])
+                        if hits[d] and stale is None:
+                            cat = {k: np.concatenate([h[k] for h in hits[d]]) for k in ("row", "code", "metric")}
+                            counter.add([cat[src] if isinstance(src, str) else src[cat["row"]] for _, src, _ in layout],
+                                        [labels for _, _, labels in layout])
+                    frame = _anomaly_frame(hits=hits[d], method=DETECTORS[d]["label"],
+                                           reasons=[DETECTORS[d]["reason"].format(col=c, scope=scope, threshold=z_threshold,
+                                                                                  mad_threshold=MAD_THRESHOLD)
+                                                    for c, _ in metrics], **common)
+                    frames[grouping][d] = frame
+                    if stale is None:
+                        writer.csv(frame, os.path.join(ANOM_DIR, f"anomalies_{d}{_suffix(grouping)}.csv"), index=False)
+            info["rows"] = sum(len(a) for by_method in frames.values() for a in by_method.values())
+
+        if stale is not None:
+            with stage("write_csv", rows=info["rows"]):
+                group_rank = {str(u): i for i, u in enumerate(uniques)}
+                metric_rank = {c: i for i, (c, _) in enumerate(metrics)}
+                for d, frame in frames[groupings[0]].items():
+                    path = os.path.join(ANOM_DIR, f"anomalies_{d}.csv")
+                    frames[groupings[0]][d] = _patch_anomaly_csv(path, frame, stale, group_rank, metric_rank)
+        primary_frames = frames[groupings[0]]
+        empty = pd.DataFrame(columns=["anomaly_metric"])
+        anomalies_iqr = primary_frames.get("iqr", empty)
+        anomalies_z = primary_frames.get("zscore", empty)
+
+
+        pay = _safe_numeric(df["avg_mdcr_pymt_amt"]).dropna()
+        ratio = _safe_numeric(df["submitted_to_payment_ratio"]).replace([np.inf, -np.inf], np.nan).dropna()
+
+
+        top_tables, breakdown_tables = {}, {d: {} for d in detectors}
+        with stage("top_groups", rows=sum(len(c.counts) for c in counters.values())):
+            for (grouping, name, d), counter in counters.items():
+                if stale is not None and grouping == groupings[0]:
+                    # Incremental runs only scored the changed groups: count the patched table instead.
+                    counter.add_frame(primary_frames[d])
+                top_groups = counter.top(top_n)
+                writer.csv(top_groups, os.path.join(TABLES_DIR, f"top_{d}_groups{name}.csv"), index=False)
+                if grouping == groupings[0] and name == "":
+                    top_tables[d] = top_groups
+                elif grouping == groupings[0]:
+                    breakdown_tables[d][name[1:]] = top_groups
+
+        _write_summary(len(df), len(available), groupings, min_group_size, quantile_method, sketch_alpha,
+                       _global_stats(pay), _global_stats(ratio), {d: len(f) for d, f in primary_frames.items()},
+                       {g: {d: len(f) for d, f in frames[g].items()} for g in groupings[1:]})
+
+        if compare_quantiles:
+            check = _quantile_check(codes, order, values, metrics, uniques, valid, sketch_alpha)
+            writer.csv(check, QUANTILE_CHECK_PATH, index=False)
+            print(f"Quantile check (alpha={sketch_alpha}): max relative error "
+                  f"q1={check['q1_rel_err'].max():.6f} q3={check['q3_rel_err'].max():.6f}; "
+                  f"IQR hits exact={int(check['exact_iqr_hits'].sum())} "
+                  f"sketch={int(check['sketch_iqr_hits'].sum())}")
+
+        if incremental:
+            writer.csv(_group_state(uniques, fingerprints, codes, order, group_sizes, values, metrics,
+                                    min_group_size, z_threshold), STATE_PATH, index=False)
+            if stale is not None:
+                _patch_summary_json(len(anomalies_iqr), len(anomalies_z))
+        elif os.path.exists(STATE_PATH):
+            # A full run rewrote the outputs; the stored fingerprints no longer describe them.
+            os.remove(STATE_PATH)
+
+        with stage("flush_writes"):
+            writer.wait()
 
     print("Analysis + anomalies done")
     print("Saved:")
-    print("-", out_iqr)
-    print("-", out_z)
+    for path in outputs:
+        print("-", path)
     print("-", SUMMARY_PATH)
-    print("-", os.path.join(TABLES_DIR, "top_iqr_groups.csv"))
-    print("-", os.path.join(TABLES_DIR, "top_zscore_groups.csv"))
+    for d in detectors:
+        print("-", os.path.join(TABLES_DIR, f"top_{d}_groups.csv"))
+    if breakdowns:
+        print("-", os.path.join(TABLES_DIR, f"top_{{{','.join(detectors)}}}_groups_{{{','.join(breakdowns)}}}.csv"))
+    for grouping in groupings[1:]:
+        print("-", os.path.join(ANOM_DIR, f"anomalies_{{{','.join(detectors)}}}{_suffix(grouping)}.csv"))
+    if compare_quantiles:
+        print("-", QUANTILE_CHECK_PATH)
+    if stale is not None:
+        return None
+    return {"anomalies": primary_frames, "top_groups": top_tables, "top_group_breakdowns": breakdown_tables}
+
+
 if __name__ == "__main__":
     analyze_and_detect()
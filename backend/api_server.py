@@ -0,0 +1,221 @@
+import os
+import json
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import pandas as pd
+
+from backend.export_results import (
+    ANOM_IQR_PATH, ANOM_Z_PATH, DASHBOARD_COLS, EXTRA_ANOM_PATHS, SUMMARY_JSON, TOP_GROUPS_JSON,
+    _read_if_exists, _sanitize_records,
+)
+from backend.facet_index import FACETS, build_facet_index, facet_rows, intersect_rows
+from backend.providers import TOP_PROVIDERS_JSON
+from backend.schema import COST_COLS
+
+ANOM_PATHS = [ANOM_IQR_PATH, ANOM_Z_PATH, *EXTRA_ANOM_PATHS.values()]
+MAX_LIMIT = 1000
+RESPONSE_CACHE_SIZE = 512
+
+_LOCK = threading.Lock()
+_STATE = {"version": None, "index": None, "responses": None}
+
+
+def _data_version() -> str:
+    """Cheap fingerprint of the analysis outputs (size + mtime), used for reloads and ETags."""
+    parts = []
+    for p in (*ANOM_PATHS, SUMMARY_JSON, TOP_GROUPS_JSON, TOP_PROVIDERS_JSON):
+        if os.path.exists(p):
+            st = os.stat(p)
+            parts.append(f"{p}:{st.st_size}:{st.st_mtime_ns}")
+        else:
+            parts.append(f"{p}:-")
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:16]
+
+
+def _build_index() -> dict:
+    """Load every detector's anomaly table once (as the dashboard export does) and build the facet index over them."""
+    frames = [_read_if_exists(p, usecols=lambda c: c in DASHBOARD_COLS) for p in ANOM_PATHS if os.path.exists(p)]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    df = df[[c for c in DASHBOARD_COLS if c in df.columns]]
+    sort = next((c for c in COST_COLS if c in df.columns), None)
+    return {"df": df, "facets": build_facet_index(df), "ranks": {}, "sort": sort}
+
+
+def _ensure_loaded() -> tuple:
+    """(version, index, response cache) of the current outputs, reloading them if they changed.
+
+    The three are swapped together under the lock, so a request keeps using the
+    snapshot it got even if a concurrent request reloads newer outputs.
+    """
+    version = _data_version()
+    with _LOCK:
+        if _STATE["version"] != version:
+            _STATE["index"] = _build_index()
+            _STATE["responses"] = OrderedDict()
+            _STATE["version"] = version
+        return _STATE["version"], _STATE["index"], _STATE["responses"]
+
+
+def _filter_rows(index: dict, filters: dict, skip: str = None) -> np.ndarray:
+    """Row ids matching all active filters (posting-list intersection)."""
+    lists = [facet_rows(index["facets"][p], v) for p, v in filters.items()
+             if p != skip and p in index["facets"]]
+    return intersect_rows(lists, len(index["df"]))
+
+
+def _sort_rank(index: dict, col: str, ascending: bool) -> np.ndarray:
+    """rank[row] = position of the row when sorted by `col` (NaN last); cached per column."""
+    key = (col, ascending)
+    if key not in index["ranks"]:
+        v = pd.to_numeric(index["df"][col], errors="coerce").to_numpy(dtype=np.float64)
+        v = v if ascending else -v
+        order = np.argsort(np.where(np.isnan(v), np.inf, v), kind="stable")
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        index["ranks"][key] = rank
+    return index["ranks"][key]
+
+
+def _parse_filters(query: dict) -> dict:
+    return {p: v for p, v in query.items() if p in FACETS and v not in ("", "ALL")}
+
+
+def _anomalies(index: dict, query: dict) -> dict:
+    df = index["df"]
+    filters = _parse_filters(query)
+    rows = _filter_rows(index, filters)
+
+    sort = query.get("sort") or index["sort"]
+    if sort is not None and sort not in df.columns:
+        raise ValueError(f"unknown sort column: {sort}")
+    ascending = query.get("order", "desc") == "asc"
+    if sort is not None and len(rows):
+        rows = rows[np.argsort(_sort_rank(index, sort, ascending)[rows], kind="stable")]
+
+    offset = max(int(query.get("offset", 0)), 0)
+    limit = min(max(int(query.get("limit", 50)), 0), MAX_LIMIT)
+    page = df.iloc[rows[offset:offset + limit]]
+    return {
+        "total": int(len(rows)),
+        "offset": offset,
+        "limit": limit,
+        "sort": sort,
+        "order": "asc" if ascending else "desc",
+        "rows": _sanitize_records(page),
+    }
+
+
+def _facet_counts(index: dict, query: dict) -> dict:
+    """Per-facet value counts under the other active filters (a facet never filters itself)."""
+    filters = _parse_filters(query)
+    out = {}
+    for param, facet in index["facets"].items():
+        codes = facet["codes"][_filter_rows(index, filters, skip=param)]
+        counts = np.bincount(codes[codes >= 0], minlength=len(facet["values"]))
+        out[param] = {
+            "column": facet["column"],
+            "values": [{"value": v, "count": int(c)} for v, c in zip(facet["values"], counts) if c > 0],
+        }
+    return out
+
+
+def _read_json(path: str):
+    if not os.path.exists(path):
+        raise KeyError(path)
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _render(index: dict, route: str, query: tuple):
+    """JSON body + ETag of one route over `index`."""
+    params = dict(query)
+    if route == "/api/summary":
+        payload = _read_json(SUMMARY_JSON)
+    elif route == "/api/top_groups":
+        payload = _read_json(TOP_GROUPS_JSON)
+    elif route == "/api/top_providers":
+        payload = _read_json(TOP_PROVIDERS_JSON)
+    elif route == "/api/anomalies":
+        payload = _anomalies(index, params)
+    elif route == "/api/facets":
+        payload = _facet_counts(index, params)
+    else:
+        raise KeyError(route)
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+    return body, etag
+
+
+def _cached_response(snapshot: tuple, route: str, query: tuple):
+    """_render for a (route, normalized query), LRU-cached in the snapshot's own per-version cache."""
+    _, index, responses = snapshot
+    key = (route, query)
+    with _LOCK:
+        if key in responses:
+            responses.move_to_end(key)
+            return responses[key]
+    result = _render(index, route, query)
+    with _LOCK:
+        responses[key] = result
+        while len(responses) > RESPONSE_CACHE_SIZE:
+            responses.popitem(last=False)
+    return result
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def _send(self, status: int, body: bytes = b"", etag: str = None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Cache-Control", "no-cache")
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = tuple(sorted((k, v[-1]) for k, v in parse_qs(url.query).items()))
+        try:
+            body, etag = _cached_response(_ensure_loaded(), url.path.rstrip("/"), query)
+        except KeyError:
+            return self._send(404, json.dumps({"error": f"not found: {url.path}"}).encode())
+        except ValueError as e:
+            return self._send(400, json.dumps({"error": str(e)}).encode())
+
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, etag=etag)
+        self._send(200, body, etag)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host: str = "127.0.0.1", port: int = 8000):
+    """Serve the dashboard query API over the local analysis outputs."""
+    _ensure_loaded()
+    server = ThreadingHTTPServer((host, port), _Handler)
+    print(f"Anomaly API listening on http://{host}:{port}/api/ (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local query API for the anomaly dashboard.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+    serve(args.host, args.port)
@@ -1,156 +1,80 @@
 
 import os
 import re
+import glob
 import json
+import time
 import numpy as np
 import pandas as pd
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
-BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+from backend.hashing import SeenHashes, row_hashes
+from backend.instrument import stage, timed
+from backend.parsing import parse_numeric
+from backend.schema import resolve_header, write_schema
+from backend.storage import CleanedWriter, common_dtype, compact_dtypes, memory_mb, read_cleaned, write_cleaned
+
+BASE_DIR = os.environ.get("CMS_PIPELINE_DIR") or os.path.dirname(os.path.dirname(__file__))
 
 RAW_PATH = os.path.join(BASE_DIR, "Data", "healthcare_raw.csv")
-CLEAN_PATH = os.path.join(BASE_DIR, "Data", "healthcare_cleaned.csv")
+
+# Files picked up when the raw input is a directory (compression is inferred from the suffix).
+RAW_PATTERNS = ["*.csv", "*.csv.gz", "*.csv.bz2", "*.csv.xz", "*.csv.zip"]
+
+# Data year in a raw file name: a 4-digit year, else CMS's "_D22_" style suffix.
+_YEAR_RE = re.compile(r"(?<!\d)((?:19|20)\d\d)(?!\d)")
+_CMS_YEAR_RE = re.compile(r"_D(\d\d)(?:_|\.)", re.IGNORECASE)
 
 REPORT_DIR = os.path.join(BASE_DIR, "outputs", "report")
 os.makedirs(REPORT_DIR, exist_ok=True)
 CLEAN_REPORT_PATH = os.path.join(REPORT_DIR, "01_cleaning_profile.txt")
 
+# Columns reported in the cleaning profile.
+KEY_COLS = ["hcpcs_cd", "hcpcs_desc", "rndrng_prvdr_type", "place_of_srvc",
+            "tot_srvcs", "tot_benes",
+            "avg_sbmtd_chrg_amt", "avg_mdcr_alowd_amt", "avg_mdcr_pymt_amt", "avg_mdcr_stdzd_amt"]
+MONEY_COLS = ["avg_sbmtd_chrg_amt", "avg_mdcr_alowd_amt", "avg_mdcr_pymt_amt", "avg_mdcr_stdzd_amt"]
 
-def _normalize_colname(c: str) -> str:
-    """Normalize column names to snake_case, lowercase, safe for matching."""
-    c = c.strip()
-    c = c.replace("\ufeff", "") 
-    c = c.lower()
-  
-    c = re.sub(r"[^\w]+", "_", c)
-    c = re.sub(r"_+", "_", c).strip("_")
-    return c
-
-
-def _coerce_numeric(series: pd.Series) -> pd.Series:
-    """Convert messy numeric strings to float (handles $, commas, blanks)."""
-    if series.dtype != object:
-        return pd.to_numeric(series, errors="coerce")
-
-    s = series.astype(str).str.strip()
-
- 
-    s = s.replace({"": np.nan, "nan": np.nan, "none": np.nan, "null": np.nan, "*": np.nan})
-
-    s = s.str.replace(r"[\$,]", "", regex=True)
 
-    s = s.str.replace(r"^\((.*)\)$", r"-\1", regex=True)
+def _clean_frame(df: pd.DataFrame, unparseable: dict = None) -> pd.DataFrame:
+    """Normalize, rename, coerce and derive features for one frame (or chunk); no dedup.
 
-    return pd.to_numeric(s, errors="coerce")
+    Counts of non-empty numeric cells that failed to parse are added into `unparseable`.
+    """
+    with stage("normalize", rows=len(df)):
+        df.columns = resolve_header(df.columns)
 
-
-def clean_data():
-    print("Reading raw CSV:", RAW_PATH)
-    df = pd.read_csv(RAW_PATH, low_memory=False)
-
-    original_cols = list(df.columns)
-    df.columns = [_normalize_colname(c) for c in df.columns]
-
-  
-    rename_map = {}
-
-    def pick(*candidates):
-        for c in candidates:
-            if c in df.columns:
-                return c
-        return None
-
-   
-    c_npi = pick("rndrng_npi", "rendering_npi", "npi")
-    if c_npi: rename_map[c_npi] = "rndrng_npi"
-
-    c_ptype = pick("rndrng_prvdr_type", "provider_type", "provider_type_desc", "prvdr_type")
-    if c_ptype: rename_map[c_ptype] = "rndrng_prvdr_type"
-
- 
-    c_hcpcs = pick("hcpcs_cd", "hcpcs_code", "hcpcs")
-    if c_hcpcs: rename_map[c_hcpcs] = "hcpcs_cd"
-
-    c_desc = pick("hcpcs_desc", "hcpcs_description", "hcpcs_desc_txt", "hcpcs_description_txt")
-    if c_desc: rename_map[c_desc] = "hcpcs_desc"
-
-    c_drug = pick("hcpcs_drug_ind", "drug_ind", "hcpcs_drug_indicator")
-    if c_drug: rename_map[c_drug] = "hcpcs_drug_ind"
-
-   
-    c_pos = pick("place_of_srvc", "place_of_service", "pos", "place_of_svc")
-    if c_pos: rename_map[c_pos] = "place_of_srvc"
-
-
-    c_srvcs = pick("tot_srvcs", "total_services", "tot_srvs", "line_srvc_cnt", "line_service_cnt")
-    if c_srvcs: rename_map[c_srvcs] = "tot_srvcs"
-
-    c_benes = pick("tot_benes", "total_beneficiaries", "bene_unique_cnt", "bene_cnt")
-    if c_benes: rename_map[c_benes] = "tot_benes"
-
- 
-    c_sub = pick(
-        "avg_sbmtd_chrg",
-        "average_submitted_charge_amount",
-        "avg_sbmtd_chrg_amt",
-        "average_submitted_charge_amt",
-        "avg_submitted_charge_amt"
-    )
-    if c_sub: rename_map[c_sub] = "avg_sbmtd_chrg_amt"
-
-    c_allowed = pick(
-        "avg_mdcr_alowd_amt",
-        "average_medicare_allowed_amount",
-        "avg_mdcr_allowed_amt",
-        "average_medicare_allowed_amt"
-    )
-    if c_allowed: rename_map[c_allowed] = "avg_mdcr_alowd_amt"
-
-    c_pay = pick(
-        "avg_mdcr_pymt_amt",
-        "average_medicare_payment_amount",
-        "avg_mdcr_payment_amt",
-        "average_medicare_payment_amt"
-    )
-    if c_pay: rename_map[c_pay] = "avg_mdcr_pymt_amt"
-
-    c_std = pick(
-        "avg_mdcr_stdzd_amt",
-        "average_medicare_standardized_amount",
-        "avg_mdcr_standardized_amt",
-        "average_medicare_standardized_amt"
-    )
-    if c_std: rename_map[c_std] = "avg_mdcr_stdzd_amt"
-
-
-    df = df.rename(columns=rename_map)
-
-  
-    for col in ["hcpcs_cd", "hcpcs_desc", "rndrng_prvdr_type", "place_of_srvc", "hcpcs_drug_ind"]:
-        if col in df.columns:
-            df[col] = df[col].astype(str).str.strip()
-            df[col] = df[col].replace({"nan": np.nan, "None": np.nan, "": np.nan})
-
-    
-    if "hcpcs_cd" in df.columns:
-        df["hcpcs_cd"] = df["hcpcs_cd"].astype(str).str.upper().str.strip()
-        df.loc[df["hcpcs_cd"].isin(["NAN", "NONE"]), "hcpcs_cd"] = np.nan
-
- 
-    if "place_of_srvc" in df.columns:
-        df["place_of_srvc"] = df["place_of_srvc"].astype(str).str.upper().str.strip()
-        df.loc[df["place_of_srvc"].isin(["NAN", "NONE"]), "place_of_srvc"] = np.nan
-        df["place_of_srvc_label"] = df["place_of_srvc"].map({
-            "F": "Facility",
-            "O": "Office"
-        }).fillna("Unknown")
+      
+        for col in ["hcpcs_cd", "hcpcs_desc", "rndrng_prvdr_type", "place_of_srvc", "hcpcs_drug_ind"]:
+            if col in df.columns:
+                df[col] = df[col].astype(str).str.strip()
+                df[col] = df[col].replace({"nan": np.nan, "None": np.nan, "": np.nan})
+
+        
+        if "hcpcs_cd" in df.columns:
+            df["hcpcs_cd"] = df["hcpcs_cd"].astype(str).str.upper().str.strip()
+            df.loc[df["hcpcs_cd"].isin(["NAN", "NONE"]), "hcpcs_cd"] = np.nan
+
+     
+        if "place_of_srvc" in df.columns:
+            df["place_of_srvc"] = df["place_of_srvc"].astype(str).str.upper().str.strip()
+            df.loc[df["place_of_srvc"].isin(["NAN", "NONE"]), "place_of_srvc"] = np.nan
+            df["place_of_srvc_label"] = df["place_of_srvc"].map({
+                "F": "Facility",
+                "O": "Office"
+            }).fillna("Unknown")
 
     numeric_cols = [
         "tot_srvcs", "tot_benes",
         "avg_sbmtd_chrg_amt", "avg_mdcr_alowd_amt", "avg_mdcr_pymt_amt", "avg_mdcr_stdzd_amt"
     ]
-    for col in numeric_cols:
-        if col in df.columns:
-            df[col] = _coerce_numeric(df[col])
+    with stage("coerce", rows=len(df)):
+        for col in numeric_cols:
+            if col in df.columns:
+                df[col], bad = parse_numeric(df[col])
+                if unparseable is not None:
+                    unparseable[col] = unparseable.get(col, 0) + bad
 
   
     has_payment = "avg_mdcr_pymt_amt" in df.columns
@@ -179,47 +103,364 @@ def clean_data():
     if "avg_mdcr_alowd_amt" in df.columns and has_payment:
         df["payment_to_allowed_ratio"] = df["avg_mdcr_pymt_amt"] / df["avg_mdcr_alowd_amt"].replace({0: np.nan})
 
-  
-    before = len(df)
-    df = df.drop_duplicates()
-    after = len(df)
+    return df
+
 
+def _money_stats(s: pd.Series) -> str:
+    return f"mean={s.mean():.4f}, median={s.median():.4f}, min={s.min():.4f}, max={s.max():.4f}"
 
-    df.to_csv(CLEAN_PATH, index=False)
 
-    
+def _stored_money_stats(columns) -> dict:
+    """Exact money stats of a store that was never whole in memory: one column read back at a time."""
+    money_stats = {}
+    for c in [c for c in MONEY_COLS if c in columns]:
+        s = read_cleaned(columns=[c])[c].dropna()
+        money_stats[c] = _money_stats(s) if len(s) > 0 else None
+    return money_stats
+
+
+def _write_profile(clean_path, original_cols, columns, rows, duplicates, missing, money_stats, unparseable,
+                   footprint, dtypes, raw_path=RAW_PATH, sources=None):
     with open(CLEAN_REPORT_PATH, "w", encoding="utf-8") as f:
         f.write("=== Cleaning Profile ===\n")
-        f.write(f"raw_path: {RAW_PATH}\n")
-        f.write(f"clean_path: {CLEAN_PATH}\n\n")
+        f.write(f"raw_path: {raw_path}\n")
+        f.write(f"clean_path: {clean_path}\n\n")
+        if sources:
+            f.write(f"source_files: {len(sources)}\n")
+            for src in sources:
+                f.write(f"- {src['file']}: year={src['year']}, rows_read={src['rows_read']}, "
+                        f"rows_kept={src['rows_kept']}, duplicates_removed={src['duplicates']}, "
+                        f"seconds={src['seconds']:.3f}\n")
+            f.write("\n")
         f.write(f"original_columns_count: {len(original_cols)}\n")
-        f.write(f"normalized_columns_count: {len(df.columns)}\n")
+        f.write(f"normalized_columns_count: {len(columns)}\n")
         f.write("normalized_columns:\n")
-        for c in df.columns:
+        for c in columns:
             f.write(f"- {c}\n")
         f.write("\n")
-        f.write(f"rows_after_cleaning: {len(df)}\n")
-        f.write(f"duplicates_removed: {before - after}\n\n")
+        f.write(f"rows_after_cleaning: {rows}\n")
+        f.write(f"duplicates_removed: {duplicates}\n\n")
 
-   
-        key_cols = ["hcpcs_cd", "hcpcs_desc", "rndrng_prvdr_type", "place_of_srvc",
-                    "tot_srvcs", "tot_benes",
-                    "avg_sbmtd_chrg_amt", "avg_mdcr_alowd_amt", "avg_mdcr_pymt_amt", "avg_mdcr_stdzd_amt"]
         f.write("missing_values_key_columns:\n")
-        for c in key_cols:
-            if c in df.columns:
-                f.write(f"- {c}: {int(df[c].isna().sum())}\n")
+        for c, n in missing.items():
+            f.write(f"- {c}: {n}\n")
+        f.write("\n")
+
+        f.write("unparseable_numeric_cells:\n")
+        for c, n in unparseable.items():
+            f.write(f"- {c}: {n}\n")
         f.write("\n")
 
-       
-        money_cols = [c for c in ["avg_sbmtd_chrg_amt", "avg_mdcr_alowd_amt", "avg_mdcr_pymt_amt", "avg_mdcr_stdzd_amt"] if c in df.columns]
-        if money_cols:
+        f.write("memory_footprint_mb:\n")
+        f.write(f"- parsed: {footprint[0]:.1f}\n")
+        f.write(f"- compact: {footprint[1]:.1f}\n")
+        f.write("column_dtypes:\n")
+        for c, d in dtypes.items():
+            f.write(f"- {c}: {d}\n")
+        f.write("\n")
+
+        if money_stats:
             f.write("money_column_stats:\n")
-            for c in money_cols:
+            for c, stats in money_stats.items():
+                if stats:
+                    f.write(f"- {c}: {stats}\n")
+
+
+def _raw_dtypes(path: str, chunksize: int = None) -> dict:
+    """dtype a whole-file read_csv gives each column of `path` (keyed by resolved name), one chunk at a time.
+
+    Passed back as read_csv's `dtype`, chunks then parse exactly as the whole
+    file would: ids stay int64, and a code column the file holds as numbers
+    keeps the text it has when loaded whole.
+    """
+    dtypes = {}
+    reader = pd.read_csv(path, chunksize=chunksize, low_memory=False) if chunksize else [pd.read_csv(path, low_memory=False)]
+    for chunk in reader:
+        if chunk.empty:
+            continue  # a header-only file says nothing about its columns' types
+        for c, t in zip(resolve_header(chunk.columns), chunk.dtypes):
+            dtypes[c] = common_dtype(dtypes[c], t) if c in dtypes else t
+    return dtypes
+
+
+def _read_dtypes(path: str, dtypes: dict) -> dict:
+    """`dtypes` (by resolved name) keyed by the raw headers of `path`, for read_csv."""
+    header = list(pd.read_csv(path, nrows=0).columns)
+    return {raw: dtypes[c] for raw, c in zip(header, resolve_header(header)) if c in dtypes}
+
+
+def _clean_streaming(chunksize: int, export_csv: bool, raw_path: str = RAW_PATH):
+    """Clean one raw file chunk by chunk; memory is bounded by the chunk plus an 8-byte hash per kept row."""
+    print(f"Streaming raw CSV in chunks of {chunksize}:", raw_path)
+    original_cols = list(pd.read_csv(raw_path, nrows=0).columns)
+
+    writer = CleanedWriter(export_csv=export_csv)
+    seen = SeenHashes()
+    columns = None
+    rows = 0
+    duplicates = 0
+    missing = {}
+    unparseable = {}
+    footprint = [0.0, 0.0]
+    dtypes = {}
+
+    # Whole-file dtypes, so every chunk cleans as its rows would in the in-memory path.
+    with stage("prescan"):
+        raw_dtypes = _read_dtypes(raw_path, _raw_dtypes(raw_path, chunksize))
+    reader = pd.read_csv(raw_path, chunksize=chunksize, dtype=raw_dtypes)
+    while True:
+        with stage("read") as info:
+            chunk = next(reader, None)
+            info["rows"] = 0 if chunk is None else len(chunk)
+        if chunk is None:
+            break
+        chunk = _clean_frame(chunk, unparseable)
+        footprint[0] += memory_mb(chunk)
+        chunk = compact_dtypes(chunk, downcast=False)
+        footprint[1] += memory_mb(chunk)
+
+        with stage("dedup", rows=len(chunk)):
+            keep = seen.first_seen(row_hashes(chunk))
+            duplicates += int(len(chunk) - keep.sum())
+            chunk = chunk[keep]
+
+        if columns is None:
+            columns = list(chunk.columns)
+        rows += len(chunk)
+        for c in KEY_COLS:
+            if c in chunk.columns:
+                missing[c] = missing.get(c, 0) + int(chunk[c].isna().sum())
+        with stage("write", rows=len(chunk)):
+            writer.write(chunk)
+
+    with stage("write"):
+        clean_path = writer.close()
+    if columns is not None:
+        write_schema(original_cols, writer.template)
+        dtypes = {c: str(t) for c, t in writer.template.dtypes.items()}
+
+    # Exact medians need the full column: read back just the money columns, one at a time.
+    with stage("profile", rows=rows):
+        money_stats = _stored_money_stats(columns or [])
+
+    _write_profile(clean_path, original_cols, columns or [], rows, duplicates, missing, money_stats, unparseable,
+                   footprint, dtypes, raw_path=raw_path)
+    return clean_path
+
+
+def raw_files(raw: str = None) -> list:
+    """Raw CSV files behind `raw`: a file, a directory (every RAW_PATTERNS match) or a glob."""
+    raw = raw or RAW_PATH
+    if os.path.isfile(raw):
+        return [raw]
+    if os.path.isdir(raw):
+        files = {p for pattern in RAW_PATTERNS for p in glob.glob(os.path.join(raw, pattern))}
+    else:
+        files = {p for p in glob.glob(raw) if os.path.isfile(p)}
+    if not files:
+        raise FileNotFoundError(f"no raw CSV files found at {raw}")
+    return sorted(files)
+
+
+def file_year(path: str):
+    """Data year encoded in a raw file name, or None."""
+    name = os.path.basename(path)
+    m = _YEAR_RE.findall(name)
+    if m:
+        return int(m[-1])
+    m = _CMS_YEAR_RE.search(name)
+    return 2000 + int(m.group(1)) if m else None
+
+
+def _clean_file(path: str, chunksize: int = None, dtypes: dict = None):
+    """Read, clean and dedup one raw file (runs in a pool worker).
+
+    Columns are read with `dtypes` (by resolved name: what a read of every file
+    as one would infer), so all files clean as the rows of one file would.
+    Returns (cleaned compact frame tagged with source_file/year, unparseable
+    counts, stats).
+    """
+    t0 = time.perf_counter()
+    unparseable = {}
+    frames = []
+    rows_read = 0
+    read_dtypes = _read_dtypes(path, dtypes or {})
+    reader = (pd.read_csv(path, chunksize=chunksize, dtype=read_dtypes) if chunksize
+              else [pd.read_csv(path, low_memory=False, dtype=read_dtypes)])
+    for chunk in reader:
+        rows_read += len(chunk)
+        frames.append(_clean_frame(chunk, unparseable))
+    if not frames:
+        frames.append(_clean_frame(pd.read_csv(path, nrows=0, dtype=read_dtypes)))
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    del frames
+
+    year = file_year(path)
+    df["source_file"] = os.path.basename(path)
+    df["year"] = pd.array([year] * len(df), dtype="Int64")
+    # Rows are tagged with their file, so duplicates can only occur within one file.
+    before = len(df)
+    df = df.drop_duplicates()
+    parsed_mb = memory_mb(df)
+    df = compact_dtypes(df, downcast=False)
+    stats = {"file": os.path.basename(path), "year": year, "rows_read": rows_read, "rows_kept": len(df),
+             "duplicates": before - len(df), "seconds": time.perf_counter() - t0,
+             "footprint": (parsed_mb, memory_mb(df))}
+    return df, unparseable, stats
+
+
+def _file_template(files: list, dtypes: dict):
+    """Empty frame with the merged columns and dtypes of every file (from their headers), plus the headers."""
+    headers = [list(pd.read_csv(path, nrows=0).columns) for path in files]
+    probes = [_clean_frame(pd.read_csv(path, nrows=0, dtype=_read_dtypes(path, dtypes))) for path in files]
+    template = pd.concat(probes, ignore_index=True, sort=False)
+    # An empty probe parses its numeric columns as int64; any file may hold fractions or gaps.
+    numeric = template.select_dtypes(include="number").columns
+    template[numeric] = template[numeric].astype(np.float64)
+    template["source_file"] = pd.Series(dtype=object)
+    template["year"] = pd.array([], dtype="Int64")
+    return compact_dtypes(template, downcast=False), headers
+
+
+def _conform(df: pd.DataFrame, template: pd.DataFrame) -> pd.DataFrame:
+    """`df` with the template's columns, in its order; columns the file lacks are all-missing."""
+    for c in template.columns:
+        if c not in df.columns:
+            df[c] = pd.Series(None, index=df.index, dtype=object).astype(template[c].dtype)
+    return df[list(template.columns)]
+
+
+def _merged_dtypes(files: list, chunksize: int, workers: int) -> dict:
+    """_raw_dtypes of every file combined, as if the files were one."""
+    if workers <= 1 or len(files) == 1:
+        found = [_raw_dtypes(path, chunksize) for path in files]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(files))) as pool:
+            found = list(pool.map(_raw_dtypes, files, [chunksize] * len(files)))
+    dtypes = {}
+    for file_dtypes in found:
+        for c, t in file_dtypes.items():
+            dtypes[c] = common_dtype(dtypes[c], t) if c in dtypes else t
+    return dtypes
+
+
+def _iter_cleaned(files: list, chunksize: int, workers: int, dtypes: dict):
+    """_clean_file results in file order, with at most `workers` files in flight."""
+    if workers <= 1 or len(files) == 1:
+        for path in files:
+            yield _clean_file(path, chunksize, dtypes)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(files))) as pool:
+        pending = deque(pool.submit(_clean_file, path, chunksize, dtypes) for path in files[:workers])
+        queued = files[workers:]
+        while pending:
+            result = pending.popleft().result()
+            if queued:
+                pending.append(pool.submit(_clean_file, queued.pop(0), chunksize, dtypes))
+            yield result
+
+
+def _clean_files(files: list, raw: str, export_csv: bool, chunksize: int, workers: int):
+    """Clean several raw files in parallel and append them to one store, in file order.
+
+    Each file's cleaned frame is written as soon as it (and every file before it)
+    is done, so the parent holds at most `workers` cleaned files at a time.
+    """
+    print(f"Reading {len(files)} raw CSV files:", raw)
+    with stage("prescan"):
+        dtypes = _merged_dtypes(files, chunksize, workers)
+    template, headers = _file_template(files, dtypes)
+    original_cols = list(dict.fromkeys(c for header in headers for c in header))
+    columns = list(template.columns)
+
+    writer = CleanedWriter(export_csv=export_csv)
+    writer.write(template)
+    sources = []
+    unparseable = {}
+    missing = {}
+    footprint = [0.0, 0.0]
+    with stage("read_files") as info:
+        for df, counts, stats in _iter_cleaned(files, chunksize, workers, dtypes):
+            for c, n in counts.items():
+                unparseable[c] = unparseable.get(c, 0) + n
+            footprint = [footprint[0] + stats["footprint"][0], footprint[1] + stats["footprint"][1]]
+            sources.append(stats)
+            df = _conform(df, template)
+            for c in KEY_COLS:
+                if c in df.columns:
+                    missing[c] = missing.get(c, 0) + int(df[c].isna().sum())
+            with stage("write", rows=len(df)):
+                writer.write(df)
+        info["rows"] = sum(s["rows_read"] for s in sources)
+
+    with stage("write"):
+        clean_path = writer.close()
+        write_schema(original_cols, writer.template, headers=headers)
+
+    rows = sum(s["rows_kept"] for s in sources)
+    with stage("profile", rows=rows):
+        money_stats = _stored_money_stats(columns)
+
+    _write_profile(clean_path, original_cols, columns, rows, sum(s["duplicates"] for s in sources), missing,
+                   money_stats, unparseable, footprint, {c: str(t) for c, t in writer.template.dtypes.items()},
+                   raw_path=raw, sources=sources)
+    return clean_path
+
+
+@timed("clean")
+def clean_data(export_csv: bool = False, chunksize: int = None, return_frame: bool = False,
+               raw: str = None, workers: int = 1):
+    """Clean the raw CMS extract into the columnar store (optionally also as CSV).
+
+    With `chunksize`, the raw file is streamed in fixed-size chunks instead of loaded whole.
+    `raw` may name a directory or glob of raw files (gzip/bz2/xz/zip included): each
+    file is cleaned in its own worker process (`workers` at a time), tagged with
+    source_file/year columns, and the results are merged into one store.
+    A single file (the default RAW_PATH, or a `raw` resolving to one file) is cleaned as is.
+    Returns the store path, or with `return_frame` the cleaned frame itself so the
+    next stage can skip reading it back (None when streaming or merging several
+    files: the data is never whole).
+    """
+    files = raw_files(raw)
+    df = None
+    if len(files) > 1:
+        clean_path = _clean_files(files, raw, export_csv, chunksize, workers)
+    elif chunksize:
+        clean_path = _clean_streaming(chunksize, export_csv, files[0])
+    else:
+        raw_path = files[0]
+        print("Reading raw CSV:", raw_path)
+        with stage("read") as info:
+            df = pd.read_csv(raw_path, low_memory=False)
+            info["rows"] = len(df)
+        original_cols = list(df.columns)
+
+        unparseable = {}
+        df = _clean_frame(df, unparseable)
+        footprint = [memory_mb(df)]
+        df = compact_dtypes(df)
+        footprint.append(memory_mb(df))
+
+        before = len(df)
+        with stage("dedup", rows=before):
+            df = df.drop_duplicates()
+        after = len(df)
+
+        with stage("write", rows=after):
+            clean_path = write_cleaned(df, export_csv=export_csv)
+            write_schema(original_cols, df)
+
+        with stage("profile", rows=after):
+            missing = {c: int(df[c].isna().sum()) for c in KEY_COLS if c in df.columns}
+            money_stats = {}
+            for c in [c for c in MONEY_COLS if c in df.columns]:
                 s = df[c].dropna()
-                if len(s) > 0:
-                    f.write(f"- {c}: mean={s.mean():.4f}, median={s.median():.4f}, min={s.min():.4f}, max={s.max():.4f}\n")
+                money_stats[c] = _money_stats(s) if len(s) > 0 else None
+
+            _write_profile(clean_path, original_cols, list(df.columns), after, before - after, missing, money_stats,
+                           unparseable, footprint, {c: str(t) for c, t in df.dtypes.items()}, raw_path=raw_path)
 
     print("Cleaning done ")
-    print("Saved:", CLEAN_PATH)
+    print("Saved:", clean_path)
     print("Report:", CLEAN_REPORT_PATH)
+    return df if return_frame else clean_path
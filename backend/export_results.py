@@ -1,12 +1,18 @@
 
 import os
-import json
 import math
+import numpy as np
 import pandas as pd
 
-BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+from backend.facet_index import write_facet_index
+from backend.instrument import stage, timed
+from backend.json_records import write_records_json
+from backend.schema import cost_column, key_columns_present, pick_cost_column, resolve_roles, stored_columns
+from backend.sketch import DEFAULT_ALPHA, QUANTILE_METHODS, QuantileSketch
+from backend.storage import iter_cleaned, plain_dtypes, read_cleaned
+from backend.writers import OutputWriter, atomic_path, write_json
 
-CLEAN_PATH = os.path.join(BASE_DIR, "Data", "healthcare_cleaned.csv")
+BASE_DIR = os.environ.get("CMS_PIPELINE_DIR") or os.path.dirname(os.path.dirname(__file__))
 
 ANOM_IQR_PATH = os.path.join(BASE_DIR, "outputs", "anomalies", "anomalies_iqr.csv")
 ANOM_Z_PATH = os.path.join(BASE_DIR, "outputs", "anomalies", "anomalies_zscore.csv")
@@ -14,6 +20,14 @@ ANOM_Z_PATH = os.path.join(BASE_DIR, "outputs", "anomalies", "anomalies_zscore.c
 TOP_IQR_GROUPS = os.path.join(BASE_DIR, "outputs", "tables", "top_iqr_groups.csv")
 TOP_Z_GROUPS = os.path.join(BASE_DIR, "outputs", "tables", "top_zscore_groups.csv")
 
+# Opt-in robust detectors; exported only when the analysis step wrote them.
+EXTRA_DETECTORS = ("mad", "log_zscore")
+EXTRA_ANOM_PATHS = {d: os.path.join(BASE_DIR, "outputs", "anomalies", f"anomalies_{d}.csv") for d in EXTRA_DETECTORS}
+EXTRA_TOP_GROUPS = {d: os.path.join(BASE_DIR, "outputs", "tables", f"top_{d}_groups.csv") for d in EXTRA_DETECTORS}
+# Top groups split by state / place of service (analysis.TOP_GROUP_BREAKDOWNS), exported when written.
+TOP_GROUP_SPLITS = {(d, b): os.path.join(BASE_DIR, "outputs", "tables", f"top_{d}_groups_{b}.csv")
+                    for d in ("iqr", "zscore") + EXTRA_DETECTORS for b in ("state", "pos")}
+
 OUT_DIR = os.path.join(BASE_DIR, "outputs")
 os.makedirs(OUT_DIR, exist_ok=True)
 
@@ -21,6 +35,29 @@ SUMMARY_JSON = os.path.join(OUT_DIR, "summary.json")
 ANOM_JSON = os.path.join(OUT_DIR, "anomalies.json")
 TOP_GROUPS_JSON = os.path.join(OUT_DIR, "top_groups.json")
 
+# Anomaly columns shipped to the dashboard (JSON exports and the query API).
+DASHBOARD_COLS = [
+    "hcpcs_cd", "hcpcs_desc",
+    "rndrng_npi", "rndrng_prvdr_last_org_name", "rndrng_prvdr_first_name",
+    "rndrng_prvdr_type",
+    "rndrng_prvdr_state_abrvtn", "rndrng_prvdr_city",
+    "place_of_srvc_label",
+    "tot_benes", "tot_srvcs",
+    "avg_sbmtd_chrg_amt", "avg_mdcr_alowd_amt", "avg_mdcr_pymt_amt", "avg_mdcr_stdzd_amt",
+    "submitted_to_payment_ratio", "payment_to_allowed_ratio",
+    "anomaly_method", "anomaly_metric", "anomaly_metric_label", "anomaly_reason",
+    "group_size"
+]
+
+# Full anomaly list, cost-sorted, as compact NDJSON pages + manifest for lazy loading.
+PAGES_DIR = os.path.join(OUT_DIR, "anomaly_pages")
+PAGES_MANIFEST = os.path.join(PAGES_DIR, "manifest.json")
+# Inverted index over the paged rows (row id = position in the paged export).
+FACET_INDEX_JSON = os.path.join(PAGES_DIR, "facet_index.json")
+PAGE_SIZE = 50000
+# anomalies.json / top_groups.json layout: None writes compact JSON, 2 the old indented files.
+JSON_INDENT = None
+
 
 def _to_py(x):
     """Convert numpy/pandas scalars to plain Python types + handle NaN/inf."""
@@ -64,41 +101,164 @@ def _sanitize_records(df: pd.DataFrame):
     return out
 
 
-def _read_if_exists(path: str) -> pd.DataFrame:
+def _read_if_exists(path: str, usecols=None) -> pd.DataFrame:
     if os.path.exists(path) and os.path.getsize(path) > 0:
-        return pd.read_csv(path, low_memory=False)
+        return pd.read_csv(path, low_memory=False, usecols=usecols)
     return pd.DataFrame()
 
 
-def _pick_cost_column(df: pd.DataFrame) -> str:
- 
-    priority = [
-        "avg_mdcr_pymt_amt",
-        "avg_mdcr_stdzd_amt",
-        "avg_mdcr_alowd_amt",
-        "avg_sbmtd_chrg_amt",
-        "price_amt",
-    ]
-    for c in priority:
-        if c in df.columns:
-            return c
-   
-    numeric_cols = df.select_dtypes(include=["number"]).columns.tolist()
-    return numeric_cols[0] if numeric_cols else "price_amt"
+def _write_page(page: pd.DataFrame, path: str):
+    with atomic_path(path) as tmp:
+        page.to_json(tmp, orient="records", lines=True, force_ascii=False)
 
 
-def export_for_dashboard():
-   
-    df = pd.read_csv(CLEAN_PATH, low_memory=False)
-    cost_col = _pick_cost_column(df)
+def _write_anomaly_pages(all_anoms: pd.DataFrame, sort_col, page_size: int = PAGE_SIZE, writer: OutputWriter = None):
+    """Write every anomaly (already sorted) as NDJSON pages + facet index, then the manifest.
 
-  
-    s = pd.to_numeric(df[cost_col], errors="coerce").replace([float("inf"), -float("inf")], pd.NA).dropna()
+    Pages go through `writer` when given; the manifest is only replaced once they are all on disk.
+    """
+    os.makedirs(PAGES_DIR, exist_ok=True)
+    for name in os.listdir(PAGES_DIR):
+        if name.startswith("page-") and name.endswith(".ndjson"):
+            os.remove(os.path.join(PAGES_DIR, name))
+
+    pages, written = [], []
+    for i, start in enumerate(range(0, len(all_anoms), page_size)):
+        page = all_anoms.iloc[start:start + page_size]
+        name = f"page-{i:05d}.ndjson"
+        if writer is None:
+            _write_page(page, os.path.join(PAGES_DIR, name))
+        else:
+            written.append(writer.submit(_write_page, page, os.path.join(PAGES_DIR, name)))
+        entry = {"file": name, "offset": start, "rows": int(len(page))}
+        if sort_col:
+            entry["max_cost"] = _to_py(page[sort_col].iloc[0])
+            entry["min_cost"] = _to_py(page[sort_col].iloc[-1])
+        pages.append(entry)
+
+    write_facet_index(all_anoms, FACET_INDEX_JSON)
+    for fut in written:
+        fut.result()
+
+    manifest = {
+        "total_rows": int(len(all_anoms)),
+        "page_size": page_size,
+        "sort_column": sort_col,
+        "sort_order": "desc",
+        "columns": list(all_anoms.columns),
+        "pages": pages,
+        "facet_index": os.path.basename(FACET_INDEX_JSON),
+    }
+    write_json(manifest, PAGES_MANIFEST, indent=2, ensure_ascii=False)
+
+
+def _sketch_cost_stats(cost_col: str, alpha: float, batches=None):
+    """Global cost stats in one streaming pass: exact count/mean/std/min/max, sketched quantiles.
+
+    `batches` defaults to streaming the cleaned store.
+    """
+    sketch = QuantileSketch(alpha=alpha)
+    rows = missing = n = 0
+    mean = m2 = 0.0
+    lo, hi = math.inf, -math.inf
+    for batch in (iter_cleaned(columns=[cost_col]) if batches is None else batches):
+        rows += len(batch)
+        missing += int(batch[cost_col].isna().sum())
+        x = pd.to_numeric(batch[cost_col], errors="coerce").to_numpy(dtype=np.float64)
+        x = x[np.isfinite(x)]
+        if len(x) == 0:
+            continue
+        sketch.add(x)
+        # Chan et al. pairwise update of the running mean / sum of squared deviations.
+        bn = len(x)
+        bmean = x.mean()
+        bm2 = ((x - bmean) ** 2).sum()
+        delta = bmean - mean
+        total = n + bn
+        mean += delta * bn / total
+        m2 += bm2 + delta * delta * n * bn / total
+        n = total
+        lo, hi = min(lo, float(x.min())), max(hi, float(x.max()))
+
+    stats = {}
+    if n > 0:
+        q1, q3 = float(sketch.quantile(0.25)[0]), float(sketch.quantile(0.75)[0])
+        iqr = q3 - q1
+        stats = {
+            "cost_mean": float(mean),
+            "cost_median": float(sketch.quantile(0.5)[0]),
+            "cost_min": lo,
+            "cost_max": hi,
+            "cost_std": float(math.sqrt(m2 / n)),
+            "Q1": q1,
+            "Q3": q3,
+            "IQR": iqr,
+            "IQR_lower_bound": q1 - 1.5 * iqr,
+            "IQR_upper_bound": q3 + 1.5 * iqr,
+        }
+    return rows, missing, stats
+
+
+def _handed_off(frame, usecols=None) -> pd.DataFrame:
+    """An in-memory stage result with the columns and dtypes `_read_if_exists` would give."""
+    if frame is None or len(frame) == 0:
+        return pd.DataFrame()
+    if usecols is not None:
+        frame = frame[[c for c in frame.columns if usecols(c)]]
+    return plain_dtypes(frame)
+
+
+@timed("export")
+def export_for_dashboard(quantile_method: str = "exact", sketch_alpha: float = DEFAULT_ALPHA,
+                         cleaned: pd.DataFrame = None, analysis: dict = None, json_indent: int = JSON_INDENT):
+    """Write the dashboard JSON exports.
+
+    With `quantile_method="sketch"` the global cost stats are computed in one
+    streaming pass over the cleaned store (median/Q1/Q3 from a quantile sketch
+    with relative error <= `sketch_alpha`), so the cost column is never fully loaded.
+    `cleaned` and `analysis` (the results of clean_data(return_frame=True) and
+    analyze_and_detect) are used instead of re-reading the files they wrote.
+    `json_indent` lays out anomalies.json and top_groups.json (None: compact).
+    """
+    if quantile_method not in QUANTILE_METHODS:
+        raise ValueError(f"quantile_method must be one of {QUANTILE_METHODS}, got {quantile_method!r}")
+
+    available = list(cleaned.columns) if cleaned is not None else stored_columns()
+    cost_col = pick_cost_column(cleaned) if cleaned is not None else cost_column()
+
+    with stage("stats") as info:
+        if quantile_method == "sketch":
+            batches = None if cleaned is None else [cleaned[[cost_col]]]
+            n_rows, missing_cost, cost_stats = _sketch_cost_stats(cost_col, sketch_alpha, batches)
+        else:
+            # Only the cost column is needed for the global stats.
+            df = cleaned[[cost_col]] if cleaned is not None else read_cleaned(columns=[cost_col])
+            s = pd.to_numeric(df[cost_col], errors="coerce").replace([float("inf"), -float("inf")], pd.NA).dropna()
+            n_rows = len(df)
+            missing_cost = int(df[cost_col].isna().sum()) if cost_col in df.columns else None
+            cost_stats = {}
+            if len(s) > 0:
+                q1 = float(s.quantile(0.25))
+                q3 = float(s.quantile(0.75))
+                iqr = float(q3 - q1)
+                cost_stats = {
+                    "cost_mean": float(s.mean()),
+                    "cost_median": float(s.median()),
+                    "cost_min": float(s.min()),
+                    "cost_max": float(s.max()),
+                    "cost_std": float(s.std(ddof=0)),
+                    "Q1": q1,
+                    "Q3": q3,
+                    "IQR": iqr,
+                    "IQR_lower_bound": float(q1 - 1.5 * iqr),
+                    "IQR_upper_bound": float(q3 + 1.5 * iqr),
+                }
+        info["rows"] = n_rows
 
     summary = {
        
-        "rows": int(len(df)),
-        "columns": int(len(df.columns)),
+        "rows": int(n_rows),
+        "columns": int(len(available)),
         "cost_column": cost_col,
         "cost_mean": None,
         "cost_median": None,
@@ -110,105 +270,105 @@ def export_for_dashboard():
         "IQR": None,
         "IQR_lower_bound": None,
         "IQR_upper_bound": None,
-        "missing_cost": int(df[cost_col].isna().sum()) if cost_col in df.columns else None,
+        "missing_cost": missing_cost,
 
      
         "iqr_anomalies_count": 0,
         "zscore_anomalies_count": 0,
 
-       
-        "key_columns_present": {
-            "hcpcs_cd": "hcpcs_cd" in df.columns,
-            "hcpcs_desc": "hcpcs_desc" in df.columns,
-            "rndrng_npi": "rndrng_npi" in df.columns,
-            "rndrng_prvdr_type": "rndrng_prvdr_type" in df.columns,
-            "rndrng_prvdr_state_abrvtn": "rndrng_prvdr_state_abrvtn" in df.columns,
-            "place_of_srvc_label": "place_of_srvc_label" in df.columns,
-        }
-    }
 
-    if len(s) > 0:
-        q1 = float(s.quantile(0.25))
-        q3 = float(s.quantile(0.75))
-        iqr = float(q3 - q1)
-        lower = float(q1 - 1.5 * iqr)
-        upper = float(q3 + 1.5 * iqr)
-
-        summary.update({
-            "cost_mean": float(s.mean()),
-            "cost_median": float(s.median()),
-            "cost_min": float(s.min()),
-            "cost_max": float(s.max()),
-            "cost_std": float(s.std(ddof=0)),
-            "Q1": q1,
-            "Q3": q3,
-            "IQR": iqr,
-            "IQR_lower_bound": lower,
-            "IQR_upper_bound": upper,
-        })
+        "key_columns_present": key_columns_present(available),
+    }
 
-   
-    keep_cols = [
-        "hcpcs_cd", "hcpcs_desc",
-        "rndrng_npi", "rndrng_prvdr_last_org_name", "rndrng_prvdr_first_name",
-        "rndrng_prvdr_type",
-        "rndrng_prvdr_state_abrvtn", "rndrng_prvdr_city",
-        "place_of_srvc_label",
-        "tot_benes", "tot_srvcs",
-        "avg_sbmtd_chrg_amt", "avg_mdcr_alowd_amt", "avg_mdcr_pymt_amt", "avg_mdcr_stdzd_amt",
-        "submitted_to_payment_ratio", "payment_to_allowed_ratio",
-        "anomaly_method", "anomaly_metric", "anomaly_metric_label", "anomaly_reason",
-        "group_size"
-    ]
-
-    iqr_df = _read_if_exists(ANOM_IQR_PATH)
-    z_df = _read_if_exists(ANOM_Z_PATH)
+    summary.update(cost_stats)
+    if quantile_method == "sketch":
+        summary["quantile_method"] = "sketch"
+        summary["quantile_relative_error"] = sketch_alpha
+
+
+    with stage("read_anomalies") as info:
+        dashboard_col = lambda c: c in DASHBOARD_COLS
+        if analysis is not None:
+            frames = analysis["anomalies"]
+            iqr_df = _handed_off(frames.get("iqr"), dashboard_col)
+            z_df = _handed_off(frames.get("zscore"), dashboard_col)
+            extra = {d: _handed_off(frames[d], dashboard_col) for d in EXTRA_DETECTORS if d in frames}
+        else:
+            iqr_df = _read_if_exists(ANOM_IQR_PATH, usecols=dashboard_col)
+            z_df = _read_if_exists(ANOM_Z_PATH, usecols=dashboard_col)
+            extra = {d: _read_if_exists(p, usecols=dashboard_col)
+                     for d, p in EXTRA_ANOM_PATHS.items() if os.path.exists(p)}
+        info["rows"] = len(iqr_df) + len(z_df) + sum(len(e) for e in extra.values())
 
     summary["iqr_anomalies_count"] = int(len(iqr_df)) if len(iqr_df) else 0
     summary["zscore_anomalies_count"] = int(len(z_df)) if len(z_df) else 0
+    for d, e in extra.items():
+        summary[f"{d}_anomalies_count"] = int(len(e))
+    # Record keys the dashboard reads, so it need not probe the first anomaly row for them.
+    exported = [a for a in [iqr_df, z_df, *extra.values()] if len(a)]
+    summary["column_roles"] = resolve_roles(c for c in DASHBOARD_COLS if any(c in a.columns for a in exported))
+
+    # JSON dumps and page files are written in the background while the next payload is built.
+    with OutputWriter() as writer:
+        writer.json(summary, SUMMARY_JSON, indent=2, ensure_ascii=False)
 
-    all_anoms = pd.concat([iqr_df, z_df], ignore_index=True) if (len(iqr_df) or len(z_df)) else pd.DataFrame()
+        parts = [a for a in [iqr_df, z_df, *extra.values()] if len(a)]
+        all_anoms = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
 
-    if len(all_anoms) > 0:
-        cols = [c for c in keep_cols if c in all_anoms.columns]
-        all_anoms = all_anoms[cols].copy()
+        if len(all_anoms) > 0:
+            cols = [c for c in DASHBOARD_COLS if c in all_anoms.columns]
+            all_anoms = all_anoms[cols].copy()
 
         
-        sort_col = summary["cost_column"] if summary["cost_column"] in all_anoms.columns else (
-            "avg_mdcr_pymt_amt" if "avg_mdcr_pymt_amt" in all_anoms.columns else None
-        )
+            sort_col = summary["cost_column"] if summary["cost_column"] in all_anoms.columns else (
+                "avg_mdcr_pymt_amt" if "avg_mdcr_pymt_amt" in all_anoms.columns else None
+            )
 
-        if sort_col:
-            all_anoms[sort_col] = pd.to_numeric(all_anoms[sort_col], errors="coerce")
-            all_anoms = all_anoms.sort_values(sort_col, ascending=False)
+            if sort_col:
+                with stage("sort", rows=len(all_anoms)):
+                    all_anoms[sort_col] = pd.to_numeric(all_anoms[sort_col], errors="coerce")
+                    all_anoms = all_anoms.sort_values(sort_col, ascending=False)
 
-      
-        all_anoms = all_anoms.head(5000)
+            # Every anomaly goes to the paged export; anomalies.json keeps the top 5000 preview.
+            with stage("pages", rows=len(all_anoms)):
+                _write_anomaly_pages(all_anoms, sort_col, writer=writer)
 
-        anomalies_payload = _sanitize_records(all_anoms)
-    else:
-        anomalies_payload = []
+            all_anoms = all_anoms.head(5000)
+        else:
+            _write_anomaly_pages(pd.DataFrame(), None)
+        # Serialized column-wise on the writer thread while the top groups are gathered.
+        writer.submit(write_records_json, all_anoms, ANOM_JSON, json_indent)
 
   
-    top_groups = {}
-
-    iqr_groups_df = _read_if_exists(TOP_IQR_GROUPS)
-    z_groups_df = _read_if_exists(TOP_Z_GROUPS)
-
-    top_groups["top_iqr_groups"] = _sanitize_records(iqr_groups_df.head(50)) if len(iqr_groups_df) else []
-    top_groups["top_zscore_groups"] = _sanitize_records(z_groups_df.head(50)) if len(z_groups_df) else []
-
-   
-    with open(SUMMARY_JSON, "w", encoding="utf-8") as f:
-        json.dump(summary, f, indent=2, ensure_ascii=False)
-
-    with open(ANOM_JSON, "w", encoding="utf-8") as f:
-        json.dump(anomalies_payload, f, indent=2, ensure_ascii=False)
-
-    with open(TOP_GROUPS_JSON, "w", encoding="utf-8") as f:
-        json.dump(top_groups, f, indent=2, ensure_ascii=False)
+        top_groups = {}
+
+        if analysis is not None:
+            tables = analysis["top_groups"]
+            iqr_groups_df = _handed_off(tables.get("iqr"))
+            z_groups_df = _handed_off(tables.get("zscore"))
+            extra_groups = {d: _handed_off(tables[d]) for d in EXTRA_DETECTORS if d in tables}
+            splits = {(d, b): _handed_off(t) for d, by in analysis.get("top_group_breakdowns", {}).items()
+                      for b, t in by.items()}
+        else:
+            iqr_groups_df = _read_if_exists(TOP_IQR_GROUPS)
+            z_groups_df = _read_if_exists(TOP_Z_GROUPS)
+            extra_groups = {d: _read_if_exists(p) for d, p in EXTRA_TOP_GROUPS.items() if os.path.exists(p)}
+            splits = {k: _read_if_exists(p) for k, p in TOP_GROUP_SPLITS.items() if os.path.exists(p)}
+
+        # The analysis step already cut each table to its top-N rows.
+        top_groups["top_iqr_groups"] = iqr_groups_df
+        top_groups["top_zscore_groups"] = z_groups_df
+        for d, groups_df in extra_groups.items():
+            top_groups[f"top_{d}_groups"] = groups_df
+        for (d, b), groups_df in splits.items():
+            top_groups[f"top_{d}_groups_{b}"] = groups_df
+
+        writer.submit(write_records_json, top_groups, TOP_GROUPS_JSON, json_indent)
+        with stage("flush_writes", rows=len(all_anoms)):
+            writer.wait()
 
     print("Export done ✅")
     print("- outputs/summary.json")
     print("- outputs/anomalies.json")
+    print("- outputs/anomaly_pages/ (manifest.json + NDJSON pages + facet_index.json)")
     print("- outputs/top_groups.json")
@@ -0,0 +1,99 @@
+import base64
+import numpy as np
+import pandas as pd
+
+from backend.writers import write_json
+
+# Query/facet name -> anomaly column it filters on.
+FACETS = {
+    "method": "anomaly_method",
+    "state": "rndrng_prvdr_state_abrvtn",
+    "provider_type": "rndrng_prvdr_type",
+    "pos": "place_of_srvc_label",
+    "hcpcs": "hcpcs_cd",
+}
+
+
+def build_facet_index(df: pd.DataFrame) -> dict:
+    """Inverted index over `df`: for each facet, the row ids of every value (CSR layout).
+
+    Row ids are positions in `df`; `order[offsets[i]:offsets[i + 1]]` are the rows
+    holding `values[i]`, already ascending. Missing values are left out.
+    """
+    facets = {}
+    for name, col in FACETS.items():
+        if col not in df.columns:
+            continue
+        codes, uniques = pd.factorize(df[col].astype("string"), sort=True)
+        codes = np.asarray(codes)
+        order = np.argsort(codes, kind="stable")
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        start = int((codes < 0).sum())
+        offsets = np.concatenate(([start], start + np.cumsum(counts)))
+        values = [str(u) for u in uniques]
+        facets[name] = {
+            "column": col,
+            "values": values,
+            "counts": counts,
+            "lookup": {v: i for i, v in enumerate(values)},
+            "codes": codes,
+            "order": order,
+            "offsets": offsets,
+        }
+    return facets
+
+
+def facet_rows(facet: dict, value: str) -> np.ndarray:
+    """Sorted row ids for a facet value; `method` also accepts a prefix such as "Z"."""
+    if value in facet["lookup"]:
+        ids = [facet["lookup"][value]]
+    elif facet["column"] == "anomaly_method":
+        ids = [i for i, v in enumerate(facet["values"]) if v.upper().startswith(value.upper())]
+    else:
+        ids = []
+    parts = [facet["order"][facet["offsets"][i]:facet["offsets"][i + 1]] for i in ids]
+    if len(parts) == 1:
+        return parts[0]
+    return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+
+
+def intersect_rows(lists: list, n_rows: int) -> np.ndarray:
+    """Intersect sorted row-id lists, smallest first; no lists means every row."""
+    if not lists:
+        return np.arange(n_rows)
+    lists = sorted(lists, key=len)
+    rows = lists[0]
+    for ids in lists[1:]:
+        if len(rows) == 0:
+            break
+        rows = np.intersect1d(rows, ids, assume_unique=True)
+    return rows
+
+
+def _encode_rows(rows: np.ndarray, n_rows: int) -> dict:
+    # A uint32 list costs 4 bytes per row, a bitmap n_rows / 8 bytes: keep the smaller.
+    if 4 * len(rows) <= (n_rows + 7) // 8:
+        return {"ids": base64.b64encode(rows.astype("<u4").tobytes()).decode("ascii")}
+    bits = np.zeros(n_rows, dtype=bool)
+    bits[rows] = True
+    return {"bitmap": base64.b64encode(np.packbits(bits, bitorder="little").tobytes()).decode("ascii")}
+
+
+def write_facet_index(df: pd.DataFrame, path: str) -> dict:
+    """Write the facet index of `df` (row ids = positions in `df`) as JSON for the dashboard.
+
+    Each value carries its row count and either `ids` (base64 little-endian uint32)
+    or `bitmap` (base64, bit i of byte j = row 8*j + i).
+    """
+    n_rows = len(df)
+    index = build_facet_index(df)
+    payload = {"total_rows": int(n_rows), "facets": {}}
+    for name, facet in index.items():
+        values = []
+        for i, v in enumerate(facet["values"]):
+            rows = facet["order"][facet["offsets"][i]:facet["offsets"][i + 1]]
+            values.append({"value": v, "count": int(facet["counts"][i]), **_encode_rows(rows, n_rows)})
+        payload["facets"][name] = {"column": facet["column"], "values": values}
+
+    write_json(payload, path, ensure_ascii=False)
+    return index
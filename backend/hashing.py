@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """64-bit content hash per row (index ignored), used for cross-chunk dedup."""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+class SeenHashes:
+    """Hashes kept so far, as sorted runs of roughly doubling size.
+
+    A new chunk's hashes form a run; runs no bigger than it are merged into it,
+    so there are O(log n) runs and each hash is merged O(log n) times overall.
+    Membership is a binary search per run, never a pass over the whole history.
+    Memory is 8 bytes per distinct hash.
+    """
+
+    def __init__(self):
+        self.runs = []
+
+    def __len__(self) -> int:
+        return sum(len(run) for run in self.runs)
+
+    def contains(self, h: np.ndarray) -> np.ndarray:
+        # Sorted keys make the binary searches walk each run in order (far fewer cache misses).
+        order = np.argsort(h, kind="stable")
+        keys = h[order]
+        hit = np.zeros(len(h), dtype=bool)
+        for run in self.runs:
+            i = np.searchsorted(run, keys)
+            i[i == len(run)] = 0
+            hit |= run[i] == keys
+        found = np.empty(len(h), dtype=bool)
+        found[order] = hit
+        return found
+
+    def add(self, h: np.ndarray):
+        run = np.unique(h)
+        if len(run) == 0:
+            return
+        while self.runs and len(self.runs[-1]) <= len(run):
+            run = np.sort(np.concatenate([self.runs.pop(), run]), kind="stable")
+        self.runs.append(run)
+
+    def first_seen(self, h: np.ndarray) -> np.ndarray:
+        """Mask of the hashes met for the first time (first occurrence within `h` too); records them."""
+        new = ~pd.Series(h).duplicated().to_numpy() & ~self.contains(h)
+        self.add(h[new])
+        return new
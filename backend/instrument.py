@@ -0,0 +1,192 @@
+import os
+import io
+import sys
+import json
+import time
+import pstats
+import cProfile
+import functools
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+BASE_DIR = os.environ.get("CMS_PIPELINE_DIR") or os.path.dirname(os.path.dirname(__file__))
+
+REPORT_DIR = os.path.join(BASE_DIR, "outputs", "report")
+TIMINGS_PATH = os.path.join(REPORT_DIR, "timings.json")
+PROFILE_PATH = os.path.join(REPORT_DIR, "profile.pstats")
+PROFILE_TOP_PATH = os.path.join(REPORT_DIR, "profile_top.txt")
+TRACEMALLOC_TOP_PATH = os.path.join(REPORT_DIR, "tracemalloc_top.txt")
+
+# Opt-in capture without code edits: CMS_PROFILE=cprofile, tracemalloc, or all.
+PROFILE_ENV = "CMS_PROFILE"
+PROFILE_MODES = ("cprofile", "tracemalloc")
+
+_STATS = {}   # stage path -> aggregated record, in first-seen order
+_STACK = []
+_RUN = {"started": None, "t0": None, "modes": (), "profiler": None}
+
+
+def _rss_mb():
+    """Current resident set size (Linux /proc), or None where unavailable."""
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def _record(path, wall, cpu, rows, py_peak):
+    rec = _STATS.setdefault(path, {"stage": path, "calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "rows": None})
+    rec["calls"] += 1
+    rec["wall_s"] += wall
+    rec["cpu_s"] += cpu
+    if rows is not None:
+        rec["rows"] = (rec["rows"] or 0) + int(rows)
+    rec["rss_mb"] = _rss_mb()
+    rec["peak_rss_mb"] = _peak_rss_mb()
+    if py_peak is not None:
+        rec["py_peak_mb"] = max(rec.get("py_peak_mb", 0.0), py_peak / 2**20)
+
+
+@contextmanager
+def stage(name: str, rows: int = None):
+    """Time a pipeline step (nested steps get dotted names, repeated calls are summed).
+
+    Yields a dict; set `rows` on it inside the block when the count is only known later.
+    """
+    path = f"{_STACK[-1]['path']}.{name}" if _STACK else name
+    info = {"rows": rows}
+    frame = {"path": path, "py_peak": 0}
+    if tracemalloc.is_tracing():
+        # Per-stage Python allocation peaks: bank the parent's peak before resetting.
+        if _STACK:
+            _STACK[-1]["py_peak"] = max(_STACK[-1]["py_peak"], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+    _STACK.append(frame)
+    t0, c0 = time.perf_counter(), time.process_time()
+    try:
+        yield info
+    finally:
+        wall, cpu = time.perf_counter() - t0, time.process_time() - c0
+        _STACK.pop()
+        py_peak = None
+        if tracemalloc.is_tracing():
+            py_peak = max(frame["py_peak"], tracemalloc.get_traced_memory()[1])
+            if _STACK:
+                _STACK[-1]["py_peak"] = max(_STACK[-1]["py_peak"], py_peak)
+        _record(path, wall, cpu, info.get("rows"), py_peak)
+
+
+def timed(name: str):
+    """Decorator form of `stage` for whole pipeline steps."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def _parse_modes(profile) -> tuple:
+    if profile is None:
+        profile = os.environ.get(PROFILE_ENV, "")
+    if isinstance(profile, str):
+        profile = [p.strip().lower() for p in profile.split(",") if p.strip()]
+    modes = set()
+    for p in profile:
+        if p in ("all", "1", "true"):
+            modes.update(PROFILE_MODES)
+        elif p in PROFILE_MODES:
+            modes.add(p)
+        else:
+            raise ValueError(f"unknown profile mode {p!r}; expected {PROFILE_MODES} or 'all'")
+    return tuple(m for m in PROFILE_MODES if m in modes)
+
+
+def start_run(profile=None):
+    """Reset the collected timings and start the opt-in profilers.
+
+    `profile` is a list or comma string of PROFILE_MODES; by default it is read
+    from the CMS_PROFILE environment variable.
+    """
+    _STATS.clear()
+    _STACK.clear()
+    modes = _parse_modes(profile)
+    _RUN.update(started=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                t0=time.perf_counter(), modes=modes, profiler=None)
+    if "tracemalloc" in modes and not tracemalloc.is_tracing():
+        tracemalloc.start(25)
+    if "cprofile" in modes:
+        _RUN["profiler"] = cProfile.Profile()
+        _RUN["profiler"].enable()
+
+
+def _write_profiles():
+    profiler = _RUN["profiler"]
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(PROFILE_PATH)
+        buf = io.StringIO()
+        pstats.Stats(profiler, stream=buf).sort_stats("cumulative").print_stats(40)
+        with open(PROFILE_TOP_PATH, "w", encoding="utf-8") as f:
+            f.write(buf.getvalue())
+        _RUN["profiler"] = None
+
+    if "tracemalloc" in _RUN["modes"] and tracemalloc.is_tracing():
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        with open(TRACEMALLOC_TOP_PATH, "w", encoding="utf-8") as f:
+            f.write(f"traced_current_mb: {current / 2**20:.1f}\n")
+            f.write(f"traced_peak_mb (since last stage reset): {peak / 2**20:.1f}\n\n")
+            f.write("top allocations still alive at end of run (by line):\n")
+            for s in snapshot.statistics("lineno")[:30]:
+                f.write(f"{s}\n")
+
+
+def finish_run() -> str:
+    """Stop the profilers and write outputs/report/timings.json (+ profile files when enabled)."""
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    _write_profiles()
+
+    stages = []
+    for rec in _STATS.values():
+        rec = dict(rec)
+        rec["wall_s"] = round(rec["wall_s"], 4)
+        rec["cpu_s"] = round(rec["cpu_s"], 4)
+        rec["rows_per_s"] = round(rec["rows"] / rec["wall_s"], 1) if rec["rows"] and rec["wall_s"] > 0 else None
+        for k in ("rss_mb", "peak_rss_mb", "py_peak_mb"):
+            if rec.get(k) is not None:
+                rec[k] = round(rec[k], 1)
+        stages.append(rec)
+
+    report = {
+        "started": _RUN["started"],
+        "total_wall_s": round(time.perf_counter() - _RUN["t0"], 4) if _RUN["t0"] is not None else None,
+        "profile_modes": list(_RUN["modes"]),
+        "stages": stages,
+    }
+    with open(TIMINGS_PATH, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print("\nStage timings:")
+    for rec in stages:
+        depth = rec["stage"].count(".")
+        rows = f"  rows={rec['rows']:,}" if rec["rows"] is not None else ""
+        print(f"  {'  ' * depth}{rec['stage'].split('.')[-1]:<{24 - 2 * depth}} {rec['wall_s']:>9.3f}s{rows}")
+    return TIMINGS_PATH
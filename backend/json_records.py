@@ -0,0 +1,121 @@
+import json
+import math
+import numpy as np
+import pandas as pd
+
+from backend.writers import atomic_path
+
+# Rows encoded per block when streaming a frame to a file.
+BLOCK_ROWS = 20000
+
+# ensure_ascii=False string encoder used by json.dump itself (C-accelerated).
+_encode_str = json.encoder.encode_basestring
+
+
+def _encode_value(x) -> str:
+    """One cell, as json.dump(_to_py(x), ensure_ascii=False) writes it."""
+    if x is None:
+        return "null"
+    if isinstance(x, str):
+        return _encode_str(x)
+    try:
+        if pd.isna(x):
+            return "null"
+    except (TypeError, ValueError):
+        pass
+    if hasattr(x, "item") and not isinstance(x, (bool, int, float)):
+        x = x.item()
+    if isinstance(x, float) and not math.isfinite(x):
+        return "null"
+    return json.dumps(x, ensure_ascii=False)
+
+
+def _column_tokens(s: pd.Series) -> np.ndarray:
+    """JSON text of every cell of a column, converted per dtype in bulk.
+
+    NaN/NA/inf become null; numpy numbers become the same text Python's
+    json module writes for the equivalent int/float/bool.
+    """
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        s = s.astype(s.cat.categories.dtype)
+    # Extension dtypes (str, nullable Int64/boolean) go through object: their NA is not NaN.
+    values = s.to_numpy(dtype=object) if isinstance(s.dtype, pd.api.extensions.ExtensionDtype) else s.to_numpy()
+    kind = values.dtype.kind
+    if kind == "b":
+        return np.where(values, "true", "false").astype(object)
+    if kind in "iu":
+        return np.array(list(map(str, values.tolist())), dtype=object)
+    if kind == "f":
+        values = values.astype(np.float64, copy=False)
+        out = np.full(len(values), "null", dtype=object)
+        ok = np.isfinite(values)
+        out[ok] = list(map(float.__repr__, values[ok].tolist()))
+        return out
+
+    missing = pd.isna(s).to_numpy()
+    out = np.full(len(values), "null", dtype=object)
+    present = values[~missing]
+    if pd.api.types.infer_dtype(present, skipna=False) in ("string", "empty"):
+        out[~missing] = list(map(_encode_str, present.tolist()))
+    else:
+        out[~missing] = list(map(_encode_value, present.tolist()))
+    return out
+
+
+def _layout(indent, level: int):
+    """(list open, item separator, list close, object open, key separator, member separator, object close)."""
+    if indent is None:
+        return "[", ",", "]", "{", ":", ",", "}"
+    pad = " " * indent
+    item = "\n" + pad * (level + 1)
+    member = "\n" + pad * (level + 2)
+    return "[" + item, "," + item, "\n" + pad * level + "]", "{" + member, ": ", "," + member, item + "}"
+
+
+def iter_records_json(df: pd.DataFrame, indent: int = None, level: int = 0):
+    """Yield `df` as JSON text of a list of row objects, BLOCK_ROWS rows at a time.
+
+    Equal to json.dump(_sanitize_records(df), ensure_ascii=False, indent=indent)
+    nested `level` deep, but each column is converted once instead of per cell.
+    With indent=None the text is compact (no spaces after separators).
+    """
+    if df is None or len(df) == 0:
+        yield "[]"
+        return
+    list_open, item_sep, list_close, obj_open, key_sep, member_sep, obj_close = _layout(indent, level)
+    if len(df.columns) == 0:
+        obj_open, obj_close = "{", "}"
+    keys = [_encode_str(str(c)) + key_sep for c in df.columns]
+
+    yield list_open
+    for start in range(0, len(df), BLOCK_ROWS):
+        block = df.iloc[start:start + BLOCK_ROWS]
+        rows = np.full(len(block), obj_open, dtype=object)
+        for j, col in enumerate(block.columns):
+            rows = rows + ((member_sep if j else "") + keys[j]) + _column_tokens(block.iloc[:, j])
+        rows = rows + obj_close
+        yield (item_sep if start else "") + item_sep.join(rows.tolist())
+    yield list_close
+
+
+def records_json(df: pd.DataFrame, indent: int = None, level: int = 0) -> str:
+    return "".join(iter_records_json(df, indent, level))
+
+
+def write_records_json(payload, path: str, indent: int = None):
+    """Atomically write a DataFrame (list of records) or a dict of name -> DataFrame as JSON."""
+    with atomic_path(path) as tmp, open(tmp, "w", encoding="utf-8") as f:
+        if isinstance(payload, pd.DataFrame):
+            for text in iter_records_json(payload, indent):
+                f.write(text)
+            return
+        if not payload:
+            f.write("{}")
+            return
+        pad = "" if indent is None else "\n" + " " * indent
+        f.write("{")
+        for i, (name, df) in enumerate(payload.items()):
+            f.write(("," if i else "") + pad + _encode_str(name) + (":" if indent is None else ": "))
+            for text in iter_records_json(df, indent, level=1):
+                f.write(text)
+        f.write(("" if indent is None else "\n") + "}")
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+
+# Cells that mean "no value" rather than "bad value" (compared after strip, case-insensitive).
+NULL_TOKENS = frozenset({"", "nan", "none", "null", "*"})
+
+_CURRENCY_RE = r"[\$,]"
+_ACCOUNTING_NEG_RE = r"^\((.*)\)$"
+
+
+def _as_series(values) -> pd.Series:
+    """Accept a Series, ndarray/list, or a pyarrow (Chunked)Array of strings."""
+    if isinstance(values, pd.Series):
+        return values
+    if hasattr(values, "to_pandas"):
+        return values.to_pandas()
+    return pd.Series(values)
+
+
+def _clean_text(u: pd.Series) -> pd.Series:
+    """The cleaning rules for cells that do not parse as-is: strip, null sentinels,
+    drop $ and thousands separators, accounting negatives "(12.50)" -> "-12.50"."""
+    u = u.str.strip()
+    u = u.mask(u.str.lower().isin(list(NULL_TOKENS)))
+    u = u.str.replace(_CURRENCY_RE, "", regex=True)
+    return u.str.replace(_ACCOUNTING_NEG_RE, r"-\1", regex=True)
+
+
+def parse_numeric(values) -> tuple:
+    """Parse messy numeric text ($, commas, "(neg)", "*"/null sentinels, blanks).
+
+    Returns (parsed Series, number of non-null cells that could not be parsed).
+    Each distinct string is parsed once; only the ones `pd.to_numeric` rejects
+    as-is go through the string cleaning rules, so clean columns cost a
+    factorize plus one vectorised parse. Values and dtypes match running the
+    rules over the whole column.
+    """
+    series = _as_series(values)
+    if not (pd.api.types.is_object_dtype(series.dtype) or pd.api.types.is_string_dtype(series.dtype)):
+        return pd.to_numeric(series, errors="coerce"), 0
+
+    if pd.api.types.is_object_dtype(series.dtype) and pd.api.types.infer_dtype(series, skipna=True) not in ("string", "empty"):
+        # Mixed Python objects (ints, floats, bools) would merge under hashing; parse their text form.
+        series = series.astype(str)
+
+    codes, uniques = pd.factorize(series)
+    uniques = np.asarray(uniques, dtype=object)
+    if (codes < 0).any():
+        # Missing cells join as one more distinct value, so dtype inference sees them as the rules would.
+        uniques = np.append(uniques, np.nan)
+        codes[codes < 0] = len(uniques) - 1
+    u = pd.Series(uniques, dtype=object)
+
+    parsed = pd.to_numeric(u, errors="coerce")
+    retry = parsed.isna().to_numpy()
+    if retry.any():
+        text = u.copy()
+        text[retry] = _clean_text(u[retry].astype(str))
+        parsed = pd.to_numeric(text, errors="coerce")
+
+    # Failed cells that were not a null sentinel count as unparseable.
+    failed = parsed.isna().to_numpy().copy()
+    if failed.any():
+        tokens = u[failed].astype(str).str.strip().str.lower()
+        failed[failed] = ~(tokens.isna() | tokens.isin(list(NULL_TOKENS))).to_numpy()
+    n_unparseable = int(np.bincount(codes, minlength=len(u))[failed].sum())
+
+    return pd.Series(parsed.to_numpy()[codes], index=series.index, name=series.name), n_unparseable
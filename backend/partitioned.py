@@ -0,0 +1,349 @@
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+from backend.analysis import (
+    ANOM_DIR, DEFAULT_DETECTORS, DEFAULT_GROUPINGS, DETECTORS, MAD_THRESHOLD, MIN_GROUP_SIZE, STATE_PATH,
+    SUMMARY_PATH, TABLES_DIR, TOP_GROUP_BREAKDOWNS, TOP_N, Z_THRESHOLD, _TopGroups, _anomaly_frame,
+    _drop_stale_outputs, _group_layout, _safe_numeric, _score_rows, _write_summary, parse_groupings,
+)
+from backend.instrument import stage, timed
+from backend.schema import stored_columns, usecols
+from backend.sketch import DEFAULT_ALPHA, QUANTILE_METHODS
+from backend.storage import iter_cleaned, plain_dtypes
+from backend.writers import atomic_path, write_csv
+
+BASE_DIR = os.environ.get("CMS_PIPELINE_DIR") or os.path.dirname(os.path.dirname(__file__))
+
+# Scratch space for the partitioned copy of the cleaned data; removed after every run.
+SPILL_DIR = os.path.join(BASE_DIR, "outputs", ".spill")
+
+# Hash partitions of hcpcs_cd. Each is loaded and scored on its own, so peak
+# memory is about rows / PARTITIONS (never less than the largest HCPCS code).
+PARTITIONS = 64
+# Rows read from the cleaned store per batch while spilling.
+BATCH_ROWS = 500_000
+# Anomaly rows per spill chunk and per merged CSV write.
+MERGE_ROWS = 100_000
+
+METRICS = [
+    ("avg_mdcr_pymt_amt", "Payment Amount"),
+    ("submitted_to_payment_ratio", "Submitted/Payment Ratio"),
+]
+ID_COLS = [
+    "hcpcs_cd", "hcpcs_desc",
+    "rndrng_npi", "rndrng_prvdr_last_org_name", "rndrng_prvdr_first_name",
+    "rndrng_prvdr_type",
+    "place_of_srvc", "place_of_srvc_label",
+    "rndrng_prvdr_state_abrvtn", "rndrng_prvdr_city",
+    "tot_benes", "tot_srvcs",
+    "avg_sbmtd_chrg_amt", "avg_mdcr_alowd_amt", "avg_mdcr_pymt_amt", "avg_mdcr_stdzd_amt",
+    "submitted_to_payment_ratio", "payment_to_allowed_ratio"
+]
+TOP_GROUP_KEYS = ["anomaly_metric", "hcpcs_cd", "hcpcs_desc"]
+
+
+def _breakdowns(columns) -> dict:
+    return {b: c for b, c in TOP_GROUP_BREAKDOWNS.items() if c in columns}
+
+
+def _partition_dir(spill_dir: str, p: int) -> str:
+    return os.path.join(spill_dir, f"part-{p:04d}")
+
+
+def _partition_of(keys: pd.Series, partitions: int) -> np.ndarray:
+    """Stable hash partition of each HCPCS code (the same code lands in the same partition in every batch)."""
+    text = keys.astype(object).where(keys.notna(), "").astype(str).to_numpy(dtype=object)
+    return (pd.util.hash_array(text) % np.uint64(partitions)).astype(np.int64)
+
+
+def spill_partitions(id_cols, partitions: int, spill_dir: str, batch_rows: int = BATCH_ROWS) -> int:
+    """Split the cleaned data by hash of hcpcs_cd into one folder of pickled batches per partition.
+
+    Every row keeps its global position in `_row`; batches are written in
+    order, so a partition read back is in original row order. Returns the row count.
+    """
+    n_rows = 0
+    for i, batch in enumerate(iter_cleaned(columns=id_cols, batch_size=batch_rows)):
+        batch = plain_dtypes(batch).reset_index(drop=True)
+        batch["_row"] = np.arange(n_rows, n_rows + len(batch), dtype=np.int64)
+        n_rows += len(batch)
+        part = _partition_of(batch["hcpcs_cd"], partitions)
+        for p in np.unique(part):
+            folder = _partition_dir(spill_dir, int(p))
+            os.makedirs(folder, exist_ok=True)
+            batch[part == p].reset_index(drop=True).to_pickle(os.path.join(folder, f"batch-{i:06d}.pkl"))
+    return n_rows
+
+
+def _load_partition(folder: str) -> pd.DataFrame:
+    names = sorted(n for n in os.listdir(folder) if n.startswith("batch-"))
+    return pd.concat([pd.read_pickle(os.path.join(folder, n)) for n in names], ignore_index=True)
+
+
+def _moments(v: np.ndarray):
+    """(count, mean, sum of squared deviations, min, max) of a non-empty array."""
+    mean = v.mean()
+    return len(v), mean, float(((v - mean) ** 2).sum()), v.min(), v.max()
+
+
+def _score_partition(p, spill_dir, id_cols, min_group_size, z_threshold, quantile_method, sketch_alpha, detectors):
+    """Score one partition and spill its anomaly rows in MERGE_ROWS chunks.
+
+    Returns {"groups": {detector: (first global row, anomaly rows) per group with
+    anomalies}, "counts": {(detector, table suffix): _TopGroups}, "moments":
+    {metric: _moments or None}, "rows": partition rows}. The sorted metric values are
+    saved for the exact global median.
+    """
+    folder = _partition_dir(spill_dir, p)
+    df = _load_partition(folder)
+    for c, _ in METRICS:
+        df[c] = _safe_numeric(df[c])
+    values = np.vstack([df[c].to_numpy(dtype=np.float64) for c, _ in METRICS])
+
+    moments = {}
+    for m, (c, _) in enumerate(METRICS):
+        v = values[m]
+        v = v[np.isfinite(v)] if c == "submitted_to_payment_ratio" else v[~np.isnan(v)]
+        v = np.sort(v)
+        np.save(os.path.join(spill_dir, f"values-{c}-{p:04d}.npy"), v)
+        moments[c] = _moments(v) if len(v) else None
+
+    # Codes in first-appearance order: within a partition that is also global first-row order.
+    codes, uniques = pd.factorize(df["hcpcs_cd"], sort=False)
+    uniques = np.asarray(uniques, dtype=object)
+    n_groups = len(uniques)
+    order, starts, sizes = _group_layout(codes, n_groups)
+    valid = sizes >= min_group_size
+    hits = _score_rows(codes, order[valid[codes[order]]], values, n_groups, min_group_size, z_threshold,
+                       quantile_method, sketch_alpha, detectors)
+    first_row = df["_row"].to_numpy()[order[starts[:n_groups]]]
+
+    metric_names = np.array([c for c, _ in METRICS], dtype=object)
+    row_keys = {}
+    for c in TOP_GROUP_KEYS[1:] + list(_breakdowns(df.columns).values()):
+        col_codes, col_uniques = pd.factorize(df[c], sort=False)
+        row_keys[c] = (col_codes, np.asarray(col_uniques, dtype=object))
+    layouts = {"": TOP_GROUP_KEYS[1:]}
+    layouts.update({f"_{b}": TOP_GROUP_KEYS[1:] + [col] for b, col in _breakdowns(df.columns).items()})
+
+    groups, counts = {}, {}
+    for d in detectors:
+        frame = _anomaly_frame(df, id_cols, hits[d], method=DETECTORS[d]["label"],
+                               reasons=[DETECTORS[d]["reason"].format(col=c, scope="HCPCS", threshold=z_threshold,
+                                                                      mad_threshold=MAD_THRESHOLD)
+                                        for c, _ in METRICS],
+                               metrics=METRICS, group_keys=np.full(n_groups, "hcpcs_cd", dtype=object),
+                               group_values=uniques, group_sizes=sizes)
+        per_group = np.bincount(np.concatenate([h["code"] for h in hits[d]]), minlength=n_groups) if hits[d] \
+            else np.zeros(n_groups, dtype=np.int64)
+        present = per_group > 0
+        groups[d] = (first_row[present], per_group[present])
+        for name, cols in layouts.items():
+            counter = counts[(d, name)] = _TopGroups(["anomaly_metric"] + cols)
+            if hits[d]:
+                rows = np.concatenate([h["row"] for h in hits[d]])
+                counter.add([np.concatenate([h["metric"] for h in hits[d]])] + [row_keys[c][0][rows] for c in cols],
+                            [metric_names] + [row_keys[c][1] for c in cols])
+        for i, start in enumerate(range(0, len(frame), MERGE_ROWS)):
+            frame.iloc[start:start + MERGE_ROWS].to_pickle(os.path.join(folder, f"anom-{d}-{i:06d}.pkl"))
+    return {"groups": groups, "counts": counts, "moments": moments, "rows": len(df)}
+
+
+class _SpillReader:
+    """Sequential reader over one partition's spilled anomaly chunks of one detector."""
+
+    def __init__(self, folder: str, detector: str):
+        prefix = f"anom-{detector}-"
+        self._paths = [os.path.join(folder, n) for n in sorted(os.listdir(folder)) if n.startswith(prefix)]
+        self._buffer = None
+
+    def take(self, n: int) -> pd.DataFrame:
+        pieces = []
+        while n > 0:
+            if self._buffer is None or len(self._buffer) == 0:
+                self._buffer = pd.read_pickle(self._paths.pop(0))
+            pieces.append(self._buffer.iloc[:n])
+            n -= len(pieces[-1])
+            self._buffer = self._buffer.iloc[len(pieces[-1]):]
+        return pieces[0] if len(pieces) == 1 else pd.concat(pieces, ignore_index=True)
+
+
+def _merge_anomalies(spill_dir, detector, partitions, groups, id_cols, path) -> int:
+    """Write one detector's anomaly CSV from the partition spills, in the in-memory run's group order.
+
+    Groups are ordered by their first row in the cleaned data; each partition's
+    groups already are, so every spill is read front to back once and at most
+    one chunk per partition (plus one output block) is held at a time.
+    """
+    parts = [p for p in range(partitions) if p in groups]
+    if not parts:
+        write_csv(pd.DataFrame(columns=id_cols), path, index=False)
+        return 0
+    first = np.concatenate([groups[p][0] for p in parts])
+    rows = np.concatenate([groups[p][1] for p in parts])
+    owner = np.concatenate([np.full(len(groups[p][0]), p) for p in parts])
+    seq = np.argsort(first, kind="stable")
+    owner, rows = owner[seq], rows[seq]
+
+    readers = {p: _SpillReader(_partition_dir(spill_dir, p), detector) for p in parts}
+    # Runs of consecutive groups from the same partition are read with one take().
+    run_start = np.flatnonzero(np.concatenate(([True], owner[1:] != owner[:-1])))
+    run_rows = np.add.reduceat(rows, run_start)
+    total = int(rows.sum())
+    with atomic_path(path) as tmp, open(tmp, "w", encoding="utf-8", newline="") as f:
+        pending, pending_rows, header = [], 0, True
+        for i, start in enumerate(run_start):
+            pending.append(readers[int(owner[start])].take(int(run_rows[i])))
+            pending_rows += int(run_rows[i])
+            if pending_rows >= MERGE_ROWS or i == len(run_start) - 1:
+                block = pending[0] if len(pending) == 1 else pd.concat(pending, ignore_index=True)
+                block.to_csv(f, index=False, header=header)
+                pending, pending_rows, header = [], 0, False
+    return total
+
+
+def _combine_moments(parts):
+    """Chan et al. pairwise merge of _moments tuples."""
+    n, mean, m2, lo, hi = parts[0]
+    for nb, mb, m2b, lob, hib in parts[1:]:
+        delta = mb - mean
+        total = n + nb
+        mean = mean + delta * nb / total
+        m2 = m2 + m2b + delta * delta * n * nb / total
+        n, lo, hi = total, min(lo, lob), max(hi, hib)
+    return n, mean, m2, lo, hi
+
+
+def _float_key(x) -> int:
+    """Integer with the same order as the float64 `x`."""
+    i = int(np.float64(x).view(np.int64))
+    return i if i >= 0 else -(i & 0x7FFF_FFFF_FFFF_FFFF)
+
+
+def _key_float(k: int) -> float:
+    bits = k if k >= 0 else (-k) | -0x8000_0000_0000_0000
+    return float(np.int64(bits).view(np.float64))
+
+
+def _kth_smallest(arrays, k: int, lo: float, hi: float) -> float:
+    """k-th (0-based) smallest value across sorted arrays, by bisection on float order.
+
+    At most 64 rounds of one searchsorted per array, so the arrays can stay memory-mapped.
+    """
+    lo_key, hi_key = _float_key(lo), _float_key(hi)
+    while lo_key < hi_key:
+        mid = (lo_key + hi_key) // 2
+        x = _key_float(mid)
+        if sum(int(np.searchsorted(a, x, side="right")) for a in arrays) > k:
+            hi_key = mid
+        else:
+            lo_key = mid + 1
+    return _key_float(lo_key)
+
+
+def _global_stats(spill_dir, col, partitions, moments):
+    """Exact mean/median/min/max/std of one metric from the per-partition moments and sorted values."""
+    parts = [moments[p][col] for p in range(partitions) if p in moments and moments[p][col] is not None]
+    if not parts:
+        return None
+    n, mean, m2, lo, hi = _combine_moments(parts)
+    arrays = [np.load(os.path.join(spill_dir, f"values-{col}-{p:04d}.npy"), mmap_mode="r")
+              for p in range(partitions) if p in moments and moments[p][col] is not None]
+    median = _kth_smallest(arrays, n // 2, lo, hi)
+    if n % 2 == 0:
+        median = (_kth_smallest(arrays, n // 2 - 1, lo, hi) + median) / 2
+    return {"mean": mean, "median": median, "min": lo, "max": hi, "std": (m2 / n) ** 0.5}
+
+
+@timed("analysis_out_of_core")
+def analyze_out_of_core(partitions: int = PARTITIONS, workers: int = 1, quantile_method: str = "exact",
+                        sketch_alpha: float = DEFAULT_ALPHA, groupings=None, detectors=None,
+                        top_n: int = TOP_N, spill_dir: str = SPILL_DIR):
+    """analyze_and_detect for data larger than memory, per HCPCS code.
+
+    The cleaned store is streamed once into `partitions` spill folders by
+    hash of hcpcs_cd, so every code's rows land in one partition. Partitions
+    are then loaded and scored one at a time (`workers` > 1 scores several
+    at once, each in its own process) with the same detectors, thresholds and
+    MIN_GROUP_SIZE. Their anomaly rows and top-group counts are merged into
+    the standard anomaly CSVs, top-group tables and summary, matching an
+    in-memory run row for row. Only the default per-HCPCS grouping is supported.
+    Returns None: the outputs are on disk, not held in memory.
+    """
+    if quantile_method not in QUANTILE_METHODS:
+        raise ValueError(f"quantile_method must be one of {QUANTILE_METHODS}, got {quantile_method!r}")
+    groupings = parse_groupings(groupings or DEFAULT_GROUPINGS)
+    if groupings != DEFAULT_GROUPINGS:
+        raise ValueError("out-of-core mode only supports the default per-HCPCS grouping")
+    detectors = tuple(detectors or DEFAULT_DETECTORS)
+    unknown = sorted(set(detectors) - set(DETECTORS))
+    if unknown:
+        raise ValueError(f"unknown detectors {unknown}; expected {tuple(DETECTORS)}")
+    if partitions < 1:
+        raise ValueError(f"partitions must be >= 1, got {partitions}")
+    if top_n < 1:
+        raise ValueError(f"top_n must be >= 1, got {top_n}")
+
+    available = stored_columns()
+    for col in ["hcpcs_cd", "hcpcs_desc", "avg_mdcr_pymt_amt", "submitted_to_payment_ratio"]:
+        if col not in available:
+            raise ValueError(f"Missing required column in cleaned data: {col}")
+    id_cols = usecols(ID_COLS)
+
+    shutil.rmtree(spill_dir, ignore_errors=True)
+    try:
+        with stage("spill") as info:
+            info["rows"] = n_rows = spill_partitions(id_cols, partitions, spill_dir)
+        present = [p for p in range(partitions) if os.path.isdir(_partition_dir(spill_dir, p))]
+
+        with stage("score", rows=n_rows):
+            args = (spill_dir, id_cols, MIN_GROUP_SIZE, Z_THRESHOLD, quantile_method, sketch_alpha, detectors)
+            if workers > 1:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    results = dict(zip(present, pool.map(_score_partition, present, *[[a] * len(present) for a in args])))
+            else:
+                results = {p: _score_partition(p, *args) for p in present}
+            print(f"Out-of-core: {n_rows} rows in {len(present)} partitions "
+                  f"(largest {max((r['rows'] for r in results.values()), default=0)} rows)")
+
+        breakdowns = _breakdowns(id_cols)
+        _drop_stale_outputs(groupings, detectors, breakdowns)
+        counts = {}
+        with stage("merge") as info:
+            for d in detectors:
+                groups = {p: r["groups"][d] for p, r in results.items() if len(r["groups"][d][0])}
+                counts[d] = _merge_anomalies(spill_dir, d, partitions, groups, id_cols,
+                                             os.path.join(ANOM_DIR, f"anomalies_{d}.csv"))
+                for name in [""] + [f"_{b}" for b in breakdowns]:
+                    parts = [r["counts"][(d, name)] for r in results.values()]
+                    total = _TopGroups(parts[0].columns if parts else TOP_GROUP_KEYS)
+                    for part in parts:
+                        total.counts.update(part.counts)
+                    write_csv(total.top(top_n), os.path.join(TABLES_DIR, f"top_{d}_groups{name}.csv"), index=False)
+            info["rows"] = sum(counts.values())
+
+        moments = {p: r["moments"] for p, r in results.items()}
+        _write_summary(n_rows, len(available), groupings, MIN_GROUP_SIZE, quantile_method, sketch_alpha,
+                       _global_stats(spill_dir, "avg_mdcr_pymt_amt", partitions, moments),
+                       _global_stats(spill_dir, "submitted_to_payment_ratio", partitions, moments), counts, {})
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+    if os.path.exists(STATE_PATH):
+        os.remove(STATE_PATH)
+
+    print("Analysis + anomalies done (out-of-core)")
+    print("Saved:")
+    for d in detectors:
+        print("-", os.path.join(ANOM_DIR, f"anomalies_{d}.csv"))
+    print("-", SUMMARY_PATH)
+    for d in detectors:
+        print("-", os.path.join(TABLES_DIR, f"top_{d}_groups.csv"))
+    return None
+
+
+if __name__ == "__main__":
+    analyze_out_of_core()
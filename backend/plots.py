@@ -1,41 +1,220 @@
 # backend/plots.py
 import os
+import inspect
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
+from matplotlib.axes import Axes
+from matplotlib.figure import Figure
 
-CLEAN_PATH = os.path.join("Data", "healthcare_cleaned.csv")
-PLOTS_DIR = os.path.join("outputs", "plots")
+from backend.instrument import stage, timed
+from backend.schema import cost_column
+from backend.sketch import DEFAULT_ALPHA, QUANTILE_METHODS, QuantileSketch
+from backend.storage import iter_cleaned, read_cleaned
+
+BASE_DIR = os.environ.get("CMS_PIPELINE_DIR") or os.path.dirname(os.path.dirname(__file__))
+
+PLOTS_DIR = os.path.join(BASE_DIR, "outputs", "plots")
+GROUP_PLOTS_DIR = os.path.join(PLOTS_DIR, "top_groups")
+TOP_GROUPS_CSV = os.path.join(BASE_DIR, "outputs", "tables", "top_iqr_groups.csv")
 os.makedirs(PLOTS_DIR, exist_ok=True)
 
-def pick_cost_column(df: pd.DataFrame) -> str:
-  
-    num_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
-    if len(num_cols) == 1:
-        return num_cols[0]
-   
-    keywords = ["price", "payment", "charge", "cost", "amount", "rate"]
-    for k in keywords:
-        for c in num_cols:
-            if k in c.lower():
-                return c
-    return num_cols[0] if num_cols else ""
-
-def make_plots():
-    df = pd.read_csv(CLEAN_PATH, low_memory=False)
-    cost_col = pick_cost_column(df)
-    if cost_col == "":
-        raise SystemExit("No numeric cost column found in cleaned data.")
-
-   
+# "binned" draws from precomputed bins/box stats; "raw" hands every value to seaborn.
+PLOT_MODES = ("binned", "raw")
+HIST_BINS = 60
+# Outliers are drawn at most once per 1/FLIER_SLOTS of the value range: at plot
+# resolution the same picture as drawing all of them, at a fixed cost.
+FLIER_SLOTS = 1000
+TOP_GROUP_PLOTS = 12
+
+# Axes.bxp took vert=False before matplotlib 3.10 added `orientation`.
+_HORIZONTAL = ({"orientation": "horizontal"} if "orientation" in inspect.signature(Axes.bxp).parameters
+               else {"vert": False})
+
+
+def _finite(values) -> np.ndarray:
+    x = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=np.float64)
+    return x[np.isfinite(x)]
+
+
+class _Box:
+    """Box-plot statistics (matplotlib bxp format) accumulated over batches of values in [lo, hi]."""
+
+    def __init__(self, q1, med, q3, lo, hi):
+        self.q1, self.med, self.q3 = q1, med, q3
+        self.lo, self.cap = lo, hi
+        iqr = q3 - q1
+        self.lo_fence, self.hi_fence = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+        self.whislo, self.whishi = np.inf, -np.inf
+        self._scale = (FLIER_SLOTS - 1) / (hi - lo) if hi > lo else 0.0
+        self._slots = np.full(FLIER_SLOTS, np.nan)
+        self.n_fliers = 0
+
+    def add(self, x: np.ndarray):
+        x = x[x <= self.cap]
+        inside = (x >= self.lo_fence) & (x <= self.hi_fence)
+        if inside.any():
+            self.whislo = min(self.whislo, float(x[inside].min()))
+            self.whishi = max(self.whishi, float(x[inside].max()))
+        out = x[~inside]
+        self.n_fliers += len(out)
+        self._slots[((out - self.lo) * self._scale).astype(np.int64)] = out
+
+    def stats(self, label: str) -> dict:
+        return {"label": label, "q1": self.q1, "med": self.med, "q3": self.q3,
+                "whislo": self.whislo, "whishi": self.whishi,
+                "fliers": self._slots[~np.isnan(self._slots)]}
+
+
+def cost_aggregates(cost_col: str, quantile_method: str = "exact", sketch_alpha: float = DEFAULT_ALPHA,
+                    values=None) -> dict:
+    """Histogram and box statistics of the cost column (all values and <= 99th percentile).
+
+    "exact" loads the column once and takes the quantiles from one partition;
+    "sketch" streams the store twice (quantiles from a QuantileSketch, then
+    bins, whiskers and fliers), so the column is never loaded whole. `values`
+    replaces the store read with an in-memory column.
+    """
+    if quantile_method not in QUANTILE_METHODS:
+        raise ValueError(f"quantile_method must be one of {QUANTILE_METHODS}, got {quantile_method!r}")
+
+    def batches():
+        if values is not None:
+            yield _finite(values)
+        elif quantile_method == "exact":
+            yield _finite(read_cleaned(columns=[cost_col])[cost_col])
+        else:
+            for batch in iter_cleaned(columns=[cost_col]):
+                yield _finite(batch[cost_col])
+
+    if quantile_method == "exact":
+        x = next(batches())
+        if len(x) == 0:
+            return {"n": 0}
+        q1, med, q3, cap = np.quantile(x, [0.25, 0.5, 0.75, 0.99])
+        below = x[x <= cap]
+        cq1, cmed, cq3 = np.quantile(below, [0.25, 0.5, 0.75])
+        passes = [x]
+        lo, hi, n = float(x.min()), float(x.max()), len(x)
+    else:
+        sketch = QuantileSketch(alpha=sketch_alpha)
+        lo, hi, n = np.inf, -np.inf, 0
+        for x in batches():
+            if len(x):
+                sketch.add(x)
+                lo, hi, n = min(lo, float(x.min())), max(hi, float(x.max())), n + len(x)
+        if n == 0:
+            return {"n": 0}
+        q1, med, q3, cap = (float(sketch.quantile(q)[0]) for q in (0.25, 0.5, 0.75, 0.99))
+        # The capped subset's quantiles are the full quantiles at 0.99 * q.
+        cq1, cmed, cq3 = (float(sketch.quantile(0.99 * q)[0]) for q in (0.25, 0.5, 0.75))
+        passes = batches()
+
+    edges = np.linspace(lo, hi, HIST_BINS + 1) if hi > lo else np.array([lo - 0.5, lo + 0.5])
+    counts = np.zeros(len(edges) - 1, dtype=np.int64)
+    full, capped = _Box(q1, med, q3, lo, hi), _Box(cq1, cmed, cq3, lo, cap)
+    for x in passes:
+        counts += np.histogram(x, bins=edges)[0]
+        full.add(x)
+        capped.add(x)
+
+    return {"n": n, "hist": (counts, edges), "box": full.stats(cost_col), "box_99": capped.stats(cost_col),
+            "n_fliers": full.n_fliers, "n_fliers_99": capped.n_fliers, "cap": cap}
+
+
+def _hist_figure(counts, edges, title: str, xlabel: str) -> Figure:
+    fig = Figure()
+    ax = fig.subplots()
+    ax.stairs(counts, edges, fill=True, alpha=0.75)
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel("Count")
+    return fig
+
+
+def _box_figure(stats: dict, title: str, xlabel: str) -> Figure:
+    fig = Figure()
+    ax = fig.subplots()
+    ax.bxp([stats], **_HORIZONTAL, showfliers=True,
+           flierprops={"marker": "o", "markersize": 3, "alpha": 0.5})
+    ax.set_yticks([])
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    return fig
+
+
+def _save(fig: Figure, name: str, folder: str = PLOTS_DIR) -> str:
+    path = os.path.join(folder, name)
+    fig.savefig(path, bbox_inches="tight")
+    return path
+
+
+def _plot_group(item) -> str:
+    """Render one HCPCS small multiple (runs in a worker process)."""
+    code, desc, counts, edges, box = item
+    fig = Figure(figsize=(4, 3))
+    hist_ax, box_ax = fig.subplots(2, 1, sharex=True, gridspec_kw={"height_ratios": [3, 1]})
+    hist_ax.stairs(counts, edges, fill=True, alpha=0.75)
+    hist_ax.axvline(box["q3"] + 1.5 * (box["q3"] - box["q1"]), color="crimson", linestyle="--", linewidth=1)
+    hist_ax.set_title(f"{code} {desc}"[:60], fontsize=8)
+    hist_ax.tick_params(labelsize=7)
+    box_ax.bxp([box], **_HORIZONTAL, showfliers=True, flierprops={"marker": ".", "markersize": 2})
+    box_ax.set_yticks([])
+    box_ax.tick_params(labelsize=7)
+    safe = "".join(ch if ch.isalnum() else "_" for ch in str(code))
+    return _save(fig, f"hcpcs_{safe}.png", GROUP_PLOTS_DIR)
+
+
+def top_group_codes(top_n: int = TOP_GROUP_PLOTS) -> list:
+    """HCPCS codes with the most IQR anomalies, from the analysis top-groups table."""
+    if not os.path.exists(TOP_GROUPS_CSV):
+        return []
+    top = pd.read_csv(TOP_GROUPS_CSV, dtype={"hcpcs_cd": str})
+    counts = top.groupby("hcpcs_cd", sort=False)["count"].sum().sort_values(ascending=False, kind="stable")
+    return counts.index[:top_n].tolist()
+
+
+def group_aggregates(cost_col: str, codes: list) -> list:
+    """(code, description, hist counts, edges, box stats) per HCPCS code, from one projected read."""
+    if not codes:
+        return []
+    df = read_cleaned(columns=["hcpcs_cd", "hcpcs_desc", cost_col])
+    df = df[df["hcpcs_cd"].astype(str).isin(codes)]
+    x = pd.to_numeric(df[cost_col], errors="coerce").to_numpy(dtype=np.float64)
+    keys = df["hcpcs_cd"].astype(str).to_numpy()
+    desc = dict(zip(keys, df["hcpcs_desc"].astype(str)))
+    order = np.argsort(keys, kind="stable")
+    keys, x = keys[order], x[order]
+    starts = np.searchsorted(keys, codes, side="left")
+    ends = np.searchsorted(keys, codes, side="right")
+
+    items = []
+    for code, a, b in zip(codes, starts, ends):
+        v = x[a:b]
+        v = v[np.isfinite(v)]
+        if len(v) == 0:
+            continue
+        q1, med, q3 = np.quantile(v, [0.25, 0.5, 0.75])
+        lo, hi = float(v.min()), float(v.max())
+        box = _Box(q1, med, q3, lo, hi)
+        box.add(v)
+        edges = np.linspace(lo, hi, HIST_BINS + 1) if hi > lo else np.array([lo - 0.5, lo + 0.5])
+        items.append((code, desc.get(code, ""), np.histogram(v, bins=edges)[0], edges, box.stats(code)))
+    return items
+
+
+def _make_raw_plots(cost_col: str):
+    df = read_cleaned(columns=[cost_col])
+
     plt.figure()
-    sns.histplot(df[cost_col].dropna(), bins=60)
+    sns.histplot(df[cost_col].dropna(), bins=HIST_BINS)
     plt.title(f"Distribution of {cost_col}")
     plt.xlabel(cost_col)
     plt.savefig(os.path.join(PLOTS_DIR, "01_hist_cost.png"), bbox_inches="tight")
     plt.close()
 
-  
     plt.figure()
     sns.boxplot(x=df[cost_col])
     plt.title(f"Boxplot of {cost_col} (Outliers)")
@@ -43,7 +222,6 @@ def make_plots():
     plt.savefig(os.path.join(PLOTS_DIR, "02_boxplot_cost.png"), bbox_inches="tight")
     plt.close()
 
-    
     cap = df[cost_col].quantile(0.99)
     plt.figure()
     sns.boxplot(x=df[df[cost_col] <= cap][cost_col])
@@ -52,10 +230,61 @@ def make_plots():
     plt.savefig(os.path.join(PLOTS_DIR, "03_boxplot_cost_99pct.png"), bbox_inches="tight")
     plt.close()
 
+
+@timed("plots")
+def make_plots(mode: str = "binned", quantile_method: str = "exact", sketch_alpha: float = DEFAULT_ALPHA,
+               top_groups: int = TOP_GROUP_PLOTS, workers: int = 1):
+    """Cost distribution plots, plus per-HCPCS small multiples for the most anomalous codes.
+
+    `mode="binned"` computes bins, box statistics and quantiles once
+    (cost_aggregates) and draws from them; outlier markers are thinned to
+    FLIER_SLOTS positions. `mode="raw"` is the original
+    seaborn rendering of every value. The small multiples are rendered on
+    `workers` processes.
+    """
+    if mode not in PLOT_MODES:
+        raise ValueError(f"mode must be one of {PLOT_MODES}, got {mode!r}")
+    cost_col = cost_column()
+
+    if mode == "raw":
+        with stage("overview"):
+            _make_raw_plots(cost_col)
+    else:
+        with stage("aggregate") as info:
+            agg = cost_aggregates(cost_col, quantile_method, sketch_alpha)
+            info["rows"] = agg["n"]
+        if agg["n"] == 0:
+            raise SystemExit(f"No numeric values in cost column {cost_col}.")
+        with stage("overview"):
+            counts, edges = agg["hist"]
+            _save(_hist_figure(counts, edges, f"Distribution of {cost_col}", cost_col), "01_hist_cost.png")
+            _save(_box_figure(agg["box"], f"Boxplot of {cost_col} (Outliers: {agg['n_fliers']:,})", cost_col),
+                  "02_boxplot_cost.png")
+            _save(_box_figure(agg["box_99"], f"Boxplot of {cost_col} (<= 99th percentile)", cost_col),
+                  "03_boxplot_cost_99pct.png")
+
+    saved = []
+    with stage("top_groups") as info:
+        items = group_aggregates(cost_col, top_group_codes(top_groups))
+        info["rows"] = len(items)
+        if items:
+            os.makedirs(GROUP_PLOTS_DIR, exist_ok=True)
+            for name in os.listdir(GROUP_PLOTS_DIR):
+                if name.startswith("hcpcs_") and name.endswith(".png"):
+                    os.remove(os.path.join(GROUP_PLOTS_DIR, name))
+            if workers > 1:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    saved = list(pool.map(_plot_group, items))
+            else:
+                saved = [_plot_group(item) for item in items]
+
     print(" Plots saved to outputs/plots:")
     print("- 01_hist_cost.png")
     print("- 02_boxplot_cost.png")
     print("- 03_boxplot_cost_99pct.png")
+    if saved:
+        print(f"- top_groups/ ({len(saved)} HCPCS small multiples)")
+
 
 if __name__ == "__main__":
     make_plots()
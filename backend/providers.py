@@ -0,0 +1,169 @@
+import os
+import numpy as np
+import pandas as pd
+
+from backend.analysis import ANOM_DIR, DETECTORS, TABLES_DIR
+from backend.hashing import SeenHashes, row_hashes
+from backend.instrument import stage, timed
+from backend.storage import plain_dtypes
+from backend.writers import write_csv, write_json
+
+BASE_DIR = os.environ.get("CMS_PIPELINE_DIR") or os.path.dirname(os.path.dirname(__file__))
+
+TOP_PROVIDERS_CSV = os.path.join(TABLES_DIR, "top_providers.csv")
+TOP_PROVIDERS_JSON = os.path.join(BASE_DIR, "outputs", "top_providers.json")
+
+TOP_K = 500
+CHUNK_ROWS = 200_000
+
+PROVIDER_COLS = ["rndrng_prvdr_last_org_name", "rndrng_prvdr_first_name",
+                 "rndrng_prvdr_type", "rndrng_prvdr_state_abrvtn"]
+METRIC_COLS = ["avg_mdcr_pymt_amt", "submitted_to_payment_ratio"]
+
+
+def anomaly_paths() -> dict:
+    """Primary-grouping anomaly file of every detector the analysis step wrote."""
+    paths = {d: os.path.join(ANOM_DIR, f"anomalies_{d}.csv") for d in DETECTORS}
+    return {d: p for d, p in paths.items() if os.path.exists(p) and os.path.getsize(p) > 0}
+
+
+def _read_chunks(path: str, chunksize: int):
+    usecols = set(["rndrng_npi", "hcpcs_cd", "anomaly_metric", "iqr_upper_bound", "z_score"]
+                  + PROVIDER_COLS + METRIC_COLS)
+    return pd.read_csv(path, usecols=lambda c: c in usecols, chunksize=chunksize,
+                       dtype={"rndrng_npi": str, "hcpcs_cd": str}, low_memory=False)
+
+
+def _frame_chunks(frame: pd.DataFrame, chunksize: int):
+    """Slices of an in-memory anomaly frame, typed like _read_chunks output."""
+    for start in range(0, len(frame), chunksize):
+        chunk = plain_dtypes(frame.iloc[start:start + chunksize])
+        for c in ("rndrng_npi", "hcpcs_cd"):
+            if c in chunk.columns:
+                chunk[c] = chunk[c].astype(str).where(chunk[c].notna())
+        yield chunk
+
+
+def _chunk_totals(chunk: pd.DataFrame, detector: str) -> pd.DataFrame:
+    """Per-NPI partial aggregates of one chunk of one detector's anomalies."""
+    parts = {f"{detector}_count": np.ones(len(chunk), dtype=np.int64)}
+    if "iqr_upper_bound" in chunk.columns:
+        # Excess over the group's IQR upper bound, kept per metric (dollars vs ratio).
+        for col in METRIC_COLS:
+            on_col = (chunk["anomaly_metric"] == col).to_numpy()
+            excess = pd.to_numeric(chunk[col], errors="coerce").to_numpy() - chunk["iqr_upper_bound"].to_numpy()
+            parts[f"{col}_excess"] = np.where(on_col, excess, 0.0)
+    if "z_score" in chunk.columns:
+        parts["max_z_score"] = chunk["z_score"].to_numpy(dtype=np.float64)
+
+    frame = pd.DataFrame(parts, index=chunk["rndrng_npi"].to_numpy())
+    grouped = frame.groupby(level=0, sort=False)
+    totals = grouped.sum(min_count=1)
+    if "max_z_score" in frame.columns:
+        totals["max_z_score"] = grouped["max_z_score"].max()
+    names = [c for c in PROVIDER_COLS if c in chunk.columns]
+    if names:
+        totals = totals.join(chunk[["rndrng_npi"] + names].drop_duplicates("rndrng_npi").set_index("rndrng_npi"))
+    return totals
+
+
+def _fold(partials: list) -> pd.DataFrame:
+    """Merge per-NPI partial aggregates into one, in first-seen NPI order.
+
+    Counts, excess and distinct_hcpcs add up (NaN only if every part is NaN),
+    max_z_score takes the max and provider names keep the first non-null value.
+    """
+    both = pd.concat(partials) if len(partials) > 1 else partials[0]
+    grouped = both.groupby(level=0, sort=False)
+    sums = [c for c in both.columns if c != "max_z_score" and c not in PROVIDER_COLS]
+    out = grouped[sums].sum(min_count=1)
+    if "max_z_score" in both.columns:
+        out["max_z_score"] = grouped["max_z_score"].max()
+    names = [c for c in PROVIDER_COLS if c in both.columns]
+    if names:
+        out[names] = grouped[names].first()
+    return out
+
+
+@timed("providers")
+def rollup_providers(top_k: int = TOP_K, chunksize: int = CHUNK_ROWS, anomalies: dict = None):
+    """Rank providers (NPI) by anomalies across all HCPCS codes.
+
+    Streams each detector's anomaly table in `chunksize` rows into per-NPI
+    partial aggregates (anomaly counts per method, excess over the IQR upper
+    bound, max Z-score, distinct HCPCS codes). Partials are folded into the
+    running aggregate once they outnumber it, so each row is regrouped O(1)
+    times on average. Memory is the per-NPI aggregate plus 8 bytes per
+    distinct (NPI, HCPCS) pair (sorted hash runs), not the anomaly lines
+    themselves. Tables without rndrng_npi are skipped. The `top_k` providers by
+    anomaly count, then payment excess, are written to top_providers.csv and
+    top_providers.json. `anomalies` ({detector: frame}, as returned by
+    analyze_and_detect) is sliced in memory instead of reading the CSVs.
+    """
+    if anomalies is not None:
+        sources = {d: _frame_chunks(anomalies[d], chunksize) for d in DETECTORS if d in anomalies}
+    else:
+        sources = {d: _read_chunks(path, chunksize) for d, path in anomaly_paths().items()}
+    totals = None
+    partials = []
+    partial_rows = 0
+    pairs = SeenHashes()
+    n_rows = 0
+    with stage("aggregate") as info:
+        for detector, chunks in sources.items():
+            for chunk in chunks:
+                if "rndrng_npi" not in chunk.columns:
+                    print(f"- {detector}: no rndrng_npi column, skipped")
+                    break
+                chunk = chunk[chunk["rndrng_npi"].notna()]
+                n_rows += len(chunk)
+                part = _chunk_totals(chunk, detector)
+                if "hcpcs_cd" in chunk.columns:
+                    new = pairs.first_seen(row_hashes(chunk[["rndrng_npi", "hcpcs_cd"]]))
+                    new = pd.Series(new, index=chunk["rndrng_npi"].to_numpy())
+                    part["distinct_hcpcs"] = new.groupby(level=0, sort=False).sum()
+                partials.append(part)
+                partial_rows += len(part)
+                if partial_rows >= max(chunksize, 0 if totals is None else len(totals)):
+                    totals = _fold(([] if totals is None else [totals]) + partials)
+                    partials, partial_rows = [], 0
+        if partials:
+            totals = _fold(([] if totals is None else [totals]) + partials)
+        info["rows"] = n_rows
+
+    if totals is None:
+        ranked = pd.DataFrame(columns=["rndrng_npi", "anomaly_count", "distinct_hcpcs"] + PROVIDER_COLS)
+    else:
+        counts = [f"{d}_count" for d in sources]
+        for c in counts:
+            totals[c] = totals[c].fillna(0).astype(np.int64) if c in totals.columns else 0
+        totals["anomaly_count"] = totals[counts].sum(axis=1)
+        if "distinct_hcpcs" in totals.columns:
+            totals["distinct_hcpcs"] = totals["distinct_hcpcs"].fillna(0).astype(np.int64)
+        totals.index.name = "rndrng_npi"
+
+        # A provider's totals can grow in any chunk, so ranking waits for the full aggregate;
+        # nlargest then selects top_k (heap/partition) instead of sorting every provider.
+        by = ["anomaly_count"]
+        if "avg_mdcr_pymt_amt_excess" in totals.columns:
+            by.append("avg_mdcr_pymt_amt_excess")
+        ranked = totals.nlargest(top_k, by).reset_index()
+        stats = [f"{c}_excess" for c in METRIC_COLS] + ["max_z_score"]
+        columns = ["rndrng_npi"] + PROVIDER_COLS + ["anomaly_count", "distinct_hcpcs"] + counts + stats
+        ranked = ranked[[c for c in columns if c in ranked.columns]]
+        ranked.insert(0, "rank", np.arange(1, len(ranked) + 1))
+
+    write_csv(ranked, TOP_PROVIDERS_CSV, index=False)
+    records = ranked.astype(object).where(ranked.notna(), None).to_dict(orient="records")
+    write_json({"providers_flagged": 0 if totals is None else int(len(totals)), "top_providers": records},
+               TOP_PROVIDERS_JSON, indent=2, ensure_ascii=False)
+
+    print("Provider rollup done")
+    print("Saved:")
+    print("-", TOP_PROVIDERS_CSV)
+    print("-", TOP_PROVIDERS_JSON)
+    return ranked
+
+
+if __name__ == "__main__":
+    rollup_providers()
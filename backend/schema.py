@@ -0,0 +1,197 @@
+import os
+import re
+import json
+import hashlib
+import pandas as pd
+
+from backend.storage import cleaned_columns, cleaned_path, peek_cleaned
+from backend.writers import write_json
+
+BASE_DIR = os.environ.get("CMS_PIPELINE_DIR") or os.path.dirname(os.path.dirname(__file__))
+
+# Resolved schema of the cleaned store, written by the cleaning step next to it.
+SCHEMA_PATH = os.path.join(BASE_DIR, "Data", "healthcare_schema.json")
+
+# Canonical CMS name -> accepted (normalized) raw names, in order of preference.
+ALIASES = {
+    "rndrng_npi": ["rndrng_npi", "rendering_npi", "npi"],
+    "rndrng_prvdr_type": ["rndrng_prvdr_type", "provider_type", "provider_type_desc", "prvdr_type"],
+    "hcpcs_cd": ["hcpcs_cd", "hcpcs_code", "hcpcs"],
+    "hcpcs_desc": ["hcpcs_desc", "hcpcs_description", "hcpcs_desc_txt", "hcpcs_description_txt"],
+    "hcpcs_drug_ind": ["hcpcs_drug_ind", "drug_ind", "hcpcs_drug_indicator"],
+    "place_of_srvc": ["place_of_srvc", "place_of_service", "pos", "place_of_svc"],
+    "tot_srvcs": ["tot_srvcs", "total_services", "tot_srvs", "line_srvc_cnt", "line_service_cnt"],
+    "tot_benes": ["tot_benes", "total_beneficiaries", "bene_unique_cnt", "bene_cnt"],
+    "avg_sbmtd_chrg_amt": ["avg_sbmtd_chrg", "average_submitted_charge_amount", "avg_sbmtd_chrg_amt",
+                           "average_submitted_charge_amt", "avg_submitted_charge_amt"],
+    "avg_mdcr_alowd_amt": ["avg_mdcr_alowd_amt", "average_medicare_allowed_amount", "avg_mdcr_allowed_amt",
+                           "average_medicare_allowed_amt"],
+    "avg_mdcr_pymt_amt": ["avg_mdcr_pymt_amt", "average_medicare_payment_amount", "avg_mdcr_payment_amt",
+                          "average_medicare_payment_amt"],
+    "avg_mdcr_stdzd_amt": ["avg_mdcr_stdzd_amt", "average_medicare_standardized_amount",
+                           "avg_mdcr_standardized_amt", "average_medicare_standardized_amt"],
+}
+
+# Column behind the global cost stats and the cost plots, in order of preference.
+COST_COLS = ["avg_mdcr_pymt_amt", "avg_mdcr_stdzd_amt", "avg_mdcr_alowd_amt", "avg_sbmtd_chrg_amt", "price_amt"]
+
+# Columns whose presence summary.json reports.
+KEY_COLUMNS = ["hcpcs_cd", "hcpcs_desc", "rndrng_npi", "rndrng_prvdr_type", "rndrng_prvdr_state_abrvtn",
+               "place_of_srvc_label"]
+
+# Dashboard field -> anomaly record keys it may be read from, in order of preference.
+DASHBOARD_ROLES = {
+    "method": ["anomaly_method", "method", "flag"],
+    "state": ["rndrng_prvdr_state_abrvtn", "state", "provider_state"],
+    "provider_type": ["rndrng_prvdr_type", "provider_type"],
+    "pos": ["place_of_srvc_label", "place_of_srvc", "pos", "place_of_service"],
+    "hcpcs": ["hcpcs_cd", "hcpcs_code"],
+    "hcpcs_desc": ["hcpcs_desc", "hcpcs_description"],
+    "npi": ["rndrng_npi", "npi"],
+}
+
+# Raw header mappings by header_hash, and the loaded schema by store stamp (per process).
+_RESOLVED = {}
+_SCHEMA = {}
+
+
+def normalize_colname(c: str) -> str:
+    """Normalize column names to snake_case, lowercase, safe for matching."""
+    c = c.strip()
+    c = c.replace("\ufeff", "")
+    c = c.lower()
+    c = re.sub(r"[^\w]+", "_", c)
+    c = re.sub(r"_+", "_", c).strip("_")
+    return c
+
+
+def header_hash(columns) -> str:
+    return hashlib.sha256("\x1f".join(map(str, columns)).encode("utf-8")).hexdigest()[:16]
+
+
+def rename_map(columns) -> dict:
+    """Map normalized raw column names onto the canonical CMS names."""
+    columns = set(columns)
+    mapping = {}
+    for canonical, candidates in ALIASES.items():
+        found = next((c for c in candidates if c in columns), None)
+        if found:
+            mapping[found] = canonical
+    return mapping
+
+
+def _saved_mappings() -> dict:
+    try:
+        with open(SCHEMA_PATH, "r", encoding="utf-8") as f:
+            return json.load(f).get("resolved", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def resolve_header(columns) -> list:
+    """Final cleaned name of every raw column, in order.
+
+    Resolved once per distinct header: the result is memoized by header_hash
+    and seeded from the mappings saved in SCHEMA_PATH, so streaming chunks and
+    re-runs on the same extract skip the normalize/alias pass.
+    """
+    columns = list(columns)
+    key = header_hash(columns)
+    if key not in _RESOLVED:
+        saved = _saved_mappings().get(key)
+        if saved is not None and len(saved) == len(columns):
+            _RESOLVED[key] = saved
+        else:
+            normalized = [normalize_colname(str(c)) for c in columns]
+            renames = rename_map(normalized)
+            _RESOLVED[key] = [renames.get(c, c) for c in normalized]
+    return list(_RESOLVED[key])
+
+
+def pick_cost_column(df: pd.DataFrame) -> str:
+    """First COST_COLS name in `df`, else its first numeric column ("price_amt" if none)."""
+    for c in COST_COLS:
+        if c in df.columns:
+            return c
+    numeric_cols = df.select_dtypes(include=["number"]).columns.tolist()
+    return numeric_cols[0] if numeric_cols else "price_amt"
+
+
+def key_columns_present(columns) -> dict:
+    columns = set(columns)
+    return {c: c in columns for c in KEY_COLUMNS}
+
+
+def resolve_roles(columns) -> dict:
+    """DASHBOARD_ROLES resolved against the exported record keys (None when absent)."""
+    columns = set(columns)
+    return {role: next((c for c in candidates if c in columns), None) for role, candidates in DASHBOARD_ROLES.items()}
+
+
+def _store_stamp():
+    path = cleaned_path()
+    if not os.path.exists(path):
+        return None
+    st = os.stat(path)
+    return [os.path.basename(path), st.st_size, st.st_mtime_ns]
+
+
+def write_schema(raw_columns, df: pd.DataFrame, headers=None):
+    """Persist the resolved schema of the store just written (`df`: the cleaned frame or its first chunk).
+
+    `headers` lists every raw header behind the store when it was merged from
+    several files (`raw_columns` is then their union); each one's mapping is saved.
+    """
+    resolved = _saved_mappings()
+    for header in headers or [raw_columns]:
+        resolved[header_hash(header)] = resolve_header(header)
+    schema = {
+        "header_hash": header_hash(raw_columns),
+        "raw_columns": list(map(str, raw_columns)),
+        "columns": list(df.columns),
+        "dtypes": {c: str(t) for c, t in df.dtypes.items()},
+        "cost_column": pick_cost_column(df),
+        "key_columns_present": key_columns_present(df.columns),
+        "store": _store_stamp(),
+        "resolved": resolved,
+    }
+    write_json(schema, SCHEMA_PATH, indent=2)
+    _SCHEMA.clear()
+
+
+def cleaned_schema() -> dict:
+    """The cleaned store's schema: SCHEMA_PATH when it matches the store, else probed from the store.
+
+    Loaded once per store version, so every stage resolves columns and the
+    cost column without peeking at the data again.
+    """
+    stamp = _store_stamp()
+    key = json.dumps(stamp)
+    if key not in _SCHEMA:
+        schema = None
+        try:
+            with open(SCHEMA_PATH, "r", encoding="utf-8") as f:
+                schema = json.load(f)
+        except (OSError, ValueError):
+            pass
+        if schema is None or schema.get("store") != stamp:
+            columns = cleaned_columns()
+            schema = {"columns": columns, "cost_column": pick_cost_column(peek_cleaned()),
+                      "key_columns_present": key_columns_present(columns)}
+        _SCHEMA.clear()
+        _SCHEMA[key] = schema
+    return _SCHEMA[key]
+
+
+def stored_columns() -> list:
+    return list(cleaned_schema()["columns"])
+
+
+def cost_column() -> str:
+    return cleaned_schema()["cost_column"]
+
+
+def usecols(wanted) -> list:
+    """`wanted` restricted to the columns the cleaned store has (for projected reads)."""
+    available = set(stored_columns())
+    return [c for c in wanted if c in available]
@@ -0,0 +1,117 @@
+import numpy as np
+
+DEFAULT_ALPHA = 0.01
+QUANTILE_METHODS = ("exact", "sketch")
+# Magnitudes below this share the "zero" bucket.
+MIN_VALUE = 1e-9
+
+# Bucket keys pack (group, signed bucket position) into one int64.
+_SPAN = 1 << 32
+_HALF = 1 << 31
+
+
+class QuantileSketch:
+    """Mergeable relative-error quantile sketch (DDSketch-style log buckets), one per group.
+
+    Value x > 0 lands in bucket k with gamma**(k-1) < x <= gamma**k, where
+    gamma = (1 + alpha) / (1 - alpha); the bucket midpoint is within `alpha`
+    relative error of every value in it. Size grows with the log of the value
+    range, not with the row count, and sketches built on separate chunks merge
+    by adding bucket counts.
+    """
+
+    def __init__(self, n_groups: int = 1, alpha: float = DEFAULT_ALPHA):
+        if not 0 < alpha < 1:
+            raise ValueError(f"alpha must be in (0, 1), got {alpha}")
+        self.n_groups = int(n_groups)
+        self.alpha = float(alpha)
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = np.log(self.gamma)
+        self._offset = int(-np.floor(np.log(MIN_VALUE) / self._log_gamma)) + 1
+        self.keys = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.keys.nbytes + self.counts.nbytes)
+
+    def _position(self, values: np.ndarray) -> np.ndarray:
+        """Signed bucket position, ordered like the values (0 = the zero bucket)."""
+        mag = np.abs(values)
+        pos = np.zeros(len(values), dtype=np.int64)
+        big = mag >= MIN_VALUE
+        # inf is clipped to the largest float so it still lands in the top bucket.
+        mag = np.minimum(mag[big], np.finfo(np.float64).max)
+        pos[big] = np.ceil(np.log(mag) / self._log_gamma).astype(np.int64) + self._offset
+        return np.where(values < 0, -pos, pos)
+
+    def _value(self, pos: np.ndarray) -> np.ndarray:
+        with np.errstate(over="ignore"):
+            mid = 2 * self.gamma ** (np.abs(pos) - self._offset) / (self.gamma + 1)
+        mid = np.minimum(mid, np.finfo(np.float64).max)
+        return np.where(pos == 0, 0.0, np.sign(pos) * mid)
+
+    def _absorb(self, keys: np.ndarray, counts: np.ndarray):
+        if len(self.keys) == 0:
+            self.keys, self.counts = keys, counts.astype(np.int64)
+            return
+        keys, inv = np.unique(np.concatenate((self.keys, keys)), return_inverse=True)
+        counts = np.bincount(inv, weights=np.concatenate((self.counts, counts)), minlength=len(keys))
+        self.keys, self.counts = keys, counts.astype(np.int64)
+
+    def add(self, values, codes=None) -> "QuantileSketch":
+        """Add values (NaN ignored); `codes` gives each value's group, default group 0."""
+        values = np.asarray(values, dtype=np.float64)
+        codes = np.zeros(len(values), dtype=np.int64) if codes is None else np.asarray(codes, dtype=np.int64)
+        ok = ~np.isnan(values)
+        values, codes = values[ok], codes[ok]
+        if len(values) == 0:
+            return self
+
+        pos = self._position(values)
+        lo = int(pos.min())
+        width = int(pos.max()) - lo + 1
+        if self.n_groups * width <= max(4 * len(pos), 1 << 20):
+            # Dense (group, bucket) histogram: a single O(n) bincount.
+            dense = np.bincount(codes * width + (pos - lo), minlength=self.n_groups * width)
+            nz = np.flatnonzero(dense)
+            keys = (nz // width) * _SPAN + (nz % width + lo + _HALF)
+            counts = dense[nz]
+        else:
+            keys, counts = np.unique(codes * _SPAN + (pos + _HALF), return_counts=True)
+        self._absorb(keys, counts)
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        if other.alpha != self.alpha or other.n_groups != self.n_groups:
+            raise ValueError("can only merge sketches with the same alpha and number of groups")
+        if len(other.keys):
+            self._absorb(other.keys, other.counts)
+        return self
+
+    def count(self) -> np.ndarray:
+        """Number of values per group."""
+        return np.bincount(self.keys // _SPAN, weights=self.counts, minlength=self.n_groups).astype(np.int64)
+
+    def _rank_value(self, cum, group_start, pos, rank):
+        idx = np.searchsorted(cum, group_start + rank, side="right")
+        return self._value(pos[idx])
+
+    def quantile(self, q: float) -> np.ndarray:
+        """Per-group q-quantile, linearly interpolated between ranks like Series.quantile."""
+        out = np.full(self.n_groups, np.nan)
+        n = self.count()
+        has = n > 0
+        if not has.any():
+            return out
+        pos = self.keys % _SPAN - _HALF
+        cum = np.cumsum(self.counts)
+        group_start = np.concatenate(([0], np.cumsum(n)[:-1]))[has]
+
+        virtual = (n[has] - 1) * q
+        below = np.floor(virtual)
+        frac = virtual - below
+        a = self._rank_value(cum, group_start, pos, below.astype(np.int64))
+        b = self._rank_value(cum, group_start, pos, np.ceil(virtual).astype(np.int64))
+        out[has] = a + (b - a) * frac
+        return out
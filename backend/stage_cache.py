@@ -0,0 +1,132 @@
+import os
+import json
+import hashlib
+from datetime import datetime, timezone
+
+BASE_DIR = os.environ.get("CMS_PIPELINE_DIR") or os.path.dirname(os.path.dirname(__file__))
+
+CACHE_DIR = os.path.join(BASE_DIR, "outputs", ".stage_cache")
+# Content digests memoized by (size, mtime_ns), so unchanged multi-GB inputs are not re-read.
+HASHES_PATH = os.path.join(CACHE_DIR, "file_hashes.json")
+
+_BLOCK = 1 << 20
+
+
+def _rel(path: str) -> str:
+    return os.path.relpath(os.path.abspath(path), BASE_DIR)
+
+
+def _load_json(path: str, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def _write_json(path: str, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _files(path: str) -> list:
+    """`path` itself, or every file under it when it is a directory."""
+    if os.path.isdir(path):
+        return sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+    return [path] if os.path.exists(path) else []
+
+
+def _stat(path: str) -> list:
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def file_digest(path: str, memo: dict = None) -> str:
+    """sha256 of a file's bytes; reuses `memo[rel_path]` while size and mtime are unchanged."""
+    rel = _rel(path)
+    stat = _stat(path)
+    if memo is not None and memo.get(rel, [None])[:2] == stat:
+        return memo[rel][2]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_BLOCK), b""):
+            h.update(block)
+    digest = h.hexdigest()
+    if memo is not None:
+        memo[rel] = stat + [digest]
+    return digest
+
+
+def code_version(modules) -> dict:
+    """Digest of each module's source file (a code change invalidates the stages using it)."""
+    return {m.__name__: file_digest(m.__file__)[:16] for m in modules}
+
+
+def stage_key(inputs, params: dict, code: dict, memo: dict) -> tuple:
+    """Return (key, input digests) for a stage: its inputs' content, parameters and code version."""
+    digests = {}
+    for path in inputs:
+        for f in _files(path):
+            digests[_rel(f)] = file_digest(f, memo)
+    blob = json.dumps({"inputs": digests, "params": params, "code": code}, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest(), digests
+
+
+def _manifest_path(name: str) -> str:
+    return os.path.join(CACHE_DIR, f"{name}.json")
+
+
+def _outputs_intact(manifest: dict) -> bool:
+    for rel, stat in manifest.get("outputs", {}).items():
+        path = os.path.join(BASE_DIR, rel)
+        if not os.path.exists(path) or _stat(path) != stat:
+            return False
+    return bool(manifest.get("outputs"))
+
+
+def invalidate(names=None):
+    """Drop the manifests of `names` (all stages when None) so they run next time."""
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for fname in os.listdir(CACHE_DIR):
+        stage_name = fname[:-5] if fname.endswith(".json") else None
+        if stage_name and fname != os.path.basename(HASHES_PATH) and (names is None or stage_name in names):
+            os.remove(os.path.join(CACHE_DIR, fname))
+
+
+def run_cached(name: str, fn, inputs, outputs, params: dict, code: dict, force: bool = False) -> bool:
+    """Run `fn()` unless a previous run with the same key left its outputs untouched.
+
+    `inputs`/`outputs` are file or directory paths; missing outputs are simply
+    not recorded (optional files). Returns True when the stage ran.
+    """
+    memo = _load_json(HASHES_PATH, {})
+    key, digests = stage_key(inputs, params, code, memo)
+    manifest = _load_json(_manifest_path(name), {})
+
+    if not force and manifest.get("key") == key and _outputs_intact(manifest):
+        print(f"[cache] {name}: inputs, parameters and code unchanged; skipping "
+              f"(key {key[:12]}, built {manifest.get('created')})")
+        _write_json(HASHES_PATH, memo)
+        return False
+
+    fn()
+
+    recorded = {}
+    for path in outputs:
+        for f in _files(path):
+            recorded[_rel(f)] = _stat(f)
+    _write_json(_manifest_path(name), {
+        "stage": name,
+        "key": key,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "inputs": digests,
+        "params": params,
+        "code": code,
+        "outputs": recorded,
+    })
+    _write_json(HASHES_PATH, memo)
+    return True
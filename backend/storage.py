@@ -0,0 +1,258 @@
+import os
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional: fall back to the CSV store
+    pa = None
+    pq = None
+
+# CMS_PIPELINE_DIR relocates Data/ and outputs/ (e.g. to a scratch directory for benchmarks).
+BASE_DIR = os.environ.get("CMS_PIPELINE_DIR") or os.path.dirname(os.path.dirname(__file__))
+
+CLEAN_PARQUET_PATH = os.path.join(BASE_DIR, "Data", "healthcare_cleaned.parquet")
+CLEAN_CSV_PATH = os.path.join(BASE_DIR, "Data", "healthcare_cleaned.csv")
+
+# Low-cardinality text columns stored dictionary-encoded and loaded as pandas categoricals.
+CATEGORICAL_COLS = ["hcpcs_cd", "hcpcs_desc", "hcpcs_drug_ind", "rndrng_prvdr_type",
+                    "place_of_srvc", "place_of_srvc_label",
+                    "rndrng_prvdr_state_abrvtn", "rndrng_prvdr_city", "source_file"]
+
+# Count columns held as float32 when every value is a whole number below 2**24
+# (exact in float32, and written to CSV/JSON with the same text as float64).
+COUNT_COLS = ["tot_srvcs", "tot_benes"]
+_FLOAT32_EXACT = 2 ** 24
+
+
+def _use_parquet() -> bool:
+    return pq is not None and os.path.exists(CLEAN_PARQUET_PATH)
+
+
+def cleaned_path() -> str:
+    """Path of the cleaned store the next read will use."""
+    return CLEAN_PARQUET_PATH if _use_parquet() else CLEAN_CSV_PATH
+
+
+def _exact_in_float32(s: pd.Series) -> bool:
+    v = s.to_numpy(dtype=np.float64, na_value=np.nan)
+    return bool((np.isnan(v) | ((np.abs(v) < _FLOAT32_EXACT) & (v == np.floor(v)))).all())
+
+
+def _downcast_counts(s: pd.Series) -> pd.Series:
+    if s.dtype != np.float64:
+        return s
+    return s.astype(np.float32) if _exact_in_float32(s) else s
+
+
+def common_dtype(a, b):
+    """dtype one read of a whole column gets when one part of it reads as `a` and another as `b`."""
+    if a == b:
+        return a
+    if all(pd.api.types.is_numeric_dtype(t) and not pd.api.types.is_bool_dtype(t) for t in (a, b)):
+        return np.dtype(np.float64)
+    return pd.api.types.pandas_dtype("str")
+
+
+def compact_dtypes(df: pd.DataFrame, downcast: bool = True) -> pd.DataFrame:
+    """Dictionary-encode CATEGORICAL_COLS and (with `downcast`) shrink COUNT_COLS to float32.
+
+    Values are unchanged; only the in-memory representation is. Streaming
+    chunks skip `downcast`: CleanedWriter decides it over the whole column.
+    """
+    for c in CATEGORICAL_COLS:
+        if c in df.columns and not isinstance(df[c].dtype, pd.CategoricalDtype):
+            df[c] = df[c].astype("category")
+    if downcast:
+        for c in COUNT_COLS:
+            if c in df.columns:
+                df[c] = _downcast_counts(df[c])
+    return df
+
+
+def plain_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Undo compact_dtypes on a copy: categoricals back to their value dtype, float32 to float64.
+
+    Gives frames handed between stages in memory the dtypes a CSV read of them would have.
+    """
+    df = df.copy()
+    for c in df.columns:
+        if isinstance(df[c].dtype, pd.CategoricalDtype):
+            df[c] = df[c].astype(df[c].cat.categories.dtype)
+        elif df[c].dtype == np.float32:
+            df[c] = df[c].astype(np.float64)
+    return df
+
+
+def memory_mb(df: pd.DataFrame) -> float:
+    """Deep in-memory size of a frame (object strings included), in MiB."""
+    return df.memory_usage(deep=True, index=False).sum() / 2**20
+
+
+def _to_table(df: pd.DataFrame):
+    df = df.copy()
+    for c in CATEGORICAL_COLS:
+        if c in df.columns:
+            df[c] = df[c].astype("category")
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def write_cleaned(df: pd.DataFrame, export_csv: bool = False) -> str:
+    """Persist the cleaned frame; Parquet when pyarrow is available, CSV otherwise."""
+    if pq is None:
+        df.to_csv(CLEAN_CSV_PATH, index=False)
+        return CLEAN_CSV_PATH
+
+    table = _to_table(df)
+    pq.write_table(table, CLEAN_PARQUET_PATH, compression="snappy")
+
+    if export_csv:
+        df.to_csv(CLEAN_CSV_PATH, index=False)
+    return CLEAN_PARQUET_PATH
+
+
+class CleanedWriter:
+    """Append cleaned chunks to the store (one Parquet row group / CSV block per chunk).
+
+    Chunks may differ in dtype the way parts of one column do (int64 in one,
+    float64 with gaps in another) and each has its own categories. close()
+    rewrites the Parquet store, one row group at a time, with the dtypes
+    write_cleaned would have stored for the whole frame: each column's common
+    dtype, one sorted category list, and COUNT_COLS downcast when every value
+    allows it. `template` is then an empty frame with those dtypes (CSV-only
+    stores included).
+    """
+
+    def __init__(self, export_csv: bool = False):
+        self.export_csv = export_csv or pq is None
+        self.parquet = None
+        self.schema = None
+        self.csv_started = False
+        self.rows = 0
+        self.dtypes = {}
+        self.categories = {}
+        self.exact32 = {}
+        self.template = None
+
+    def _stable_schema(self, schema):
+        # Later chunks are cast to the first chunk's schema: widen dictionary
+        # indices (per-chunk categoricals pick int8/int16) and type all-null columns.
+        fields = []
+        for f in schema:
+            if pa.types.is_dictionary(f.type):
+                f = f.with_type(pa.dictionary(pa.int32(), pa.string()))
+            elif pa.types.is_null(f.type):
+                f = f.with_type(pa.string())
+            elif pa.types.is_integer(f.type):
+                # A later chunk may hold gaps; close() narrows back when none did.
+                f = f.with_type(pa.float64())
+            fields.append(f)
+        return pa.schema(fields, metadata=schema.metadata)
+
+    def _track(self, df: pd.DataFrame):
+        # Empty frames (schema templates, header-only files) only type columns
+        # nothing else has; the first rows replace what they guessed.
+        for c in df.columns:
+            s = df[c]
+            t = s.dtype
+            if isinstance(t, pd.CategoricalDtype):
+                self.categories.setdefault(c, set()).update(s.cat.categories)
+                t = t.categories.dtype
+            if c not in self.dtypes or (len(df) and not self.rows):
+                self.dtypes[c] = t
+            elif len(df):
+                self.dtypes[c] = common_dtype(self.dtypes[c], t)
+            if c in COUNT_COLS and pd.api.types.is_numeric_dtype(t):
+                self.exact32[c] = self.exact32.get(c, True) and _exact_in_float32(s)
+        self.rows += len(df)
+
+    def _final_dtypes(self) -> dict:
+        final = {}
+        for c, t in self.dtypes.items():
+            if c in self.categories:
+                t = pd.CategoricalDtype(pd.Index(sorted(self.categories[c]), dtype=t))
+            elif c in COUNT_COLS and t == np.float64 and self.exact32.get(c):
+                t = np.dtype(np.float32)
+            final[c] = t
+        return final
+
+    def _finalize(self, final: dict):
+        schema = _to_table(self.template).schema
+        tmp = CLEAN_PARQUET_PATH + ".tmp"
+        with pq.ParquetFile(CLEAN_PARQUET_PATH) as source, \
+                pq.ParquetWriter(tmp, schema, compression="snappy") as out:
+            for i in range(source.num_row_groups):
+                df = source.read_row_group(i).to_pandas().astype(final)
+                out.write_table(_to_table(df).cast(schema))
+        os.replace(tmp, CLEAN_PARQUET_PATH)
+
+    def write(self, df: pd.DataFrame):
+        self._track(df)
+        if pq is not None:
+            table = _to_table(df)
+            if self.parquet is None:
+                self.schema = self._stable_schema(table.schema)
+                self.parquet = pq.ParquetWriter(CLEAN_PARQUET_PATH, self.schema, compression="snappy")
+            self.parquet.write_table(table.cast(self.schema))
+        if self.export_csv:
+            df.to_csv(CLEAN_CSV_PATH, index=False, mode="a" if self.csv_started else "w", header=not self.csv_started)
+            self.csv_started = True
+
+    def close(self) -> str:
+        final = self._final_dtypes()
+        self.template = pd.DataFrame({c: pd.Series(dtype=t) for c, t in final.items()})
+        if self.parquet is not None:
+            self.parquet.close()
+            self._finalize(final)
+            return CLEAN_PARQUET_PATH
+        if pq is not None:
+            # No rows survived cleaning: still leave an (empty) store behind.
+            pd.DataFrame().to_parquet(CLEAN_PARQUET_PATH)
+            return CLEAN_PARQUET_PATH
+        return CLEAN_CSV_PATH
+
+
+def cleaned_columns() -> list:
+    """Column names of the cleaned store, without loading any data."""
+    if _use_parquet():
+        return list(pq.read_schema(CLEAN_PARQUET_PATH).names)
+    return list(pd.read_csv(CLEAN_CSV_PATH, nrows=0).columns)
+
+
+def peek_cleaned(n: int = 1000) -> pd.DataFrame:
+    """First n rows with their stored dtypes (for column-picking heuristics)."""
+    if _use_parquet():
+        batch = next(pq.ParquetFile(CLEAN_PARQUET_PATH).iter_batches(batch_size=n), None)
+        if batch is None:
+            return pq.read_schema(CLEAN_PARQUET_PATH).empty_table().to_pandas()
+        return batch.to_pandas()
+    return pd.read_csv(CLEAN_CSV_PATH, nrows=n)
+
+
+def read_cleaned(columns=None) -> pd.DataFrame:
+    """Load the cleaned data, projecting to `columns` (missing names are skipped)."""
+    available = cleaned_columns()
+    if columns is not None:
+        columns = [c for c in columns if c in available]
+    wanted = columns if columns is not None else available
+    cats = [c for c in CATEGORICAL_COLS if c in wanted]
+
+    if _use_parquet():
+        table = pq.read_table(CLEAN_PARQUET_PATH, columns=columns, memory_map=True, read_dictionary=cats)
+        return compact_dtypes(table.to_pandas())
+    return compact_dtypes(pd.read_csv(CLEAN_CSV_PATH, usecols=columns, low_memory=False,
+                                      dtype={c: "category" for c in cats}))
+
+
+def iter_cleaned(columns=None, batch_size: int = 500_000):
+    """Yield the cleaned data in batches of at most `batch_size` rows (same projection as read_cleaned)."""
+    available = cleaned_columns()
+    if columns is not None:
+        columns = [c for c in columns if c in available]
+
+    if _use_parquet():
+        for batch in pq.ParquetFile(CLEAN_PARQUET_PATH).iter_batches(batch_size=batch_size, columns=columns):
+            yield batch.to_pandas()
+        return
+    yield from pd.read_csv(CLEAN_CSV_PATH, usecols=columns, low_memory=False, chunksize=batch_size)
@@ -0,0 +1,94 @@
+import os
+import json
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# Background threads per OutputWriter; output files are few and large, so a handful is enough.
+WRITER_THREADS = 4
+
+
+@contextmanager
+def atomic_path(path: str):
+    """Yield a temp path next to `path`; it replaces `path` only once the block finishes.
+
+    Readers (the dashboard, the API server) see either the old file or the
+    complete new one, never a partial write.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def write_csv(df, path: str, **kwargs):
+    with atomic_path(path) as tmp:
+        df.to_csv(tmp, **kwargs)
+
+
+def write_json(obj, path: str, **kwargs):
+    with atomic_path(path) as tmp:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(obj, f, **kwargs)
+
+
+def write_text(text: str, path: str):
+    with atomic_path(path) as tmp:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+class OutputWriter:
+    """Thread pool for atomic output writes that overlap with the remaining compute.
+
+    Use as a context manager: leaving the block waits for every pending write
+    and re-raises the first failure. Submitted objects must not be mutated
+    afterwards.
+    """
+
+    def __init__(self, threads: int = WRITER_THREADS):
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="writer")
+        self._pending = []
+
+    def submit(self, fn, *args, **kwargs):
+        fut = self._pool.submit(fn, *args, **kwargs)
+        self._pending.append(fut)
+        return fut
+
+    def csv(self, df, path: str, **kwargs):
+        return self.submit(write_csv, df, path, **kwargs)
+
+    def json(self, obj, path: str, **kwargs):
+        return self.submit(write_json, obj, path, **kwargs)
+
+    def text(self, text: str, path: str):
+        return self.submit(write_text, text, path)
+
+    def wait(self):
+        """Block until every submitted write is done; raise the first error."""
+        pending, self._pending = self._pending, []
+        errors = [f.exception() for f in pending]
+        for err in errors:
+            if err is not None:
+                raise err
+
+    def close(self):
+        """wait(), then stop the threads."""
+        try:
+            self.wait()
+        finally:
+            self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._pool.shutdown(wait=True)
+        return False
@@ -0,0 +1,39 @@
+import sys
+import json
+import argparse
+
+
+def _index(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {(r["params"]["rows"], stage): stats
+            for r in data["results"] for stage, stats in r["stages"].items()}
+
+
+def compare(base_path: str, new_path: str, threshold: float = 0.10) -> list:
+    """Print per (rows, stage) wall-time and peak-RSS ratios; return the regressions."""
+    base = _index(base_path)
+    new = _index(new_path)
+    regressions = []
+    print(f"{'rows':>12} {'stage':8} {'wall base':>10} {'wall new':>10} {'ratio':>7} "
+          f"{'rss base':>9} {'rss new':>9} {'ratio':>7}")
+    for key in sorted(set(base) & set(new)):
+        b, n = base[key], new[key]
+        wall = n["wall_s_median"] / b["wall_s_median"] if b["wall_s_median"] else float("nan")
+        rss = n["peak_rss_mb_max"] / b["peak_rss_mb_max"] if b["peak_rss_mb_max"] else float("nan")
+        flag = ""
+        if wall > 1 + threshold or rss > 1 + threshold:
+            regressions.append({"rows": key[0], "stage": key[1], "wall_ratio": wall, "rss_ratio": rss})
+            flag = "  <-- regression"
+        print(f"{key[0]:>12,} {key[1]:8} {b['wall_s_median']:>10.2f} {n['wall_s_median']:>10.2f} {wall:>7.2f} "
+              f"{b['peak_rss_mb_max']:>9.0f} {n['peak_rss_mb_max']:>9.0f} {rss:>7.2f}{flag}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown / RSS growth (0.10 = 10%%)")
+    args = parser.parse_args()
+    sys.exit(1 if compare(args.base, args.new, args.threshold) else 0)
@@ -0,0 +1,170 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+# Raw header spellings, one per CMS release style; each normalizes onto an alias
+# in backend.schema.ALIASES (columns it does not rename keep the CMS name).
+VARIANTS = {
+    "cms": {
+        "npi": "Rndrng_NPI", "last_name": "Rndrng_Prvdr_Last_Org_Name", "first_name": "Rndrng_Prvdr_First_Name",
+        "city": "Rndrng_Prvdr_City", "state": "Rndrng_Prvdr_State_Abrvtn", "ptype": "Rndrng_Prvdr_Type",
+        "hcpcs": "HCPCS_Cd", "desc": "HCPCS_Desc", "drug": "HCPCS_Drug_Ind", "pos": "Place_Of_Srvc",
+        "benes": "Tot_Benes", "srvcs": "Tot_Srvcs",
+        "submitted": "Avg_Sbmtd_Chrg", "allowed": "Avg_Mdcr_Alowd_Amt",
+        "payment": "Avg_Mdcr_Pymt_Amt", "standardized": "Avg_Mdcr_Stdzd_Amt",
+    },
+    "legacy": {
+        "npi": "npi", "last_name": "Rndrng_Prvdr_Last_Org_Name", "first_name": "Rndrng_Prvdr_First_Name",
+        "city": "Rndrng_Prvdr_City", "state": "Rndrng_Prvdr_State_Abrvtn", "ptype": "provider_type",
+        "hcpcs": "hcpcs_code", "desc": "hcpcs_description", "drug": "hcpcs_drug_indicator",
+        "pos": "place_of_service", "benes": "bene_unique_cnt", "srvcs": "line_srvc_cnt",
+        "submitted": "average_submitted_charge_amount", "allowed": "average_medicare_allowed_amount",
+        "payment": "average_medicare_payment_amount", "standardized": "average_medicare_standardized_amount",
+    },
+    "spaced": {
+        "npi": "Rendering NPI", "last_name": "Rndrng Prvdr Last Org Name", "first_name": "Rndrng Prvdr First Name",
+        "city": "Rndrng Prvdr City", "state": "Rndrng Prvdr State Abrvtn", "ptype": "Provider Type",
+        "hcpcs": "HCPCS Code", "desc": "HCPCS Description", "drug": "Drug Ind", "pos": "Place of Service",
+        "benes": "Total Beneficiaries", "srvcs": "Total Services",
+        "submitted": "Average Submitted Charge Amount", "allowed": "Average Medicare Allowed Amount",
+        "payment": "Average Medicare Payment Amount", "standardized": "Average Medicare Standardized Amount",
+    },
+}
+
+MONEY_FIELDS = ["submitted", "allowed", "payment", "standardized"]
+
+STATES = ["CA", "TX", "FL", "NY", "PA", "IL", "OH", "GA", "NC", "MI", "NJ", "VA", "WA", "AZ", "MA",
+          "TN", "IN", "MO", "MD", "WI", "CO", "MN", "SC", "AL", "LA", "KY", "OR", "OK", "CT", "UT"]
+PROVIDER_TYPES = ["Internal Medicine", "Family Practice", "Cardiology", "Diagnostic Radiology",
+                  "Orthopedic Surgery", "Dermatology", "Ophthalmology", "Nurse Practitioner",
+                  "Physical Therapist in Private Practice", "Emergency Medicine", "Anesthesiology",
+                  "Clinical Laboratory", "Gastroenterology", "Neurology", "Urology"]
+
+
+def _catalog(n_hcpcs: int, skew: float, rng):
+    """HCPCS codes with Zipf-like row shares (share of rank r ~ r**-skew) and base prices."""
+    codes = np.array([f"J{i:04d}" if i % 7 == 0 else f"{10000 + i:05d}" for i in range(n_hcpcs)])
+    weights = np.arange(1, n_hcpcs + 1, dtype=np.float64) ** -skew
+    return {
+        "codes": codes,
+        "desc": np.array([f"Procedure {c}" for c in codes]),
+        "drug": np.where(np.char.startswith(codes, "J"), "Y", "N"),
+        "share": weights / weights.sum(),
+        "price": rng.lognormal(4.0, 1.1, n_hcpcs),
+    }
+
+
+def _providers(n_providers: int, rng):
+    return {
+        "npi": 1_000_000_000 + rng.choice(1_000_000_000, n_providers, replace=False),
+        "last_name": np.array([f"Provider{i}" for i in range(n_providers)]),
+        "first_name": rng.choice(np.array(["Ann", "Ben", "Carla", "Dev", "Elena", "Farid", "Gwen", "Hugo", ""]), n_providers),
+        "state": rng.choice(np.array(STATES), n_providers),
+        "city": np.array([f"City{i % 997}" for i in range(n_providers)]),
+        "ptype": rng.choice(np.array(PROVIDER_TYPES), n_providers),
+    }
+
+
+def _messy_money(values: np.ndarray, rng) -> np.ndarray:
+    """Render amounts the way damaged extracts do: $ and thousands separators,
+    accounting-style negatives, blanks and '*' suppression markers."""
+    out = np.array([f"${v:,.2f}" for v in values], dtype=object)
+    r = rng.random(len(values))
+    out[r < 0.10] = np.array([f"(${v:,.2f})" for v in values[r < 0.10]], dtype=object)
+    out[(r >= 0.10) & (r < 0.15)] = ""
+    out[(r >= 0.15) & (r < 0.20)] = "*"
+    out[(r >= 0.20) & (r < 0.25)] = np.array([f" {v:.2f} " for v in values[(r >= 0.20) & (r < 0.25)]], dtype=object)
+    return out
+
+
+def _chunk(n: int, catalog: dict, providers: dict, messy: float, outliers: float, rng) -> dict:
+    h = rng.choice(len(catalog["codes"]), n, p=catalog["share"])
+    p = rng.integers(0, len(providers["npi"]), n)
+    pos = np.where(rng.random(n) < 0.35, "F", "O")
+
+    payment = catalog["price"][h] * rng.lognormal(0.0, 0.35, n) * np.where(pos == "F", 0.8, 1.0)
+    spike = rng.random(n) < outliers
+    payment[spike] *= rng.uniform(4.0, 20.0, int(spike.sum()))
+    allowed = payment * rng.uniform(1.2, 1.35, n)
+    money = {
+        "payment": payment.round(2),
+        "allowed": allowed.round(2),
+        "standardized": (payment * rng.uniform(0.9, 1.1, n)).round(2),
+        "submitted": (allowed * rng.lognormal(1.0, 0.5, n)).round(2),
+    }
+    benes = rng.integers(11, 400, n)
+
+    cols = {
+        "npi": providers["npi"][p],
+        "last_name": providers["last_name"][p],
+        "first_name": providers["first_name"][p],
+        "city": providers["city"][p],
+        "state": providers["state"][p],
+        "ptype": providers["ptype"][p],
+        "hcpcs": catalog["codes"][h].astype(object),
+        "desc": catalog["desc"][h],
+        "drug": catalog["drug"][h],
+        "pos": pos.astype(object),
+        "benes": benes,
+        "srvcs": benes + rng.integers(0, 600, n),
+    }
+    for f in MONEY_FIELDS:
+        cols[f] = money[f].astype(object)
+
+    if messy > 0:
+        dirty = np.flatnonzero(rng.random(n) < messy)
+        for f in MONEY_FIELDS:
+            cols[f][dirty] = _messy_money(money[f][dirty], rng)
+        # Text noise the cleaner normalises: padding and lower-case codes.
+        cols["hcpcs"][dirty] = np.char.add(" ", np.char.lower(catalog["codes"][h[dirty]])).astype(object)
+        cols["pos"][dirty] = np.char.lower(pos[dirty].astype(str)).astype(object)
+    return cols
+
+
+def generate_raw(path: str, rows: int, n_hcpcs: int = 5000, skew: float = 1.1, messy: float = 0.02,
+                 duplicates: float = 0.005, outliers: float = 0.005, variant: str = "cms",
+                 seed: int = 0, chunk_rows: int = 1_000_000) -> str:
+    """Write a synthetic CMS-style raw CSV of `rows` rows, chunk by chunk (bounded memory).
+
+    `skew` shapes HCPCS group sizes (0 = uniform), `messy` is the share of rows
+    with dirty money/text values, `duplicates` the share of exact repeated rows
+    and `outliers` the share of inflated payments.
+    """
+    if variant not in VARIANTS:
+        raise ValueError(f"unknown variant {variant!r}; expected one of {sorted(VARIANTS)}")
+    names = VARIANTS[variant]
+    rng = np.random.default_rng(seed)
+    catalog = _catalog(n_hcpcs, skew, rng)
+    providers = _providers(max(1000, min(rows // 20, 1_000_000)), rng)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    written = 0
+    while written < rows:
+        n = min(chunk_rows, rows - written)
+        n_dup = int(n * duplicates)
+        cols = _chunk(n - n_dup, catalog, providers, messy, outliers, rng)
+        df = pd.DataFrame({names[k]: v for k, v in cols.items()})
+        if n_dup:
+            df = pd.concat([df, df.sample(n=n_dup, replace=True, random_state=int(rng.integers(1 << 31)))],
+                           ignore_index=True)
+        df.to_csv(path, index=False, mode="w" if written == 0 else "a", header=written == 0)
+        written += n
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic CMS Medicare raw CSV.")
+    parser.add_argument("out", help="output CSV path")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--hcpcs", type=int, default=5000, help="number of HCPCS codes")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of HCPCS group sizes")
+    parser.add_argument("--messy", type=float, default=0.02, help="share of rows with dirty values")
+    parser.add_argument("--duplicates", type=float, default=0.005)
+    parser.add_argument("--outliers", type=float, default=0.005)
+    parser.add_argument("--variant", choices=sorted(VARIANTS), default="cms")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate_raw(args.out, args.rows, n_hcpcs=args.hcpcs, skew=args.skew, messy=args.messy,
+                 duplicates=args.duplicates, outliers=args.outliers, variant=args.variant, seed=args.seed)
+    print("Wrote", args.out)
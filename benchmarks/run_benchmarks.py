@@ -0,0 +1,209 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+
+from benchmarks.generate_data import VARIANTS, generate_raw
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(REPO_DIR, "benchmarks", "results")
+
+# Stage name -> (module, function); each runs in its own process so peak RSS is per stage.
+STAGES = {
+    "clean": ("backend.cleaning", "clean_data"),
+    "analyze": ("backend.analysis", "analyze_and_detect"),
+    "export": ("backend.export_results", "export_for_dashboard"),
+}
+
+
+def _peak_rss_mb() -> float:
+    """Peak RSS of this process image. VmHWM resets on exec, unlike ru_maxrss,
+    which also carries the parent's peak across fork + exec."""
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_stage_inline(stage: str, kwargs: dict) -> dict:
+    """Child side: run one stage and report wall/CPU time and peak RSS as JSON."""
+    import importlib
+    module, func = STAGES[stage]
+    fn = getattr(importlib.import_module(module), func)
+
+    start = time.perf_counter()
+    cpu = time.process_time()
+    fn(**kwargs)
+    wall = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+
+    # Worker processes (analyze workers > 1) are reported separately; ru_maxrss is in KiB on Linux.
+    return {
+        "stage": stage,
+        "wall_s": round(wall, 4),
+        "cpu_s": round(cpu, 4),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "children_peak_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+
+
+def run_stage(stage: str, workdir: str, kwargs: dict) -> dict:
+    """Run a stage in a fresh interpreter with CMS_PIPELINE_DIR pointing at `workdir`."""
+    env = dict(os.environ, CMS_PIPELINE_DIR=workdir)
+    cmd = [sys.executable, "-m", "benchmarks.run_benchmarks", "--child", stage, json.dumps(kwargs)]
+    proc = subprocess.run(cmd, cwd=REPO_DIR, env=env, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"stage {stage} failed:\n{proc.stdout[-2000:]}\n{proc.stderr[-2000:]}")
+    # The result is the last stdout line; everything before it is the stage's own logging.
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               cwd=REPO_DIR, capture_output=True, text=True)
+        return {"commit": out.stdout.strip() or None, "dirty": bool(dirty.stdout.strip())}
+    except OSError:
+        return {"commit": None, "dirty": None}
+
+
+def _environment() -> dict:
+    import numpy as np
+    import pandas as pd
+    try:
+        import pyarrow
+        arrow = pyarrow.__version__
+    except ImportError:
+        arrow = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "pyarrow": arrow,
+    }
+
+
+def run_suite(rows: int, repeat: int = 1, stages=None, workdir: str = None, keep: bool = False,
+              gen_kwargs: dict = None, stage_kwargs: dict = None) -> dict:
+    """Generate (or reuse) a synthetic raw CSV and time every stage `repeat` times."""
+    stages = stages or list(STAGES)
+    gen_kwargs = gen_kwargs or {}
+    stage_kwargs = stage_kwargs or {}
+    own_dir = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix="cms_bench_")
+    raw_path = os.path.join(workdir, "Data", "healthcare_raw.csv")
+
+    try:
+        gen_s = None
+        if not os.path.exists(raw_path):
+            print(f"Generating {rows:,} rows -> {raw_path}")
+            t = time.perf_counter()
+            generate_raw(raw_path, rows, **gen_kwargs)
+            gen_s = round(time.perf_counter() - t, 2)
+
+        runs = []
+        for i in range(repeat):
+            for stage in stages:
+                res = run_stage(stage, workdir, stage_kwargs.get(stage, {}))
+                res["run"] = i
+                runs.append(res)
+                print(f"  [{i + 1}/{repeat}] {stage:8s} wall={res['wall_s']:.2f}s "
+                      f"cpu={res['cpu_s']:.2f}s peak_rss={res['peak_rss_mb']:.0f}MB")
+
+        summary = {}
+        for stage in stages:
+            r = [x for x in runs if x["stage"] == stage]
+            walls = sorted(x["wall_s"] for x in r)
+            summary[stage] = {
+                "wall_s_median": walls[len(walls) // 2],
+                "wall_s_min": walls[0],
+                "peak_rss_mb_max": max(x["peak_rss_mb"] for x in r),
+                "children_peak_rss_mb_max": max(x["children_peak_rss_mb"] for x in r),
+            }
+        return {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git": _git_commit(),
+            "environment": _environment(),
+            "params": {"rows": rows, "repeat": repeat, "stages": stages,
+                       "generator": gen_kwargs, "stage_kwargs": stage_kwargs},
+            "dataset": {"raw_bytes": os.path.getsize(raw_path), "generate_s": gen_s},
+            "stages": summary,
+            "runs": runs,
+        }
+    finally:
+        if own_dir and not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _parse_rows(text: str) -> int:
+    text = text.lower().replace("_", "")
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time clean/analyze/export on synthetic CMS data.")
+    parser.add_argument("--rows", default="1m", help="rows per dataset, e.g. 1m, 10m, 50m; comma-separated for several")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma-separated subset of " + ",".join(STAGES))
+    parser.add_argument("--hcpcs", type=int, default=5000)
+    parser.add_argument("--skew", type=float, default=1.1)
+    parser.add_argument("--messy", type=float, default=0.02)
+    parser.add_argument("--variant", choices=sorted(VARIANTS), default="cms")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunksize", type=int, default=None, help="pass chunksize to clean_data (streaming mode)")
+    parser.add_argument("--workers", type=int, default=1, help="pass workers to analyze_and_detect")
+    parser.add_argument("--workdir", default=None, help="reuse this directory (keeps the generated raw CSV)")
+    parser.add_argument("--out", default=None, help="results JSON path (default: benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--child", nargs=2, metavar=("STAGE", "KWARGS"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(_run_stage_inline(args.child[0], json.loads(args.child[1]))))
+        return
+
+    stages = [s for s in args.stages.split(",") if s]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {sorted(unknown)}")
+
+    gen_kwargs = {"n_hcpcs": args.hcpcs, "skew": args.skew, "messy": args.messy,
+                  "variant": args.variant, "seed": args.seed}
+    stage_kwargs = {}
+    if args.chunksize:
+        stage_kwargs["clean"] = {"chunksize": args.chunksize}
+    if args.workers > 1:
+        stage_kwargs["analyze"] = {"workers": args.workers}
+
+    results = []
+    for rows in [_parse_rows(r) for r in args.rows.split(",") if r]:
+        workdir = os.path.join(args.workdir, f"rows_{rows}") if args.workdir else None
+        results.append(run_suite(rows, args.repeat, stages, workdir, gen_kwargs=gen_kwargs,
+                                 stage_kwargs=stage_kwargs))
+
+    out = args.out
+    if out is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        commit = (results[0]["git"]["commit"] or "nogit")[:10]
+        out = os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit}.json")
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({"results": results}, f, indent=2)
+    print("Results:", out)
+
+
+if __name__ == "__main__":
+    main()
@@ -35,6 +35,97 @@ function pickKey(obj, candidates) {
   return null;
 }
 
+// Query API (python -m backend.api_server). Default caching lets the browser
+// revalidate with If-None-Match, so unchanged results come back as 304s.
+async function fetchApi(url) {
+  const r = await fetch(url);
+  if (!r.ok) throw new Error(`HTTP ${r.status} when fetching ${url}`);
+  return r.json();
+}
+
+async function fetchNdjson(url) {
+  const r = await fetch(url, { cache: "no-store" });
+  if (!r.ok) throw new Error(`HTTP ${r.status} when fetching ${url}`);
+  const text = await r.text();
+  return text.split("\n").filter((line) => line.trim() !== "").map((line) => JSON.parse(line));
+}
+
+function base64Bytes(s) {
+  const bin = atob(s);
+  const out = new Uint8Array(bin.length);
+  for (let i = 0; i < bin.length; i++) out[i] = bin.charCodeAt(i);
+  return out;
+}
+
+// Facet index (anomaly_pages/facet_index.json): for every facet value, the row ids
+// (positions in the paged export) as a uint32 list or a bitmap, plus the row count.
+function decodeFacetIndex(raw) {
+  const facets = {};
+  for (const [name, f] of Object.entries(raw?.facets || {})) {
+    facets[name] = {
+      column: f.column,
+      values: f.values.map((v) => ({
+        value: v.value,
+        count: v.count,
+        ids: v.ids !== undefined ? new Uint32Array(base64Bytes(v.ids).buffer) : null,
+        bits: v.bitmap !== undefined ? base64Bytes(v.bitmap) : null,
+      })),
+    };
+  }
+  return facets;
+}
+
+function postingIds(p) {
+  if (p.ids) return p.ids;
+  const ids = new Uint32Array(p.count);
+  let k = 0;
+  for (let i = 0; i < p.bits.length; i++) {
+    for (let b = p.bits[i], j = 0; b; b >>= 1, j++) if (b & 1) ids[k++] = i * 8 + j;
+  }
+  return ids;
+}
+
+function postingHas(p, row) {
+  if (p.bits) return ((p.bits[row >> 3] >> (row & 7)) & 1) === 1;
+  let lo = 0;
+  let hi = p.ids.length;
+  while (lo < hi) {
+    const mid = (lo + hi) >> 1;
+    if (p.ids[mid] < row) lo = mid + 1;
+    else hi = mid;
+  }
+  return lo < p.ids.length && p.ids[lo] === row;
+}
+
+function facetPosting(facet, value, prefix) {
+  let hits = facet.values.filter((v) => v.value === value);
+  if (!hits.length && prefix) hits = facet.values.filter((v) => v.value.toUpperCase().startsWith(value));
+  if (hits.length === 1) return hits[0];
+  const ids = new Uint32Array(hits.reduce((n, v) => n + v.count, 0));
+  let k = 0;
+  for (const v of hits) {
+    ids.set(postingIds(v), k);
+    k += v.count;
+  }
+  return { count: ids.length, ids: ids.sort(), bits: null };
+}
+
+// Rows (ids < loaded) matching every filter: walk the smallest posting, probe the others.
+function queryFacetIndex(facets, filters, loaded) {
+  const postings = filters
+    .filter(([name]) => facets[name])
+    .map(([name, value]) => facetPosting(facets[name], value, name === "method"))
+    .sort((a, b) => a.count - b.count);
+  if (!postings.length) return null;
+  const [first, ...rest] = postings;
+  const out = [];
+  for (const row of postingIds(first)) {
+    if (row >= loaded) break;
+    if (rest.every((p) => postingHas(p, row))) out.push(row);
+  }
+  return out;
+}
+
 function uniqueValues(rows, key) {
   if (!key) return [];
   const set = new Set();
@@ -49,6 +140,13 @@ export default function App() {
   const [tab, setTab] = useState("overview");
   const [summary, setSummary] = useState(null);
   const [anoms, setAnoms] = useState([]);
+  const [manifest, setManifest] = useState(null);
+  const [pagesLoaded, setPagesLoaded] = useState(0);
+  const [pageLoading, setPageLoading] = useState(false);
+  const [api, setApi] = useState(false);
+  const [facets, setFacets] = useState(null);
+  const [facetIndex, setFacetIndex] = useState(null);
+  const [total, setTotal] = useState(0);
   const [groups, setGroups] = useState(null);
   const [loading, setLoading] = useState(true);
   const [err, setErr] = useState("");
@@ -85,12 +183,37 @@ useEffect(() => {
       setLoading(true);
       setErr("");
 
-      const [s, a, g] = await Promise.all([
+      // Prefer the local query API: rows are then filtered/sorted/paged server-side.
+      const apiSummary = await fetchApi("/api/summary").catch(() => null);
+      if (apiSummary) {
+        setApi(true);
+        setSummary(apiSummary);
+        setGroups(await fetchApi("/api/top_groups").catch(() => null));
+        return;
+      }
+
+      const [s, m, g] = await Promise.all([
         fetchJson("/summary.json"),
-        fetchJson("/anomalies.json"),
+        fetchJson("/anomaly_pages/manifest.json").catch(() => null),
         fetchJson("/top_groups.json").catch(() => null),
       ]);
 
+      // Paged export: load the first (most expensive) page now, the rest on demand.
+      // Older exports without a manifest fall back to the single anomalies.json.
+      let a;
+      if (m && Array.isArray(m.pages)) {
+        const [first, fi] = await Promise.all([
+          m.pages.length ? fetchNdjson(`/anomaly_pages/${m.pages[0].file}`) : [],
+          m.facet_index ? fetchJson(`/anomaly_pages/${m.facet_index}`).catch(() => null) : null,
+        ]);
+        a = first;
+        setManifest(m);
+        setPagesLoaded(m.pages.length ? 1 : 0);
+        if (fi) setFacetIndex(decodeFacetIndex(fi));
+      } else {
+        a = await fetchJson("/anomalies.json");
+      }
+
       setSummary(s);
       setAnoms(Array.isArray(a) ? a : []);
       setGroups(g);
@@ -106,6 +229,48 @@ useEffect(() => {
 }, []);
 
 
+  useEffect(() => {
+    if (!api) return;
+    const filters = new URLSearchParams();
+    if (method !== "ALL") filters.set("method", method);
+    if (stateFilter !== "ALL") filters.set("state", stateFilter);
+    if (providerType !== "ALL") filters.set("provider_type", providerType);
+    if (posFilter !== "ALL") filters.set("pos", posFilter);
+    const page = new URLSearchParams(filters);
+    page.set("limit", String(limit));
+
+    let cancelled = false;
+    Promise.all([fetchApi(`/api/anomalies?${page}`), fetchApi(`/api/facets?${filters}`)])
+      .then(([res, f]) => {
+        if (cancelled) return;
+        setAnoms(res.rows || []);
+        setTotal(res.total ?? 0);
+        setFacets(f);
+      })
+      .catch((e) => {
+        console.error(e);
+        if (!cancelled) setErr(String(e.message || e));
+      });
+    return () => {
+      cancelled = true;
+    };
+  }, [api, method, stateFilter, providerType, posFilter, limit]);
+
+  async function loadNextPage() {
+    if (!manifest || pagesLoaded >= manifest.pages.length) return;
+    try {
+      setPageLoading(true);
+      const rows = await fetchNdjson(`/anomaly_pages/${manifest.pages[pagesLoaded].file}`);
+      setAnoms((prev) => prev.concat(rows));
+      setPagesLoaded((n) => n + 1);
+    } catch (e) {
+      console.error(e);
+      setErr(String(e.message || e));
+    } finally {
+      setPageLoading(false);
+    }
+  }
+
   const costKey = useMemo(() => {
     
     if (summary?.cost_column) return summary.cost_column;
@@ -120,44 +285,74 @@ useEffect(() => {
     ]) || "price_amt";
   }, [summary, anoms]);
 
+  // Record keys resolved by the export (summary.column_roles); probing the first row is the fallback.
+  const roles = summary?.column_roles;
+
   const methodKey = useMemo(() => {
-    return pickKey(anoms?.[0], ["anomaly_method", "method", "flag"]) || "anomaly_method";
-  }, [anoms]);
+    return roles?.method ?? (pickKey(anoms?.[0], ["anomaly_method", "method", "flag"]) || "anomaly_method");
+  }, [roles, anoms]);
 
  
   const stateKey = useMemo(
-    () => pickKey(anoms?.[0], ["rndrng_prvdr_state_abrvtn", "state", "provider_state"]),
-    [anoms]
+    () => (api
+      ? facets?.state?.column ?? null
+      : roles?.state ?? pickKey(anoms?.[0], ["rndrng_prvdr_state_abrvtn", "state", "provider_state"])),
+    [api, facets, roles, anoms]
   );
   const providerTypeKey = useMemo(
-    () => pickKey(anoms?.[0], ["rndrng_prvdr_type", "provider_type"]),
-    [anoms]
+    () => (api
+      ? facets?.provider_type?.column ?? null
+      : roles?.provider_type ?? pickKey(anoms?.[0], ["rndrng_prvdr_type", "provider_type"])),
+    [api, facets, roles, anoms]
   );
   const posKey = useMemo(
-    () => pickKey(anoms?.[0], ["place_of_srvc_label", "place_of_srvc", "pos", "place_of_service"]),
-    [anoms]
+    () => (api
+      ? facets?.pos?.column ?? null
+      : roles?.pos ?? pickKey(anoms?.[0], ["place_of_srvc_label", "place_of_srvc", "pos", "place_of_service"])),
+    [api, facets, roles, anoms]
   );
   const hcpcsKey = useMemo(
-    () => pickKey(anoms?.[0], ["hcpcs_cd", "hcpcs_code"]),
-    [anoms]
+    () => roles?.hcpcs ?? pickKey(anoms?.[0], ["hcpcs_cd", "hcpcs_code"]),
+    [roles, anoms]
   );
   const hcpcsDescKey = useMemo(
-    () => pickKey(anoms?.[0], ["hcpcs_desc", "hcpcs_description"]),
-    [anoms]
+    () => roles?.hcpcs_desc ?? pickKey(anoms?.[0], ["hcpcs_desc", "hcpcs_description"]),
+    [roles, anoms]
   );
   const npiKey = useMemo(
-    () => pickKey(anoms?.[0], ["rndrng_npi", "npi"]),
-    [anoms]
+    () => roles?.npi ?? pickKey(anoms?.[0], ["rndrng_npi", "npi"]),
+    [roles, anoms]
   );
 
-  const stateOptions = useMemo(() => uniqueValues(anoms, stateKey), [anoms, stateKey]);
+  // Option lists come from the API facets or the exported facet index when available.
+  const facetSource = api ? facets : facetIndex;
+  const facetValues = (name) => (facetSource?.[name]?.values ?? []).map((v) => v.value);
+
+  const stateOptions = useMemo(
+    () => (facetSource?.state ? facetValues("state") : uniqueValues(anoms, stateKey)),
+    [facetSource, anoms, stateKey]
+  );
   const providerTypeOptions = useMemo(
-    () => uniqueValues(anoms, providerTypeKey),
-    [anoms, providerTypeKey]
+    () => (facetSource?.provider_type ? facetValues("provider_type") : uniqueValues(anoms, providerTypeKey)),
+    [facetSource, anoms, providerTypeKey]
+  );
+  const posOptions = useMemo(
+    () => (facetSource?.pos ? facetValues("pos") : uniqueValues(anoms, posKey)),
+    [facetSource, anoms, posKey]
   );
-  const posOptions = useMemo(() => uniqueValues(anoms, posKey), [anoms, posKey]);
 
   const filtered = useMemo(() => {
+    // The API already returns the filtered, cost-sorted page.
+    if (api) return anoms;
+
+    // Paged export + facet index: rows are already cost-sorted, filters are posting intersections.
+    if (facetIndex) {
+      const active = [["method", method], ["state", stateFilter], ["provider_type", providerType], ["pos", posFilter]]
+        .filter(([, v]) => v !== "ALL");
+      const ids = queryFacetIndex(facetIndex, active, anoms.length);
+      return ids ? ids.map((i) => anoms[i]) : anoms;
+    }
+
     let rows = [...anoms];
 
     if (method !== "ALL") {
@@ -176,7 +371,7 @@ useEffect(() => {
     // sort by cost desc
     rows.sort((a, b) => (safeNumber(b?.[costKey]) ?? -1) - (safeNumber(a?.[costKey]) ?? -1));
     return rows;
-  }, [anoms, method, methodKey, stateKey, stateFilter, providerTypeKey, providerType, posKey, posFilter, costKey]);
+  }, [api, facetIndex, anoms, method, methodKey, stateKey, stateFilter, providerTypeKey, providerType, posKey, posFilter, costKey]);
 
   const chartData = useMemo(() => {
     const rows = filtered.slice(0, limit);
@@ -359,7 +554,17 @@ useEffect(() => {
                 Top {limit} Anomalies ({tab === "iqr" ? "IQR Focus" : "Z-score Focus"}) — sorted by <code>{costKey}</code>
               </h2>
               <div className="sectionMeta">
-                Current filtered rows: <b>{fmt(filtered.length)}</b>
+                Current filtered rows: <b>{fmt(api ? total : filtered.length)}</b>
+                {manifest && (
+                  <>
+                    {" "}· loaded <b>{fmt(anoms.length)}</b> of <b>{fmt(manifest.total_rows)}</b>{" "}
+                    {pagesLoaded < manifest.pages.length && (
+                      <button className="tab" onClick={loadNextPage} disabled={pageLoading}>
+                        {pageLoading ? "Loading…" : "Load more"}
+                      </button>
+                    )}
+                  </>
+                )}
               </div>
             </div>
 
@@ -465,7 +670,7 @@ useEffect(() => {
 
       <footer className="footer">
         <div>
-          <b>Tip:</b> Every time you re-run <code>python main.py</code>, copy the JSON files again to <code>frontend/public</code> and refresh the page.
+          <b>Tip:</b> Every time you re-run <code>python main.py</code>, copy the JSON files (and the <code>anomaly_pages</code> folder) again to <code>frontend/public</code> and refresh the page.
         </div>
       </footer>
     </div>
@@ -1,23 +1,189 @@
 # main.py
+import argparse
+
+from backend import (
+    analysis, cleaning, export_results, facet_index, instrument, json_records, parsing, partitioned, providers,
+    schema, sketch, storage, writers,
+)
 from backend.cleaning import clean_data
 from backend.analysis import analyze_and_detect
 from backend.export_results import export_for_dashboard
+from backend.partitioned import analyze_out_of_core
+from backend.providers import rollup_providers
+from backend.instrument import finish_run, start_run
+from backend.stage_cache import code_version, invalidate, run_cached
+
+STAGES = ("clean", "analyze", "providers", "export")
+
+
+def _force_set(force) -> set:
+    if force is True:
+        return set(STAGES)
+    return set(force or ())
+
+
+def run_all(export_csv=False, chunksize=None, workers=1, incremental=False,
+            quantile_method="exact", sketch_alpha=0.01, compare_quantiles=False, profile=None,
+            cache=True, force=False, groupings=None, detectors=None, in_process=False,
+            json_indent=export_results.JSON_INDENT, out_of_core=False, partitions=partitioned.PARTITIONS,
+            top_n=analysis.TOP_N, raw=None):
+    # profile: "cprofile", "tracemalloc" or "all"; defaults to the CMS_PROFILE env variable.
+    # force: True reruns every stage, or a list of stage names to rerun; cache=False ignores the cache.
+    # groupings: baseline keys such as ["hcpcs_cd,place_of_srvc", "hcpcs_cd"] (default: per HCPCS code).
+    # detectors: scoring methods from analysis.DETECTORS, e.g. ["iqr", "zscore", "mad"].
+    # in_process: pass the cleaned frame and anomaly frames straight to the next stages
+    # (files are still written); a stage skipped by the cache leaves the next one reading files.
+    # json_indent: indentation of anomalies.json/top_groups.json (None: compact).
+    # out_of_core: analyze `partitions` hash partitions of hcpcs_cd one at a time instead of the
+    # whole cleaned frame (default grouping only; no incremental or quantile comparison).
+    # top_n: rows per top-group table (top_<detector>_groups*.csv and top_groups.json).
+    # raw: raw CSV file, directory or glob (default cleaning.RAW_PATH); several files are cleaned
+    # `workers` at a time and tagged with source_file/year.
+    groupings = analysis.parse_groupings(groupings or analysis.DEFAULT_GROUPINGS)
+    detectors = list(detectors or analysis.DEFAULT_DETECTORS)
+    force = _force_set(force) if cache else set(STAGES)
+    unknown = force - set(STAGES)
+    if unknown:
+        raise ValueError(f"unknown stages {sorted(unknown)}; expected {STAGES}")
+    if out_of_core and (incremental or compare_quantiles):
+        raise ValueError("out_of_core cannot be combined with incremental or compare_quantiles")
+
+    handoff = {}
+
+    def _clean():
+        cleaned = clean_data(export_csv=export_csv, chunksize=chunksize, return_frame=in_process, raw=raw,
+                             workers=workers)
+        if in_process:
+            handoff["cleaned"] = cleaned
 
-def run_all():
-    print("== Step 1: Cleaning ==")
-    clean_data()
+    def _analyze():
+        if out_of_core:
+            analyze_out_of_core(partitions=partitions, workers=workers, quantile_method=quantile_method,
+                                sketch_alpha=sketch_alpha, groupings=groupings, detectors=detectors, top_n=top_n)
+            return
+        result = analyze_and_detect(workers=workers, incremental=incremental, quantile_method=quantile_method,
+                                    sketch_alpha=sketch_alpha, compare_quantiles=compare_quantiles,
+                                    groupings=groupings, detectors=detectors, cleaned=handoff.get("cleaned"),
+                                    top_n=top_n)
+        if in_process:
+            handoff["analysis"] = result
 
-    print("\n== Step 2: Analysis + Anomalies ==")
-    analyze_and_detect()
+    start_run(profile)
+    try:
+        print("== Step 1: Cleaning ==")
+        run_cached(
+            "clean", _clean,
+            inputs=cleaning.raw_files(raw),
+            outputs=[storage.CLEAN_PARQUET_PATH, storage.CLEAN_CSV_PATH, schema.SCHEMA_PATH,
+                     cleaning.CLEAN_REPORT_PATH],
+            params={"export_csv": export_csv, "chunksize": chunksize, "raw": raw},
+            code=code_version([cleaning, instrument, parsing, schema, storage, writers]),
+            force="clean" in force,
+        )
 
-    print("\n== Step 3: Export for React Dashboard ==")
-    export_for_dashboard()
+        print("\n== Step 2: Analysis + Anomalies ==")
+        # workers and out_of_core change how the outputs are computed, not what they are; incremental
+        # also decides whether group_state.csv is kept for the next run, so it is part of the key.
+        run_cached(
+            "analyze", _analyze,
+            inputs=[storage.cleaned_path()],
+            outputs=[analysis.ANOM_DIR, analysis.TABLES_DIR, analysis.SUMMARY_PATH, analysis.QUANTILE_CHECK_PATH],
+            params={"quantile_method": quantile_method, "sketch_alpha": sketch_alpha,
+                    "compare_quantiles": compare_quantiles, "min_group_size": analysis.MIN_GROUP_SIZE,
+                    "z_threshold": analysis.Z_THRESHOLD, "iqr_multiplier": analysis.IQR_MULTIPLIER,
+                    "groupings": [list(g) for g in groupings], "detectors": detectors,
+                    "mad_threshold": analysis.MAD_THRESHOLD, "top_n": top_n, "incremental": incremental},
+            code=code_version([analysis, instrument, partitioned, schema, sketch, storage, writers]),
+            force="analyze" in force,
+        )
+
+        print("\n== Step 3: Provider rollup ==")
+        run_cached(
+            "providers", lambda: rollup_providers(anomalies=(handoff.get("analysis") or {}).get("anomalies")),
+            inputs=list(providers.anomaly_paths().values()),
+            outputs=[providers.TOP_PROVIDERS_CSV, providers.TOP_PROVIDERS_JSON],
+            params={"top_k": providers.TOP_K},
+            code=code_version([providers, analysis, instrument, storage, writers]),
+            force="providers" in force,
+        )
+
+        print("\n== Step 4: Export for React Dashboard ==")
+        run_cached(
+            "export", lambda: export_for_dashboard(quantile_method=quantile_method, sketch_alpha=sketch_alpha,
+                                                   cleaned=handoff.get("cleaned"), analysis=handoff.get("analysis"),
+                                                   json_indent=json_indent),
+            inputs=[storage.cleaned_path(), export_results.ANOM_IQR_PATH, export_results.ANOM_Z_PATH,
+                    export_results.TOP_IQR_GROUPS, export_results.TOP_Z_GROUPS,
+                    *export_results.EXTRA_ANOM_PATHS.values(), *export_results.EXTRA_TOP_GROUPS.values(),
+                    *export_results.TOP_GROUP_SPLITS.values()],
+            outputs=[export_results.SUMMARY_JSON, export_results.ANOM_JSON, export_results.TOP_GROUPS_JSON,
+                     export_results.PAGES_DIR],
+            params={"quantile_method": quantile_method, "sketch_alpha": sketch_alpha, "json_indent": json_indent},
+            code=code_version([export_results, facet_index, instrument, json_records, schema, sketch, storage,
+                               writers]),
+            force="export" in force,
+        )
+    finally:
+        finish_run()
 
     print("\n All steps completed. Check:")
-    print("- Data/healthcare_cleaned.csv")
-    print("- outputs/report/")
+    print("- Data/healthcare_cleaned.parquet" + (" (+ .csv export)" if export_csv else ""))
+    print("- outputs/report/ (timings.json: per-stage time, rows and memory)")
     print("- outputs/anomalies/")
-    print("- outputs/ (anomalies.json, summary.json, top_groups.json)")
+    print("- outputs/tables/top_providers.csv")
+    print("- outputs/ (anomalies.json, summary.json, top_groups.json, top_providers.json)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Clean, analyze and export the CMS Medicare data.")
+    parser.add_argument("--force", nargs="*", choices=STAGES, metavar="STAGE", default=None,
+                        help="rerun these stages even if cached (no names: all stages)")
+    parser.add_argument("--invalidate", nargs="+", choices=STAGES, metavar="STAGE", default=None,
+                        help="drop the cache entries of these stages and exit")
+    parser.add_argument("--no-cache", action="store_true", help="run every stage without consulting the cache")
+    parser.add_argument("--export-csv", action="store_true", help="also write Data/healthcare_cleaned.csv")
+    parser.add_argument("--chunksize", type=int, default=None, help="stream the raw CSV in chunks of this many rows")
+    parser.add_argument("--raw", default=None, metavar="PATH",
+                        help="raw CSV file, directory or glob, compressed files included (default: %s)"
+                             % cleaning.RAW_PATH)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes for per-file cleaning, analysis shards and out-of-core partitions")
+    parser.add_argument("--incremental", action="store_true")
+    parser.add_argument("--quantile-method", choices=("exact", "sketch"), default="exact")
+    parser.add_argument("--sketch-alpha", type=float, default=0.01)
+    parser.add_argument("--compare-quantiles", action="store_true")
+    parser.add_argument("--grouping", action="append", default=None, metavar="COLS",
+                        help="baseline key, e.g. hcpcs,pos or hcpcs,state,provider_type; repeat for several "
+                             "(the first writes the standard outputs)")
+    parser.add_argument("--detector", action="append", default=None, choices=tuple(analysis.DETECTORS),
+                        help="scoring method; repeat for several (default: iqr and zscore)")
+    parser.add_argument("--in-process", action="store_true",
+                        help="hand frames from stage to stage in memory instead of re-reading their files")
+    parser.add_argument("--json-indent", type=int, default=export_results.JSON_INDENT,
+                        help="indent anomalies.json/top_groups.json (default: compact)")
+    parser.add_argument("--out-of-core", action="store_true",
+                        help="analyze hash partitions of hcpcs_cd spilled to disk instead of the whole dataset in RAM")
+    parser.add_argument("--partitions", type=int, default=partitioned.PARTITIONS,
+                        help="number of spill partitions for --out-of-core")
+    parser.add_argument("--top-n", type=int, default=analysis.TOP_N,
+                        help="rows per top-group table (default: %(default)s)")
+    parser.add_argument("--profile", default=None, help="cprofile, tracemalloc or all (default: $CMS_PROFILE)")
+    args = parser.parse_args(argv)
+
+    if args.invalidate:
+        invalidate(args.invalidate)
+        print("Invalidated:", ", ".join(args.invalidate))
+        return
+
+    run_all(export_csv=args.export_csv, chunksize=args.chunksize, workers=args.workers,
+            incremental=args.incremental, quantile_method=args.quantile_method,
+            sketch_alpha=args.sketch_alpha, compare_quantiles=args.compare_quantiles,
+            profile=args.profile, cache=not args.no_cache, groupings=args.grouping,
+            detectors=args.detector, in_process=args.in_process,
+            json_indent=args.json_indent, out_of_core=args.out_of_core, partitions=args.partitions,
+            top_n=args.top_n, raw=args.raw,
+            force=True if args.force == [] else (args.force or False))
+
 
 if __name__ == "__main__":
-    run_all()
+    main()
@@ -0,0 +1,41 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# backend/ modules resolve their data and output folders at import time:
+# point them at a scratch directory before any test imports them.
+os.environ["CMS_PIPELINE_DIR"] = tempfile.mkdtemp(prefix="cms-pipeline-tests-")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="module")
+def cleaned_sample():
+    """A generated raw extract cleaned into the store (once per test module)."""
+    from backend import cleaning
+    from benchmarks.generate_data import generate_raw
+
+    os.makedirs(os.path.dirname(cleaning.RAW_PATH), exist_ok=True)
+    # Skewed group sizes leave some codes under MIN_GROUP_SIZE; messy values and outliers exercise every detector.
+    generate_raw(cleaning.RAW_PATH, rows=30_000, n_hcpcs=400, skew=1.1, messy=0.02, outliers=0.01, seed=4)
+    cleaning.clean_data()
+
+
+@pytest.fixture(scope="session")
+def analysis_outputs():
+    """Callable returning the bytes of every anomaly table, top-group table and the analysis summary."""
+    from backend import analysis
+
+    def read():
+        out = {}
+        for folder in (analysis.ANOM_DIR, analysis.TABLES_DIR):
+            for name in sorted(os.listdir(folder)):
+                if name.endswith(".csv") and name != os.path.basename(analysis.STATE_PATH):
+                    with open(os.path.join(folder, name), "rb") as f:
+                        out[name] = f.read()
+        with open(analysis.SUMMARY_PATH, "rb") as f:
+            out["summary"] = f.read()
+        return out
+
+    return read
@@ -0,0 +1,67 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend import analysis, storage
+from backend.analysis import MAD_THRESHOLD, MIN_GROUP_SIZE, Z_THRESHOLD, analyze_and_detect
+
+ROBUST = ["mad", "log_zscore"]
+METRICS = ["avg_mdcr_pymt_amt", "submitted_to_payment_ratio"]
+
+
+@pytest.fixture(scope="module")
+def all_detectors(cleaned_sample, analysis_outputs):
+    analyze_and_detect(detectors=list(analysis.DETECTORS))
+    return analysis_outputs()
+
+
+def test_default_detectors_unchanged(all_detectors, analysis_outputs):
+    analyze_and_detect()
+    default = analysis_outputs()
+    for name, data in default.items():
+        if name != "summary":  # the summary counts every detector
+            assert all_detectors[name] == data, name
+
+
+@pytest.mark.parametrize("detector", ROBUST)
+def test_detector_alone_matches_shared_pass(all_detectors, analysis_outputs, detector):
+    analyze_and_detect(detectors=[detector])
+    alone = analysis_outputs()
+    produced = [n for n in alone if n != "summary"]
+    assert produced and all(detector in n for n in produced)
+    for name in produced:
+        assert alone[name] == all_detectors[name], name
+    assert len(alone[f"anomalies_{detector}.csv"]) > 1000
+
+
+def _reference(df: pd.DataFrame, detector: str, metric: str) -> pd.Series:
+    """Per-HCPCS scores of the flagged rows, straight from pandas groupby."""
+    x = df[metric] if detector == "mad" else np.log1p(df[metric])
+    g = x.groupby(df["hcpcs_cd"], observed=True)
+    scored = (df.groupby("hcpcs_cd", observed=True)[metric].transform("size") >= MIN_GROUP_SIZE) & \
+             (g.transform("count") >= MIN_GROUP_SIZE)
+    if detector == "mad":
+        median = g.transform("median")
+        mad = (x - median).abs().groupby(df["hcpcs_cd"], observed=True).transform("median")
+        z, threshold = 0.6745 * (x - median) / mad.where(mad > 0), MAD_THRESHOLD
+    else:
+        std = g.transform(lambda s: s.std(ddof=0))
+        z, threshold = (x - g.transform("mean")) / std.where(std > 0), Z_THRESHOLD
+    return z[scored & (z > threshold)]
+
+
+@pytest.mark.parametrize("detector", ROBUST)
+def test_scores_match_pandas_reference(all_detectors, detector):
+    df = storage.read_cleaned(columns=["hcpcs_cd", *METRICS])
+    got = pd.read_csv(io.BytesIO(all_detectors[f"anomalies_{detector}.csv"]), dtype={"hcpcs_cd": str})
+    assert set(got["anomaly_method"]) == {analysis.DETECTORS[detector]["label"]}
+    score = "modified_z_score" if detector == "mad" else "log_z_score"
+    for metric in METRICS:
+        expected = _reference(df, detector, metric)
+        rows = got[got["anomaly_metric"] == metric]
+        assert len(rows) == len(expected) > 0
+        assert (rows["hcpcs_cd"].value_counts().to_dict()
+                == df.loc[expected.index, "hcpcs_cd"].astype(str).value_counts().to_dict())
+        np.testing.assert_allclose(np.sort(rows[score].to_numpy()), np.sort(expected.to_numpy()), rtol=1e-9)
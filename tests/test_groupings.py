@@ -0,0 +1,69 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend import storage
+from backend.analysis import MIN_GROUP_SIZE, Z_THRESHOLD, analyze_and_detect
+
+COMPOSITES = [("hcpcs_cd", "place_of_srvc"), ("hcpcs_cd", "rndrng_prvdr_state_abrvtn")]
+METRICS = ["avg_mdcr_pymt_amt", "submitted_to_payment_ratio"]
+
+
+def _suffix(grouping) -> str:
+    return "_by_" + "__".join(grouping)
+
+
+@pytest.fixture(scope="module")
+def together(cleaned_sample, analysis_outputs):
+    """Outputs of one run scoring the default grouping and both composites."""
+    analyze_and_detect(groupings=[("hcpcs_cd",), *COMPOSITES])
+    return analysis_outputs()
+
+
+def test_primary_outputs_unchanged(together, analysis_outputs):
+    analyze_and_detect()
+    alone = analysis_outputs()
+    for name, data in alone.items():
+        if name != "summary":  # the summary lists every grouping
+            assert together[name] == data, name
+
+
+@pytest.mark.parametrize("grouping", COMPOSITES)
+def test_composite_matches_its_own_run(together, analysis_outputs, grouping):
+    analyze_and_detect(groupings=[grouping])
+    alone = analysis_outputs()
+    for name in ("anomalies_iqr", "anomalies_zscore", "top_iqr_groups", "top_zscore_groups"):
+        assert alone[f"{name}.csv"] == together[f"{name}{_suffix(grouping)}.csv"], name
+        assert len(alone[f"{name}.csv"]) > 1000
+
+
+def _reference_zscore(df: pd.DataFrame, grouping, metric: str) -> pd.DataFrame:
+    """Z-score hits with hierarchical fallback, straight from pandas groupby."""
+    fine = df.groupby(list(grouping), observed=True)[metric].transform("size")
+    coarse = df.groupby("hcpcs_cd", observed=True)[metric].transform("size")
+    levels = [(list(grouping), fine >= MIN_GROUP_SIZE),
+              (["hcpcs_cd"], (fine.isna() | (fine < MIN_GROUP_SIZE)) & (coarse >= MIN_GROUP_SIZE))]
+    hits = []
+    for by, assigned in levels:
+        # The baseline is the whole group; only the rows assigned to this level are reported.
+        g = df.groupby(by, observed=True)[metric]
+        n, mean, std = g.transform("count"), g.transform("mean"), g.transform(lambda s: s.std(ddof=0))
+        z = (df[metric] - mean) / std.where(std > 0)
+        hit = assigned & (n >= MIN_GROUP_SIZE) & (z > Z_THRESHOLD)
+        hits.append(pd.DataFrame({"group_key": "+".join(by), "z_score": z[hit]}))
+    return pd.concat(hits, ignore_index=True)
+
+
+@pytest.mark.parametrize("grouping", COMPOSITES)
+def test_fallback_matches_pandas_reference(together, grouping):
+    df = storage.read_cleaned(columns=[*grouping, *METRICS])
+    got = pd.read_csv(io.BytesIO(together[f"anomalies_zscore{_suffix(grouping)}.csv"]))
+    for metric in METRICS:
+        expected = _reference_zscore(df, grouping, metric)
+        rows = got[got["anomaly_metric"] == metric]
+        assert rows["group_key"].value_counts().to_dict() == expected["group_key"].value_counts().to_dict()
+        np.testing.assert_allclose(np.sort(rows["z_score"].to_numpy()), np.sort(expected["z_score"].to_numpy()),
+                                   rtol=1e-9)
+    assert set(got["group_key"]) == {"+".join(grouping), "hcpcs_cd"}
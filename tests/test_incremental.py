@@ -0,0 +1,39 @@
+import numpy as np
+
+from backend import analysis, storage
+from backend.analysis import MIN_GROUP_SIZE, analyze_and_detect
+
+DETECTORS = list(analysis.DETECTORS)
+
+
+def _change_three_groups():
+    """Rewrite the store with three HCPCS groups edited: an outlier added, rows removed, values nudged."""
+    df = storage.read_cleaned()
+    sizes = df["hcpcs_cd"].value_counts()
+    a, b, c = sizes[sizes >= MIN_GROUP_SIZE + 10].index[[0, 5, 10]]
+
+    row = np.flatnonzero(df["hcpcs_cd"] == a)[3]
+    df.loc[row, "avg_mdcr_pymt_amt"] *= 40
+    df = df.drop(df.index[np.flatnonzero(df["hcpcs_cd"] == b)[:5]]).reset_index(drop=True)
+    rows = np.flatnonzero(df["hcpcs_cd"] == c)[::4]
+    df.loc[rows, "avg_mdcr_pymt_amt"] *= 1.01
+    df["submitted_to_payment_ratio"] = df["avg_sbmtd_chrg_amt"] / df["avg_mdcr_pymt_amt"].replace({0: np.nan})
+    storage.write_cleaned(df)
+
+
+def test_incremental_rerun_matches_full_run(cleaned_sample, analysis_outputs, capsys):
+    analyze_and_detect(incremental=True, detectors=DETECTORS)
+    before = analysis_outputs()
+    _change_three_groups()
+    capsys.readouterr()
+
+    analyze_and_detect(incremental=True, detectors=DETECTORS)
+    assert "Incremental: rescoring 3 of" in capsys.readouterr().out
+    patched = analysis_outputs()
+    assert all(patched[f"anomalies_{d}.csv"] != before[f"anomalies_{d}.csv"] for d in DETECTORS)
+
+    analyze_and_detect(detectors=DETECTORS)
+    full = analysis_outputs()
+    assert sorted(patched) == sorted(full)
+    for name in full:
+        assert patched[name] == full[name], name
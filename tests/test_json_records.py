@@ -0,0 +1,101 @@
+import json
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend import json_records
+from backend.json_records import records_json, write_records_json
+
+
+def _expected(df: pd.DataFrame) -> list:
+    """df.to_dict("records") with NaN/NA/inf as None and numpy scalars as Python values."""
+    out = []
+    for row in df.astype(object).to_dict("records"):
+        clean = {}
+        for k, v in row.items():
+            if v is None or v is pd.NA or (isinstance(v, float) and not math.isfinite(v)):
+                v = None
+            elif hasattr(v, "item"):
+                v = v.item()
+                if isinstance(v, float) and not math.isfinite(v):
+                    v = None
+            clean[k] = v
+        out.append(clean)
+    return out
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        "i64": np.array([1, -2, 3, 2**53 + 1], dtype=np.int64),
+        "i32": np.array([7, 0, -7, 1], dtype=np.int32),
+        "u8": np.array([0, 255, 1, 2], dtype=np.uint8),
+        "f64": [1.5, np.nan, np.inf, -0.0],
+        "f32": np.array([0.1, 2, -np.inf, 1e-7], dtype=np.float32),
+        "text": ['say "hi"', "ünïcødé €", None, "tab\tnew\nline\\"],
+        "str": pd.Series(["a", None, " ", ""], dtype="str"),
+        "cat": pd.Categorical(["x", None, "x", "y"]),
+        "bool": [True, False, True, False],
+        "Int64": pd.array([1, None, 3, None], dtype="Int64"),
+        "boolean": pd.array([True, None, False, None], dtype="boolean"),
+        "mixed": pd.Series([1, "two", None, 2.5], dtype=object),
+    })
+
+
+def test_compact_matches_json_dumps(frame):
+    expected = json.dumps(_expected(frame), ensure_ascii=False, separators=(",", ":"))
+    assert records_json(frame) == expected
+
+
+@pytest.mark.parametrize("indent", [1, 2, 4])
+def test_indented_matches_json_dumps(frame, indent):
+    assert records_json(frame, indent=indent) == json.dumps(_expected(frame), ensure_ascii=False, indent=indent)
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_round_trip(frame, indent):
+    loaded = json.loads(records_json(frame, indent=indent))
+    assert loaded == _expected(frame)
+    row = loaded[1]
+    assert row["f64"] is None and row["text"] == "ünïcødé €" and row["cat"] is None and row["Int64"] is None
+    assert loaded[2]["f64"] is None and loaded[2]["f32"] is None
+    assert loaded[0]["i64"] == 1 and loaded[3]["i64"] == 2**53 + 1
+    assert loaded[0]["bool"] is True and loaded[0]["f32"] == float(np.float32(0.1))
+
+
+def test_blocks_join_seamlessly(frame, monkeypatch):
+    big = pd.concat([frame] * 5, ignore_index=True)
+    whole = records_json(big, indent=2)
+    monkeypatch.setattr(json_records, "BLOCK_ROWS", 3)
+    assert records_json(big, indent=2) == whole
+    assert json.loads(records_json(big)) == _expected(big)
+
+
+def test_empty_frames():
+    assert records_json(pd.DataFrame()) == "[]"
+    assert records_json(pd.DataFrame({"a": []})) == "[]"
+    no_columns = pd.DataFrame(index=range(2))
+    assert json.loads(records_json(no_columns)) == [{}, {}]
+    assert records_json(no_columns, indent=2) == json.dumps([{}, {}], indent=2)
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_write_records_json(tmp_path, frame, indent):
+    path = tmp_path / "records.json"
+    write_records_json(frame, str(path), indent=indent)
+    assert json.loads(path.read_text(encoding="utf-8")) == _expected(frame)
+
+    payload = {"iqr": frame.head(2), "zscore": frame.iloc[0:0], "mad": frame.tail(1)}
+    write_records_json(payload, str(path), indent=indent)
+    text = path.read_text(encoding="utf-8")
+    expected = {name: _expected(df) for name, df in payload.items()}
+    assert json.loads(text) == expected
+    if indent is None:
+        assert text == json.dumps(expected, ensure_ascii=False, separators=(",", ":"))
+    else:
+        assert text == json.dumps(expected, ensure_ascii=False, indent=indent)
+
+    write_records_json({}, str(path), indent=indent)
+    assert json.loads(path.read_text(encoding="utf-8")) == {}
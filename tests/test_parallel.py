@@ -0,0 +1,27 @@
+import pytest
+
+from backend import analysis
+from backend.analysis import analyze_and_detect
+
+DETECTORS = list(analysis.DETECTORS)
+
+
+@pytest.mark.parametrize("quantile_method", ["exact", "sketch"])
+def test_workers_match_single_process(cleaned_sample, analysis_outputs, quantile_method):
+    analyze_and_detect(detectors=DETECTORS, quantile_method=quantile_method)
+    expected = analysis_outputs()
+    assert all(len(expected[f"anomalies_{d}.csv"]) > 1000 for d in DETECTORS)
+
+    analyze_and_detect(workers=3, detectors=DETECTORS, quantile_method=quantile_method)
+    got = analysis_outputs()
+    assert sorted(got) == sorted(expected)
+    for name in expected:
+        assert got[name] == expected[name], name
+
+
+def test_workers_match_with_composite_grouping(cleaned_sample, analysis_outputs):
+    groupings = [("hcpcs_cd", "place_of_srvc"), ("hcpcs_cd",)]
+    analyze_and_detect(groupings=groupings)
+    expected = analysis_outputs()
+    analyze_and_detect(workers=3, groupings=groupings)
+    assert analysis_outputs() == expected
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend.parsing import parse_numeric
+
+
+def _rules(values) -> pd.Series:
+    """The cleaning rules applied cell by cell, as the original _coerce_numeric did on object columns."""
+    s = pd.Series(values, dtype=object).astype(str).str.strip()
+    s = s.mask(s.str.lower().isin(["", "nan", "none", "null", "*"]))
+    s = s.str.replace(r"[\$,]", "", regex=True)
+    s = s.str.replace(r"^\((.*)\)$", r"-\1", regex=True)
+    return pd.to_numeric(s, errors="coerce")
+
+
+MESSY = ["$1,234", "(1.5)", " 7 ", "", "  ", "N/A", "*", "null", "NULL", "None", "nan", "abc",
+         None, "$(2,000.25)", "1e3", "-3", "1,000,000", "12.50", "$0"]
+
+
+@pytest.mark.parametrize("dtype", [object, "str"])
+def test_messy_text(dtype):
+    parsed, bad = parse_numeric(pd.Series(MESSY, dtype=dtype))
+    expected = [1234.0, -1.5, 7.0, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan, np.nan,
+                np.nan, -2000.25, 1000.0, -3.0, 1e6, 12.5, 0.0]
+    np.testing.assert_array_equal(parsed.to_numpy(dtype=np.float64), expected)
+    # Only "N/A" and "abc" are bad values; blanks and sentinels are missing values.
+    assert bad == 2
+
+
+@pytest.mark.parametrize("dtype", [object, "str"])
+def test_matches_cell_rules(dtype):
+    rng = np.random.default_rng(7)
+    pool = MESSY[:-1] + ["(12)", "$ 5", "1.", ".5", "--1", "(1,2)", "3 4", "*", "  $9,999.99  "]
+    values = [pool[i] for i in rng.integers(0, len(pool), 5000)]
+    parsed, _ = parse_numeric(pd.Series(values, dtype=dtype))
+    pd.testing.assert_series_equal(parsed.astype(np.float64), _rules(values).astype(np.float64),
+                                   check_names=False)
+
+
+def test_pandas_str_dtype_is_parsed():
+    # The original object-only check sent str columns straight to pd.to_numeric, losing "$1,234".
+    parsed, bad = parse_numeric(pd.Series(["$1,234", "(10)"], dtype="str"))
+    assert parsed.tolist() == [1234.0, -10.0]
+    assert bad == 0
+
+
+def test_index_and_name_kept():
+    s = pd.Series(["$1", "2"], index=[10, 20], name="avg_mdcr_pymt_amt", dtype=object)
+    parsed, _ = parse_numeric(s)
+    assert parsed.index.tolist() == [10, 20]
+    assert parsed.name == "avg_mdcr_pymt_amt"
+
+
+def test_numeric_columns_pass_through():
+    ints = pd.Series([1, 2, 3])
+    parsed, bad = parse_numeric(ints)
+    assert parsed.dtype == np.int64 and parsed.tolist() == [1, 2, 3] and bad == 0
+
+    floats = pd.Series([1.5, np.nan, -2.0])
+    parsed, bad = parse_numeric(floats)
+    np.testing.assert_array_equal(parsed.to_numpy(), floats.to_numpy())
+    assert bad == 0
+
+
+def test_clean_integer_text_stays_integer():
+    parsed, bad = parse_numeric(pd.Series(["12", "13"], dtype=object))
+    assert parsed.dtype == np.int64 and parsed.tolist() == [12, 13] and bad == 0
+
+
+def test_mixed_python_objects():
+    parsed, bad = parse_numeric(pd.Series([1, 2.5, "3", None], dtype=object))
+    np.testing.assert_array_equal(parsed.to_numpy(dtype=np.float64), [1.0, 2.5, 3.0, np.nan])
+    assert bad == 0
+
+
+def test_all_missing_and_empty():
+    parsed, bad = parse_numeric(pd.Series(["", "*", None], dtype=object))
+    assert parsed.isna().all() and bad == 0
+    parsed, bad = parse_numeric(pd.Series([], dtype=object))
+    assert len(parsed) == 0 and bad == 0
+
+
+def test_arrow_input():
+    pa = pytest.importorskip("pyarrow")
+    parsed, bad = parse_numeric(pa.array(["$5", None, "x"]))
+    np.testing.assert_array_equal(parsed.to_numpy(dtype=np.float64), [5.0, np.nan, np.nan])
+    assert bad == 1
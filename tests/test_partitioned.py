@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from backend import analysis, cleaning
+from backend.analysis import analyze_and_detect
+from backend.partitioned import analyze_out_of_core
+from benchmarks.generate_data import generate_raw
+
+DETECTORS = list(analysis.DETECTORS)
+
+
+def _outputs() -> dict:
+    """Bytes of every anomaly table, top-group table and the analysis summary."""
+    out = {}
+    for folder in (analysis.ANOM_DIR, analysis.TABLES_DIR):
+        for name in sorted(os.listdir(folder)):
+            with open(os.path.join(folder, name), "rb") as f:
+                out[name] = f.read()
+    with open(analysis.SUMMARY_PATH, "rb") as f:
+        out["summary"] = f.read()
+    return out
+
+
+@pytest.fixture(scope="module")
+def in_memory():
+    os.makedirs(os.path.dirname(cleaning.RAW_PATH), exist_ok=True)
+    # Skewed group sizes leave some codes under MIN_GROUP_SIZE; messy values and outliers exercise every detector.
+    generate_raw(cleaning.RAW_PATH, rows=30_000, n_hcpcs=400, skew=1.1, messy=0.02, outliers=0.01, seed=4)
+    cleaning.clean_data()
+    analyze_and_detect(detectors=DETECTORS)
+    return _outputs()
+
+
+@pytest.mark.parametrize("partitions", [1, 3, 16, 64])
+def test_matches_in_memory(in_memory, partitions):
+    analyze_out_of_core(partitions=partitions, detectors=DETECTORS)
+    got = _outputs()
+    assert sorted(got) == sorted(in_memory)
+    for name in in_memory:
+        assert got[name] == in_memory[name], name
+    assert any(len(v) > 1000 for k, v in got.items() if k.startswith("anomalies_"))
+
+
+def test_matches_in_memory_with_sketch_and_workers(in_memory):
+    analyze_and_detect(detectors=DETECTORS, quantile_method="sketch")
+    expected = _outputs()
+    analyze_out_of_core(partitions=5, workers=2, detectors=DETECTORS, quantile_method="sketch")
+    assert _outputs() == expected
+
+
+def test_spill_removed(in_memory, tmp_path):
+    spill = tmp_path / "spill"
+    analyze_out_of_core(partitions=4, detectors=DETECTORS, spill_dir=str(spill))
+    assert not spill.exists()
+
+
+def test_composite_grouping_rejected(in_memory):
+    with pytest.raises(ValueError):
+        analyze_out_of_core(groupings=analysis.parse_groupings(["hcpcs_cd,place_of_srvc"]))
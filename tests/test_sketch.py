@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from backend.sketch import QuantileSketch
+
+QUANTILES = [0.0, 0.01, 0.25, 0.5, 0.75, 0.9, 0.99, 1.0]
+
+
+def _bound(values: np.ndarray, q: float, alpha: float) -> float:
+    """alpha times the interpolated magnitude of the two order statistics np.quantile blends."""
+    s = np.sort(values)
+    virtual = (len(s) - 1) * q
+    lo, hi = int(np.floor(virtual)), int(np.ceil(virtual))
+    frac = virtual - lo
+    return alpha * ((1 - frac) * abs(s[lo]) + frac * abs(s[hi])) + 1e-12
+
+
+@pytest.mark.parametrize("alpha", [0.001, 0.01, 0.05])
+@pytest.mark.parametrize("kind", ["lognormal", "negative", "mixed", "heavy_tail"])
+def test_within_alpha_of_exact(alpha, kind):
+    rng = np.random.default_rng(11)
+    values = {
+        "lognormal": rng.lognormal(3, 1.5, 20_000),
+        "negative": -rng.lognormal(1, 2, 20_000),
+        "mixed": rng.normal(5, 50, 20_000),
+        "heavy_tail": rng.pareto(1.2, 20_000) * 100,
+    }[kind]
+    sketch = QuantileSketch(alpha=alpha).add(values)
+    for q in QUANTILES:
+        got = sketch.quantile(q)[0]
+        assert abs(got - np.quantile(values, q)) <= _bound(values, q, alpha), (kind, q)
+
+
+def test_per_group_and_nan():
+    rng = np.random.default_rng(3)
+    codes = rng.integers(0, 5, 10_000)
+    values = rng.lognormal(codes, 1.0)
+    values[::97] = np.nan
+    sketch = QuantileSketch(n_groups=6, alpha=0.01).add(values, codes)
+
+    counts = sketch.count()
+    assert counts.tolist() == [int(np.sum((codes == g) & ~np.isnan(values))) for g in range(6)]
+    for q in (0.25, 0.5, 0.75):
+        got = sketch.quantile(q)
+        assert np.isnan(got[5])
+        for g in range(5):
+            v = values[(codes == g) & ~np.isnan(values)]
+            assert abs(got[g] - np.quantile(v, q)) <= _bound(v, q, 0.01)
+
+
+def _state(sketch: QuantileSketch):
+    return sketch.keys.tolist(), sketch.counts.tolist()
+
+
+def test_merge_is_associative_and_matches_one_pass():
+    rng = np.random.default_rng(5)
+    parts = [(rng.lognormal(2, 1, n), rng.integers(0, 3, n)) for n in (500, 3000, 1)]
+    parts.append((rng.normal(0, 10, 800), rng.integers(0, 3, 800)))
+
+    def build(i):
+        return QuantileSketch(n_groups=3).add(*parts[i])
+
+    left = build(0).merge(build(1)).merge(build(2)).merge(build(3))
+    right = build(0).merge(build(1).merge(build(2).merge(build(3))))
+    swapped = build(3).merge(build(1)).merge(build(0).merge(build(2)))
+    whole = QuantileSketch(n_groups=3).add(np.concatenate([p[0] for p in parts]),
+                                           np.concatenate([p[1] for p in parts]))
+    assert _state(left) == _state(right) == _state(swapped) == _state(whole)
+    np.testing.assert_array_equal(left.quantile(0.5), whole.quantile(0.5))
+
+
+def test_merge_with_empty_and_mismatch():
+    a = QuantileSketch().add([1.0, 2.0, 3.0])
+    before = _state(a)
+    assert _state(a.merge(QuantileSketch())) == before
+    assert _state(QuantileSketch().merge(a)) == before
+    with pytest.raises(ValueError):
+        a.merge(QuantileSketch(alpha=0.02))
+    with pytest.raises(ValueError):
+        a.merge(QuantileSketch(n_groups=2))
+
+
+def test_zero_and_infinite_values():
+    sketch = QuantileSketch().add([0.0, 0.0, 1e-12, 5.0, np.inf])
+    assert sketch.quantile(0.0)[0] == 0.0
+    assert sketch.quantile(0.5)[0] == 0.0
+    assert np.isfinite(sketch.quantile(1.0)[0])
+
+
+def test_invalid_alpha():
+    for alpha in (0, 1, -0.1):
+        with pytest.raises(ValueError):
+            QuantileSketch(alpha=alpha)
@@ -0,0 +1,28 @@
+import os
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from backend import cleaning, storage
+from benchmarks.generate_data import generate_raw
+
+
+def _store():
+    return pq.read_table(storage.CLEAN_PARQUET_PATH)
+
+
+@pytest.fixture(scope="module")
+def in_memory():
+    os.makedirs(os.path.dirname(cleaning.RAW_PATH), exist_ok=True)
+    generate_raw(cleaning.RAW_PATH, rows=20_000, n_hcpcs=300, skew=1.1, messy=0.02, outliers=0.01, seed=7)
+    cleaning.clean_data()
+    return _store()
+
+
+@pytest.mark.parametrize("chunksize", [997, 6_000, 50_000])
+def test_streaming_store_matches_in_memory(in_memory, chunksize):
+    cleaning.clean_data(chunksize=chunksize)
+    got = _store()
+    assert got.schema.equals(in_memory.schema, check_metadata=True)
+    pd.testing.assert_frame_equal(got.to_pandas(), in_memory.to_pandas())
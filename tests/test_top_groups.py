@@ -0,0 +1,60 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from backend import analysis, cleaning
+from backend.analysis import TOP_GROUP_BREAKDOWNS, TOP_N, _TopGroups, analyze_and_detect
+from benchmarks.generate_data import generate_raw
+
+KEYS = ["anomaly_metric", "hcpcs_cd", "hcpcs_desc"]
+
+
+def _expected(hits: pd.DataFrame, columns, n: int) -> pd.DataFrame:
+    """value_counts() over the hit rows, count descending, ties by the key text ascending (missing last)."""
+    counts = hits.value_counts(columns, dropna=False, sort=False).reset_index(name="count")
+    counts = counts.sort_values(["count", *columns], ascending=[False] + [True] * len(columns),
+                                na_position="last", kind="stable")
+    return counts.head(n).reset_index(drop=True)
+
+
+def test_counter_matches_value_counts():
+    # Tied counts across numeric-looking and alphanumeric codes, and a missing code.
+    groups = [("avg_mdcr_pymt_amt", "J0007", 29), ("avg_mdcr_pymt_amt", "10010", 29), ("avg_mdcr_pymt_amt", None, 29),
+              ("submitted_to_payment_ratio", "10010", 29), ("avg_mdcr_pymt_amt", "99213", 12),
+              ("submitted_to_payment_ratio", "G0008", 12), ("avg_mdcr_pymt_amt", "10021", 3)]
+    hits = pd.DataFrame([(m, c) for m, c, n in groups for _ in range(n)], columns=KEYS[:2])
+    hits = hits.sample(frac=1, random_state=11).reset_index(drop=True)
+    hits["hcpcs_desc"] = "Procedure " + hits["hcpcs_cd"].fillna("?")
+
+    counter = _TopGroups(KEYS)
+    for part in np.array_split(np.arange(len(hits)), 7):
+        counter.add_frame(hits.iloc[part])
+
+    expected = _expected(hits, KEYS, len(hits))
+    assert list(expected["hcpcs_cd"][:4].fillna("-")) == ["10010", "J0007", "-", "10010"]
+    pd.testing.assert_frame_equal(counter.top(len(hits)), expected, check_dtype=False)
+    pd.testing.assert_frame_equal(counter.top(5), expected.head(5), check_dtype=False)
+
+
+@pytest.fixture(scope="module")
+def analyzed():
+    os.makedirs(os.path.dirname(cleaning.RAW_PATH), exist_ok=True)
+    generate_raw(cleaning.RAW_PATH, rows=30_000, n_hcpcs=400, skew=1.1, messy=0.02, outliers=0.01, seed=5)
+    cleaning.clean_data()
+    analyze_and_detect(detectors=list(analysis.DETECTORS))
+
+
+def _read(path: str, columns) -> pd.DataFrame:
+    return pd.read_csv(path, dtype={c: str for c in columns})
+
+
+@pytest.mark.parametrize("detector", list(analysis.DETECTORS))
+@pytest.mark.parametrize("split", ["", *TOP_GROUP_BREAKDOWNS])
+def test_tables_match_value_counts(analyzed, detector, split):
+    columns = KEYS + ([TOP_GROUP_BREAKDOWNS[split]] if split else [])
+    hits = _read(os.path.join(analysis.ANOM_DIR, f"anomalies_{detector}.csv"), columns)
+    table = _read(os.path.join(analysis.TABLES_DIR, f"top_{detector}_groups{'_' + split if split else ''}.csv"), columns)
+    assert len(hits) > 0
+    pd.testing.assert_frame_equal(table, _expected(hits, columns, TOP_N), check_dtype=False)